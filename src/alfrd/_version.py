@@ -0,0 +1,2 @@
+"""version of alfrd, read by setup.cfg and imported by the package without the package metadata"""
+__version__ = "0.1.0"
@@ -0,0 +1,218 @@
+"""
+Local sheet backend to run ALFRD without Google Sheets, e.g for offline runs and benchmarking.
+
+The classes mimic the part of the gspread client / spreadsheet / worksheet API that GSC uses
+(open_by_key, worksheet, get_worksheet, get_all_records, get_all_values, update, batch_update)
+so any other backend only needs to provide the same methods. Each worksheet is stored as a CSV
+file `<root>/<sid>/<worksheet>.csv`.
+
+    from alfrd.lib import GSC
+    from alfrd.backend import LocalClient
+
+    gsc         = GSC(sid='observations', wname='obs', client=LocalClient('path/to/sheets', latency=0.05, quota=60))
+    df_sheet    = gsc.open()
+
+`latency` (seconds per request) and `quota` (requests per minute, answered with a 429 APIError
+like Google does) simulate the network so the throttling/retry logic of GSC can be exercised.
+"""
+from pathlib import Path
+import csv, os, re, time, atexit, threading
+from collections import deque
+from alfrd.util import LazyModule
+
+gspread     =   LazyModule('gspread')
+
+class _QuotaResponse:
+    """
+    minimal stand-in for a requests.Response, as expected by gspread.exceptions.APIError
+    """
+    status_code =   429
+    text        =   'Quota exceeded (simulated by alfrd.backend)'
+
+    def json(self):
+        return {'error': {'code': self.status_code, 'message': self.text, 'status': 'RESOURCE_EXHAUSTED'}}
+
+class LocalSheet:
+    """
+    worksheet stored in a CSV file
+
+    Input
+    ---
+
+    :path:          CSV file, created on the first write if it does not exist
+    :latency:       seconds to wait for every request
+    :quota:         maximum requests per minute, None for no limit
+    :autosave:      write the file after every update, if False the file is written by `save()` and at exit
+    """
+    def __init__(self, path, latency=0.0, quota=None, autosave=True):
+        self.path       =   Path(path)
+        self.title      =   self.path.stem
+        self.latency    =   latency
+        self.quota      =   quota
+        self.autosave   =   autosave
+        self.requests   =   deque()
+        self._lock      =   threading.Lock()
+        self.values     =   []
+        self.mtime      =   None
+        self._load()
+        if not autosave: atexit.register(self.save)
+
+    def _load(self):
+        """
+        reads the CSV file, again if another process changed it (with autosave the file is the shared sheet)
+        """
+        try:
+            mtime   =   self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self.mtime or (self.mtime is not None and not self.autosave): return
+        with self._lock, open(self.path, newline='') as f:
+            self.values =   [row for row in csv.reader(f)]
+            self.mtime  =   mtime
+
+    def _request(self):
+        """
+        simulates the network latency and the per minute quota of the sheets API
+        """
+        if self.quota:
+            now = time.monotonic()
+            with self._lock:
+                while self.requests and now - self.requests[0] >= 60: self.requests.popleft()
+                if len(self.requests) >= self.quota: raise gspread.exceptions.APIError(_QuotaResponse())
+                self.requests.append(now)
+        if self.latency: time.sleep(self.latency)
+        self._load()
+
+    def _trimmed(self):
+        """
+        values without trailing empty rows and columns, as returned by the sheets API
+        """
+        rows    =   list(self.values)
+        while rows and not any(str(v) for v in rows[-1]): rows.pop()
+        ncols   =   max([max([j + 1 for j, v in enumerate(row) if str(v)] or [0]) for row in rows] or [0])
+        return [[str(v) for v in row[:ncols]] + [''] * (ncols - len(row[:ncols])) for row in rows]
+
+    def _write(self, row, col, values):
+        """
+        writes the 2D `values` with the top left cell at (row, col), 1-based like A1 notation
+        """
+        for di, rvalues in enumerate(values):
+            i = row - 1 + di
+            while len(self.values) <= i: self.values.append([])
+            for dj, v in enumerate(rvalues):
+                j = col - 1 + dj
+                r = self.values[i]
+                if len(r) <= j: r.extend([''] * (j + 1 - len(r)))
+                r[j] = '' if v is None else str(v)
+
+    def get_all_values(self, **kwargs):
+        self._request()
+        return self._trimmed()
+
+    def get_all_records(self, numericise_ignore=None, **kwargs):
+        self._request()
+        rows = self._trimmed()
+        if not rows: return []
+        header = rows[0]
+        return [dict(zip(header, row)) for row in rows[1:]]
+
+    def _range(self, a1, nrows, ncols):
+        """
+        0-based (row0, row1, col0, col1) half open bounds of an A1 range like 'A2:C10', 'B:B', '1:1' or 'C5'
+        """
+        bounds  =   []
+        for k, part in enumerate((a1.split(':') + [a1])[:2] if ':' in a1 else [a1, a1]):
+            letters, digits = re.fullmatch(r'([A-Za-z]*)(\d*)', part.split('!')[-1]).groups()
+            col     =   0
+            for ch in letters.upper(): col = col * 26 + ord(ch) - 64
+            bounds.append((int(digits) if digits else (1 if k == 0 else nrows), col or (1 if k == 0 else ncols)))
+        (r0, c0), (r1, c1) = bounds
+        return r0 - 1, r1, c0 - 1, c1
+
+    def batch_get(self, ranges, **kwargs):
+        """
+        values of every A1 range, without trailing empty rows/cells like the sheets API
+        """
+        self._request()
+        rows    =   self.values
+        ncols   =   max([len(r) for r in rows] or [0])
+        result  =   []
+        for a1 in ranges:
+            r0, r1, c0, c1  =   self._range(a1, len(rows), ncols)
+            block           =   [['' if v is None else str(v) for v in row[c0:c1]] for row in rows[r0:r1]]
+            for row in block:
+                while row and not row[-1]: row.pop()
+            while block and not block[-1]: block.pop()
+            result.append(block)
+        return result
+
+    def update(self, values, range_name='A1', **kwargs):
+        self._request()
+        row, col = gspread.utils.a1_to_rowcol(str(range_name).split(':')[0])
+        with self._lock:
+            self._write(row, col, values)
+        if self.autosave: self.save()
+
+    def batch_update(self, data, **kwargs):
+        self._request()
+        with self._lock:
+            for body in data:
+                row, col = gspread.utils.a1_to_rowcol(body['range'].split(':')[0])
+                self._write(row, col, body['values'])
+        if self.autosave: self.save()
+
+    def save(self):
+        """
+        writes the sheet to the CSV file (atomically)
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.csv.tmp')
+        with self._lock, open(tmp, 'w', newline='') as f:
+            csv.writer(f).writerows(self.values)
+        os.replace(tmp, self.path)
+        self.mtime = self.path.stat().st_mtime_ns
+
+class LocalSpreadsheet:
+    """
+    directory of CSV worksheets
+    """
+    def __init__(self, path, **sheet_kwargs):
+        self.path           =   Path(path)
+        self.id             =   self.path.name
+        self.sheet_kwargs   =   sheet_kwargs
+        self._sheets        =   {}
+
+    def worksheet(self, title):
+        if title not in self._sheets:
+            self._sheets[title] = LocalSheet(self.path / f"{title}.csv", **self.sheet_kwargs)
+        return self._sheets[title]
+
+    def get_lastUpdateTime(self):
+        """
+        modification time of the newest worksheet file, like the Drive API modifiedTime
+        """
+        mtimes  =   [p.stat().st_mtime for p in self.path.glob('*.csv')]
+        return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(max(mtimes))) + f".{int(max(mtimes) % 1 * 1e6):06d}Z" if mtimes else None
+
+    def worksheets(self):
+        return [self.worksheet(p.stem) for p in sorted(self.path.glob('*.csv'))]
+
+    def get_worksheet(self, index):
+        sheets  =   self.worksheets()
+        if not sheets and index == 0: return self.worksheet('Sheet1')
+        return sheets[index] if index < len(sheets) else None
+
+class LocalClient:
+    """
+    client opening the spreadsheets stored under `root`, the spreadsheet key is the directory name
+    keyword arguments are passed to every LocalSheet (latency, quota, autosave)
+    """
+    def __init__(self, root, **sheet_kwargs):
+        self.root           =   Path(root).expanduser()
+        self.sheet_kwargs   =   sheet_kwargs
+        self._spreadsheets  =   {}
+
+    def open_by_key(self, key):
+        if key not in self._spreadsheets:
+            self._spreadsheets[key] = LocalSpreadsheet(self.root / key, **self.sheet_kwargs)
+        return self._spreadsheets[key]
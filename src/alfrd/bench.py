@@ -0,0 +1,323 @@
+"""
+Benchmarks for ALFRD, they run offline (sheets on the local CSV backend, see `alfrd.backend`) and write
+machine readable results.
+
+    $ python -m alfrd.bench                                  # all benchmarks
+    $ python -m alfrd.bench startup --repeat 20 --json bench.json
+    $ python -m alfrd.bench logframe --rows 1000 10000 --json new.json --compare bench.json
+
+Each benchmark returns a list of results {"name", "n", "min_s", "median_s", "mean_s", "max_s", ...}, `--compare`
+prints the change of the medians against a previous `--json` file and exits with 1 if one is slower than `--threshold`.
+
+:logframe:          get_value/isvalue/put_value/col_data per call, put_values/get_values of all the rows, update_sheet
+                    of the dirty cells, refresh of an unchanged sheet and LogFrame() at --rows
+:open:              GSC.open of the whole sheet, of two columns and of the rows matching a filter (local backend)
+:read_inputfile:    parameter files found in directory trees of increasing size
+:provision:         dir_for_project of N datasets copying the template (copytree), with reflinks and hard links,
+                    one after the other and in parallel
+:delete:            delete_paths of a tree of N directories of small files against `rm -rf` in a subprocess
+:load_projects:     N plugin files without (cold) and with an up to date manifest (listing and importing)
+:startup:           `alfrd ls` / `alfrd run` of a trivial step in new processes
+"""
+from pathlib import Path
+import argparse, csv, json, os, random, statistics, subprocess, sys, tempfile, time
+
+BENCHMARKS = {}
+
+def benchmark(func):
+    """registers a benchmark function under its name without the `bench_` prefix"""
+    BENCHMARKS[func.__name__.replace('bench_', '', 1)] = func
+    return func
+
+def timings(name, times, **extra):
+    """summary of a list of timings in seconds"""
+    return {'name': name, 'n': len(times), 'min_s': min(times), 'median_s': statistics.median(times),
+            'mean_s': statistics.mean(times), 'max_s': max(times), **extra}
+
+def timeit(name, func, repeat=5, setup=None, **extra):
+    """times `func()` `repeat` times, `setup()` is called (untimed) before every run"""
+    times = []
+    for _ in range(repeat):
+        if setup: setup()
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return timings(name, times, **extra)
+
+def make_project(home, name='bench', n_plugins=1, n_steps=1, plugin_imports=''):
+    """creates a project with n_plugins files of n_steps trivial steps under `home`/.alfrd/projects"""
+    project_dir = Path(home) / '.alfrd' / 'projects' / name
+    project_dir.mkdir(parents=True, exist_ok=True)
+    for p in range(n_plugins):
+        steps = ''.join(f'\n@register(desc="step {s} of plugin {p}")\ndef step_{p}_{s}(x=0):\n    return x\n' for s in range(n_steps))
+        (project_dir / f'plugin_{p}.py').write_text(f'from alfrd.plugins import register\n{plugin_imports}\n{steps}')
+    return project_dir
+
+def make_sheet(root, sid='bench', wname='sheet', rows=1000, cols=10):
+    """writes a worksheet of the local backend with a FILE_NAME column and `cols` other columns, returns the file names"""
+    path    =   Path(root) / sid / f"{wname}.csv"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    names   =   [f"file_{i:07d}.fits" for i in range(rows)]
+    with open(path, 'w', newline='') as f:
+        w   =   csv.writer(f)
+        w.writerow(['FILE_NAME'] + [f"col{j}" for j in range(cols)])
+        w.writerows([name] + [('True' if (i + j) % 2 else str(i * j)) if j < cols // 2 else '' for j in range(cols)]
+                    for i, name in enumerate(names))
+    return names
+
+def open_logframe(root, sid='bench', wname='sheet'):
+    from alfrd.lib import GSC, LogFrame, TokenBucket
+    from alfrd.backend import LocalClient
+    gsc = GSC(sid=sid, wname=wname, client=LocalClient(root, autosave=False), journal=False,
+              limiter=TokenBucket(rate=1e9, per=1, burst=1e9))
+    gsc.open()
+    return LogFrame(gsc)
+
+def per_call(name, func, args, repeat=5, **extra):
+    """times `func(arg)` for all the args, the results are per call"""
+    r   =   timeit(name, lambda: [func(a) for a in args], repeat=repeat, calls=len(args), **extra)
+    for k in ('min_s', 'median_s', 'mean_s', 'max_s'): r[k] /= len(args)
+    return r
+
+@benchmark
+def bench_logframe(repeat=5, rows=(1000, 10000, 100000), calls=1000):
+    """LogFrame lookups and writes (per call), update_sheet of `calls` dirty cells and LogFrame() at different sizes"""
+    import contextlib, io
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        for n in rows:
+            names   =   make_sheet(root, rows=n)
+            keys    =   random.Random(n).sample(names, min(calls, n))
+            with contextlib.redirect_stdout(io.StringIO()):
+                lf  =   open_logframe(root)
+
+            def lookup(colname):
+                def _get(key):
+                    lf.primary_value = key
+                    return lf.get_value(colname)
+                return _get
+            def isvalue(key):
+                lf.primary_value = key
+                return lf.isvalue('True', colname='col1')
+            def put(key):
+                lf.primary_value = key
+                return lf.put_value('done', colname='col9')
+            def col_data(key):
+                lf.primary_value = key
+                return lf.col_data(colname='col8', data='x')
+            def dirty():
+                for k in keys:
+                    lf.primary_value = k
+                    lf.put_value(random.random(), colname='col9')
+                lf.registered = 0, 0
+
+            results.append(per_call(f"logframe.get_value[{n}]", lookup('col1'), keys, repeat, rows=n))
+            results.append(per_call(f"logframe.isvalue[{n}]", isvalue, keys, repeat, rows=n))
+            results.append(per_call(f"logframe.put_value[{n}]", put, keys, repeat, rows=n))
+            results.append(per_call(f"logframe.col_data[{n}]", col_data, keys, repeat, rows=n))
+            results.append(timeit(f"logframe.put_values[{n}]", lambda: lf.put_values({k: 'bulk' for k in names}, colname='col9'),
+                                  repeat=repeat, rows=n, cells=n))
+            results.append(timeit(f"logframe.get_values[{n}]", lambda: lf.get_values(colname='col1'), repeat=repeat, rows=n, cells=n))
+            with contextlib.redirect_stdout(io.StringIO()):
+                results.append(timeit(f"logframe.update_sheet[{n}]", lambda: lf.update_sheet(count=1, failed=0),
+                                      repeat=repeat, setup=dirty, rows=n, cells=len(keys)))
+                results.append(timeit(f"logframe.init[{n}]", lambda: type(lf)(lf.gsc), repeat=repeat, rows=n))
+                results.append(timeit(f"logframe.refresh[{n}]", lambda: lf.refresh(force=True), repeat=repeat, rows=n))
+    return results
+
+@benchmark
+def bench_open(repeat=5, rows=(10000, 100000), cols=20):
+    """GSC.open of the whole sheet against only two columns and only the rows matching a filter"""
+    import contextlib, io
+    from alfrd.lib import GSC, TokenBucket
+    from alfrd.backend import LocalClient
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        for n in rows:
+            make_sheet(root, rows=n, cols=cols)
+            client  =   LocalClient(root, autosave=False)
+            def opener(**kwargs):
+                def _open():
+                    gsc = GSC(sid='bench', wname='sheet', client=client, journal=False, limiter=TokenBucket(rate=1e9, per=1, burst=1e9))
+                    with contextlib.redirect_stdout(io.StringIO()): gsc.open(**kwargs)
+                return _open
+            results.append(timeit(f"open.all[{n}x{cols}]", opener(), repeat=repeat, rows=n))
+            results.append(timeit(f"open.columns[{n}x{cols}]", opener(columns=['FILE_NAME', 'col1']), repeat=repeat, rows=n))
+            results.append(timeit(f"open.filter[{n}x{cols}]", opener(columns=['FILE_NAME', 'col1'], filter={'col0': '0'}),
+                                  repeat=repeat, rows=n))
+    return results
+
+@benchmark
+def bench_read_inputfile(repeat=5, dirs=(10, 100, 1000), files=10):
+    """
+    read_inputfile on a tree of `dirs` directories of `files` files each, with the parameter file two levels down:
+    repeated reads of the unchanged tree, cold reads (scan and parse caches cleared) and reads expanding the glob value
+    """
+    from alfrd import util
+    from alfrd.util import read_inputfile
+    results = []
+
+    def clear():
+        util._SCANS.clear()
+        util._PARSED.clear()
+
+    for n in dirs:
+        with tempfile.TemporaryDirectory() as root:
+            for d in range(n):
+                sub     =   Path(root) / f"obs_{d:05d}" / "input"
+                sub.mkdir(parents=True)
+                for f in range(files): (sub / f"data_{f}.fits").touch()
+            (Path(root) / "obs_00000" / "input" / "observation.inp").write_text(
+                ''.join(f"param_{k} = {k}\n" for k in range(50)) + f"fitsfiles = {root}/obs_00000/input/*.fits\n")
+            results.append(timeit(f"read_inputfile[{n}x{files}]", lambda: read_inputfile(root, "observation.inp"),
+                                  repeat=repeat, dirs=n, files=n * files))
+            results.append(timeit(f"read_inputfile.cold[{n}x{files}]", lambda: read_inputfile(root, "observation.inp"),
+                                  repeat=repeat, setup=clear, dirs=n, files=n * files))
+            results.append(timeit(f"read_inputfile.glob[{n}x{files}]",
+                                  lambda: read_inputfile(root, "observation.inp")[0]['fitsfiles'],
+                                  repeat=repeat, dirs=n, files=n * files))
+    return results
+
+@benchmark
+def bench_provision(repeat=3, datasets=(100,), files=50, size=64 * 1024, workers=8):
+    """dir_for_project of `datasets` files with a template of `files` files of `size` bytes, per template mode"""
+    import contextlib, io, shutil
+    from alfrd.util import dir_for_project, provision_projects
+    results = []
+    for n in datasets:
+        with tempfile.TemporaryDirectory() as root, contextlib.redirect_stdout(io.StringIO()):
+            ifolder =   Path(root) / 'input_template'
+            (ifolder / 'sub').mkdir(parents=True)
+            for f in range(files): (ifolder / ('sub' if f % 2 else '') / f"file_{f}.dat").write_bytes(os.urandom(size))
+            raw     =   Path(root) / 'raw' / 'PROJ'
+            raw.mkdir(parents=True)
+            fits    =   [str(raw / f"obs_{d}.fits") for d in range(n)]
+            for f in fits: Path(f).touch()
+            tdir    =   f"{root}/reductions/"
+
+            def clear():
+                shutil.rmtree(tdir, ignore_errors=True)
+
+            for mode in ('copy', 'reflink', 'link'):
+                kwargs = dict(tdir=tdir, ifolder=str(ifolder) + '/', mode=mode, mutable=('*_0.dat',))
+                results.append(timeit(f"provision.{mode}[{n}x{files}]", lambda: [dir_for_project(f, **kwargs) for f in fits],
+                                      repeat=repeat, setup=clear, datasets=n, files=files))
+                results.append(timeit(f"provision.{mode}.parallel[{n}x{files}]",
+                                      lambda: provision_projects(fits, workers=workers, **kwargs),
+                                      repeat=repeat, setup=clear, datasets=n, files=files, workers=workers))
+    return results
+
+@benchmark
+def bench_delete(repeat=3, dirs=(100, 1000), files=20, workers=8):
+    """delete_paths of a tree of `dirs` directories of `files` files each, and `rm -rf` of the same tree"""
+    from alfrd.util import delete_paths
+    results = []
+    for n in dirs:
+        with tempfile.TemporaryDirectory() as root:
+            tree    =   Path(root) / 'obs.ms'
+
+            def make():
+                for d in range(n):
+                    sub = tree / f"TABLE_{d // 10}" / f"part_{d}"
+                    sub.mkdir(parents=True, exist_ok=True)
+                    for f in range(files): (sub / f"f{f}").write_bytes(b'0' * 512)
+
+            results.append(timeit(f"delete.delete_paths[{n}x{files}]", lambda: delete_paths([tree], workers=workers),
+                                  repeat=repeat, setup=make, dirs=n, files=n * files, workers=workers))
+            results.append(timeit(f"delete.rm[{n}x{files}]", lambda: subprocess.run(['rm', '-rf', str(tree)]),
+                                  repeat=repeat, setup=make, dirs=n, files=n * files))
+    return results
+
+@benchmark
+def bench_load_projects(repeat=5, plugins=(10, 100), n_steps=5):
+    """load_projects of N plugin files: cold (no manifest), listing from the manifest and importing all the files"""
+    import contextlib, io
+    from alfrd import plugins as _plugins
+    results = []
+
+    def reset(manifest=True):
+        def _reset():
+            for registry in (_plugins.REGISTERED_STEPS, _plugins.VALIDATORS, _plugins.VALIDATE_BEFORE,
+                             _plugins.VALIDATE_AFTER, _plugins._LOADED):
+                registry.clear()
+            if not manifest and (project_dir / _plugins.MANIFEST).exists(): (project_dir / _plugins.MANIFEST).unlink()
+        return _reset
+
+    for n in plugins:
+        with tempfile.TemporaryDirectory() as home, contextlib.redirect_stdout(io.StringIO()):
+            project_dir =   make_project(home, n_plugins=n, n_steps=n_steps)
+            results.append(timeit(f"load_projects.cold[{n}]", lambda: _plugins.load_projects(project_dir),
+                                  repeat=repeat, setup=reset(manifest=False), plugins=n, steps=n * n_steps))
+            _plugins.load_projects(project_dir)
+            results.append(timeit(f"load_projects.list[{n}]", lambda: _plugins.load_projects(project_dir, steps=[]),
+                                  repeat=repeat, setup=reset(), plugins=n, steps=n * n_steps))
+            results.append(timeit(f"load_projects.one_step[{n}]", lambda: _plugins.load_projects(project_dir, steps=['step_0_0']),
+                                  repeat=repeat, setup=reset(), plugins=n, steps=n * n_steps))
+            reset()()
+    return results
+
+@benchmark
+def bench_startup(repeat=5):
+    """wall time of a bare python, `alfrd ls` and `alfrd run` of a trivial step (separate processes)"""
+    results = []
+    with tempfile.TemporaryDirectory() as home:
+        make_project(home)
+        env = {**os.environ, 'HOME': home}
+        cmds = {'startup.python':   [sys.executable, '-c', 'pass'],
+                'startup.import':   [sys.executable, '-c', 'import alfrd'],
+                'startup.ls':       [sys.executable, '-m', 'alfrd.main', 'ls', 'bench'],
+                'startup.run':      [sys.executable, '-m', 'alfrd.main', 'run', 'step_0_0', 'bench', 'x=1']}
+        for name, cmd in cmds.items():
+            results.append(timeit(name, lambda: subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, check=True), repeat=repeat))
+    base = results[0]['median_s']
+    for r in results[1:]: r['over_python_s'] = r['median_s'] - base
+    return results
+
+def compare(results, baseline, threshold=0.2):
+    """
+    prints the change of every median against the baseline results (a `--json` file)
+
+    Returns
+    ---
+
+    names of the results slower than the baseline by more than `threshold` (0.2 = 20%)
+    """
+    base    =   {r['name']: r for r in json.loads(Path(baseline).read_text())['results']}
+    slower  =   []
+    for r in results:
+        if r['name'] not in base: continue
+        change  =   r['median_s'] / base[r['name']]['median_s'] - 1 if base[r['name']]['median_s'] else 0.0
+        flag    =   ''
+        if change > threshold:
+            slower.append(r['name'])
+            flag    =   '  <-- slower'
+        print(f"{r['name']:<40} {base[r['name']]['median_s']*1e3:10.3f} ms -> {r['median_s']*1e3:10.3f} ms  {change:+7.1%}{flag}")
+    return slower
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m alfrd.bench', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('names', nargs='*', help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument('--repeat', type=int, default=5, help='repetitions of every measurement')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000], help='sheet sizes for the logframe benchmark')
+    parser.add_argument('--json', help='writes the results to this file')
+    parser.add_argument('--compare', help='results of a previous run (--json file) to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown reported as a regression by --compare')
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.names or BENCHMARKS:
+        if name not in BENCHMARKS: parser.error(f"unknown benchmark '{name}'")
+        kwargs = {'rows': args.rows} if name == 'logframe' else {}
+        for r in BENCHMARKS[name](repeat=args.repeat, **kwargs):
+            print(f"{r['name']:<40} median {r['median_s']*1e3:10.3f} ms   min {r['min_s']*1e3:10.3f} ms   (n={r['n']})")
+            results.append(r)
+    if args.json:
+        meta = {'python': sys.version.split()[0], 'platform': sys.platform, 'time': time.time()}
+        Path(args.json).write_text(json.dumps({'meta': meta, 'results': results}, indent=2))
+    if args.compare:
+        print(f"\ncompared with {args.compare}:")
+        if compare(results, args.compare, threshold=args.threshold): sys.exit(1)
+    return results
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+On disk cache of pipeline step results and checkpoints of pipeline runs.
+
+A step registered with `@register(..., cache=True)` is looked up by a hash of its source code and
+its resolved parameters, a repeated `alfrd run` with the same step and parameters restores the
+result (`params['ret']`) instead of running the step again. Use `alfrd run --no-cache` to bypass it.
+"""
+from pathlib import Path
+import hashlib, inspect, json, os, pickle, tempfile, time, threading
+from alfrd.util import ALFRD_DIR
+
+def _unlink(f):
+    try:
+        os.unlink(f)
+    except FileNotFoundError:
+        pass
+
+class StepCache:
+    """
+    Input
+    ---
+
+    :path:          directory for the cached results
+    :max_size:      total size in bytes kept, least recently used results are evicted first
+    :max_age:       results older than this (seconds since last use) are evicted
+    """
+    def __init__(self, path=ALFRD_DIR / 'cache', max_size=1024**3, max_age=30*24*3600):
+        self.path           =   Path(path)
+        self.max_size       =   max_size
+        self.max_age        =   max_age
+
+    def key(self, func, params):
+        """
+        hash of the function source and the parameters it is called with
+        """
+        try:
+            source  =   inspect.getsource(func)
+        except (OSError, TypeError):
+            source  =   repr((func.__code__.co_code, func.__code__.co_consts))
+        h   =   hashlib.sha256()
+        h.update(f"{func.__module__}.{func.__qualname__}\n{source}".encode())
+        h.update(json.dumps(params, sort_keys=True, default=repr).encode())
+        return h.hexdigest()
+
+    def _file(self, key):
+        return self.path / f"{key}.pkl"
+
+    def get(self, key):
+        """
+        Returns
+        ---
+
+        (True, result) if cached else (False, None)
+        """
+        f = self._file(key)
+        try:
+            with open(f, 'rb') as fh:
+                result = pickle.load(fh)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False, None
+        os.utime(f)                                         # mark as recently used
+        return True, result
+
+    def put(self, key, result):
+        """
+        stores the result, returns False if it can not be pickled
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        f   =   self._file(key)
+        tmp =   f.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with open(tmp, 'wb') as fh:
+                pickle.dump(result, fh)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            print(f"not caching the result: {e}")
+            _unlink(tmp)
+            return False
+        os.replace(tmp, f)
+        self.evict()
+        return True
+
+    def evict(self):
+        """
+        removes results unused for more than max_age, then the least recently used ones above max_size
+        """
+        now     =   time.time()
+        entries =   []
+        for f in self.path.glob('*.pkl'):
+            try:
+                st  =   f.stat()
+            except OSError:
+                continue
+            if now - st.st_mtime > self.max_age:
+                _unlink(f)
+            else:
+                entries.append((st.st_mtime, st.st_size, f))
+        total   =   sum(size for _, size, _ in entries)
+        for _, size, f in sorted(entries):
+            if total <= self.max_size: break
+            _unlink(f)
+            total -= size
+
+    def clear(self):
+        for f in self.path.glob('*.pkl'): _unlink(f)
+
+class Checkpoint:
+    """
+    Progress of an `alfrd run` saved after every step and validator, so that `alfrd run --resume`
+    continues from the first incomplete step instead of running the completed ones again.
+
+    Input
+    ---
+
+    :path:          pickle file for the checkpoint
+    :steps:         the steps of the run, a checkpoint is only resumed for the same steps
+    :key:           hash of the parameters the run started with (see `params_key`), a checkpoint
+                    is only resumed for the same key
+
+    Saved are the completed steps, the accumulated parameters (including `ret`/`ret_valid`)
+    and the `run_count` of the validators.
+    """
+    def __init__(self, path, steps, key=None):
+        self.path           =   Path(path)
+        self.steps          =   list(steps)
+        self.key            =   key
+        self.completed      =   []
+        self.params         =   {}
+        self.run_counts     =   {}
+        self._lock          =   threading.Lock()
+        self._unpicklable   =   set()
+
+    def load(self):
+        """
+        loads a saved checkpoint for the same steps, returns True if there was one
+        """
+        try:
+            with open(self.path, 'rb') as fh:
+                saved = pickle.load(fh)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return False
+        if saved.get('steps') != self.steps:
+            print(f"checkpoint at {self.path} is for the steps {saved.get('steps')}, not resuming.")
+            return False
+        if saved.get('key') != self.key:
+            print(f"checkpoint at {self.path} was saved for other parameters or input files, not resuming.")
+            return False
+        self.completed      =   saved['completed']
+        self.params         =   saved['params']
+        self.run_counts     =   saved['run_counts']
+        return True
+
+    def _picklable(self, params):
+        """
+        params without the values that can not be pickled (these are not restored on resume)
+        """
+        kept = {}
+        for k, v in params.items():
+            try:
+                pickle.dumps(v)
+                kept[k] = v
+            except Exception:
+                if k not in self._unpicklable:
+                    print(f"checkpoint: parameter '{k}' can not be saved and will not be restored on resume")
+                    self._unpicklable.add(k)
+        return kept
+
+    def record(self, params, step_name=None, run_counts=None):
+        """
+        adds the parameters (and the completed step) to the checkpoint and saves it
+        """
+        with self._lock:
+            self.params.update(self._picklable(params))
+            if step_name and step_name not in self.completed: self.completed.append(step_name)
+            if run_counts is not None: self.run_counts = dict(run_counts)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=f"{self.path.name}.{os.getpid()}.", suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as fh:
+                    pickle.dump({'steps': self.steps, 'key': self.key, 'completed': self.completed, 'params': self.params,
+                                 'run_counts': self.run_counts, 'time': time.time()}, fh)
+                os.replace(tmp, self.path)
+            except BaseException:
+                _unlink(tmp)
+                raise
+
+    def clear(self):
+        _unlink(self.path)
+
+    @staticmethod
+    def params_key(params):
+        """
+        hash of the parameters of a run, the ones read from parameter files included
+        """
+        return hashlib.sha256(json.dumps(params, sort_keys=True, default=repr).encode()).hexdigest()
@@ -0,0 +1,193 @@
+from pathlib import Path
+import shutil, sys
+import typer
+from typing import Optional
+from typing_extensions import Annotated
+import sys
+
+import alfrd
+from alfrd import c
+from alfrd.util import read_inputfile, read_params, find_paramfiles, ALFRD_DIR
+from alfrd.plugins import load_projects, List, REGISTERED_STEPS, VALIDATE_BEFORE, VALIDATE_AFTER, VALIDATORS, PipelineRun
+from alfrd.cache import StepCache, Checkpoint
+from alfrd.stats import RunLog
+from alfrd.main import PROJ_DIR, RUNLOG, list_steps, proj_dir, ls as _ls, via_daemon as _via_daemon
+
+
+alfrd_cli = typer.Typer()
+Pipeline = PipelineRun()
+
+@alfrd_cli.command()
+def init(proj: str):
+    """Initialize the project-specific plugin directory."""
+    project_dir= Path(f"{PROJ_DIR}/{proj}")
+    if not project_dir.exists():
+        _ = proj_dir(proj, create=True)
+    else:
+        print(f"Project directory already exists at {project_dir}")
+
+@alfrd_cli.command()
+def ls(proj: str):
+    """List all available pipeline steps for a project."""
+    _ls(proj)
+
+@alfrd_cli.command()
+def run(
+    step_name: str                  =   typer.Argument(help="name of the step name in project"), 
+    proj: str                       =   typer.Argument(help="name of the ALFRD project"), 
+    step_to: str                    =   None,
+    
+    params: List[str]               =   typer.Argument(None, help="Key-value pairs of parameters or parameter file path (e.g., id=123 name=Test)"),
+    steps : Optional[List[str]]     =   typer.Option(None, help="list of steps e.g., --steps=step1 --steps=step2 | supersedes values and sequence of the steps", 
+                                                     show_default=False),
+    workers: Optional[int]          =   typer.Option(None, help="maximum number of independent steps running at once", show_default=False),
+    no_cache: bool                  =   typer.Option(False, "--no-cache", help="run the steps registered with cache=True even if a cached result exists"),
+    resume: bool                    =   typer.Option(False, "--resume", help="continue from the first incomplete step of the last failed run"),
+    profile: bool                   =   typer.Option(False, "--profile", help="profile every step, written to <project>/.profile/<run>/"),
+    profile_top: int                =   typer.Option(20, help="number of functions printed for each profiled step"),
+    via_daemon: bool                =   typer.Option(False, "--via-daemon", help="run in the daemon started by `alfrd serve` for the project"),
+    sweep: Optional[str]            =   typer.Option(None, help="run the steps once per parameter file: a directory (searched as read_inputfile does) or a glob", 
+                                                     show_default=False),
+    sweep_file: str                 =   typer.Option(".inp", help="name (suffix) of the parameter files in the --sweep directory"),
+    processes: Optional[int]        =   typer.Option(None, help="number of worker processes of a --sweep, default: number of CPUs", show_default=False),
+    ):
+    """Run a specific pipeline step for a project."""    
+    if via_daemon:                                                                      # alfrd_cli called directly, else see alfrd.main
+        code                =   _via_daemon(sys.argv[1:])
+        if code is not None: raise typer.Exit(code)
+    
+    _params_found           =   {}
+    
+    if params and len(params):
+        for param in params:
+            if not '=' in param:
+                if Path(param).exists():
+                    _params_found, _, _ = read_inputfile(Path(param).absolute().parent,Path(param).name)
+                    Pipeline.update_params(_params_found)
+
+        _params_found = {param.split("=")[0]: param.split("=")[1] for param in params if '=' in param}
+    Pipeline.update_params(_params_found)
+    
+    project_dir             =   proj_dir(proj)                                          # Ensure project directory exists
+    load_projects(project_dir, steps=[])                                                # List all project steps
+    
+    if step_name not in REGISTERED_STEPS:
+        print(f"Step '{step_name}' not found! Use `ls` to view available steps.")
+        raise typer.Exit()
+    allsteps    =   steps or list(REGISTERED_STEPS.keys())
+    idx_from    =   allsteps.index(step_name)
+    idx_to      =   idx_from+1
+    
+    if step_to:
+        if step_to not in REGISTERED_STEPS:
+            print(f"Step '{step_to}' not found! Use `ls` to view available steps.")
+            raise typer.Exit()
+        else:
+            idx_from    =   allsteps.index(step_name)
+            idx_to      =   allsteps.index(step_to)+1
+            
+    steps     =   allsteps[idx_from:idx_to]
+    print("Following steps will be executed in the sequence (independent steps run concurrently):")
+    print(steps,"\n")
+    load_projects(project_dir, steps=steps)                                             # Import only the steps to run
+    
+    Pipeline.project_name   =   proj
+    Pipeline.cache          =   None if no_cache else StepCache()
+    run_key                 =   Checkpoint.params_key(Pipeline.params)               # one checkpoint per steps and parameters
+    Pipeline.checkpoint     =   Checkpoint(project_dir / f".checkpoint-{run_key[:16]}.pkl", steps, key=run_key)
+    Pipeline.runlog         =   RunLog(project_dir / RUNLOG, project=proj)
+    Pipeline.profile        =   profile
+    Pipeline.profile_top    =   profile_top
+    Pipeline.profile_dir    =   project_dir / ".profile" / Pipeline.runlog.run
+    if sweep:
+        files               =   find_paramfiles(sweep, sweep_file)
+        if not files:
+            print(f"No parameter files found for --sweep {sweep}.")
+            raise typer.Exit(1)
+        if resume: print(f"{c['y']}--resume is not supported with --sweep, running all the steps.{c['x']}")
+        Pipeline.checkpoint =   None
+        results             =   Pipeline.sweep([(f, read_params(f)) for f in files], steps, processes=processes, workers=workers,
+                                               log_dir=project_dir / ".sweep" / Pipeline.runlog.run)
+        if any(r["status"] == "failed" for r in results): raise typer.Exit(1)
+        return
+    completed               =   Pipeline.resume() if resume else []
+    if resume and not Pipeline.checkpoint.path.exists():
+        print(f"{c['y']}no checkpoint of a run with these parameters, running all the steps.{c['x']}")
+    Pipeline.run_steps(steps, workers=workers, completed=completed)
+
+@alfrd_cli.command()
+def stats(proj: str,
+          last: Optional[int]   =   typer.Option(None, help="only the last n runs", show_default=False),
+          step: Optional[str]   =   typer.Option(None, help="only this step or validator", show_default=False),
+          json_out: bool        =   typer.Option(False, "--json", help="print the statistics as JSON"),
+          ):
+    """Show where the time of a project's runs goes (per step and validator, across runs)."""
+    import json
+    from alfrd import stats as _stats
+    
+    project_dir = proj_dir(proj)
+    records     = _stats.read(project_dir / RUNLOG, last=last)
+    if step: records = [r for r in records if r.get("name") == step]
+    if not records:
+        print(f"No runs recorded for {proj} yet.")
+        raise typer.Exit()
+    summary     = _stats.summarize(records)
+    if json_out:
+        print(json.dumps(summary, indent=1))
+    else:
+        print(f"\n  {c['bc']}{proj.upper()}{c['x']}: {len({r.get('run') for r in records})} runs\n")
+        print(_stats.format_summary(summary))
+
+@alfrd_cli.command()
+def serve(proj: str,
+          key: str  =   typer.Option(f"{Path().home()}/.alfred/credentials.json", help="service account credentials to authorize once for all the runs"),
+          ):
+    """Keep a warm process for a project, used by `alfrd run ... --via-daemon`."""
+    import signal
+    from alfrd.daemon import Daemon
+    
+    project_dir = proj_dir(proj)
+    daemon      = Daemon(proj, key=key)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        daemon.warm(project_dir)
+        print(f"serving {c['bc']}{proj.upper()}{c['x']} at {daemon.path}")
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.server_close()
+
+@alfrd_cli.command()
+def add(script_path: str, proj: str,
+        symlink:    bool    = typer.Option(None, help="instead of copying files a shortcut is placed in the project folder"), 
+        ):
+    """Add a new plugin to a specific project."""
+    
+    project_dir = proj_dir(proj)
+    script_path = Path(script_path)
+
+    if not script_path.is_file():
+        print(f"File '{script_path}' not found.")
+        raise typer.Exit()
+
+    dest_path = project_dir / script_path.name
+    # Path.rem(str(dest_path))
+    if symlink:
+        if Path(dest_path).exists():
+            Path.unlink(dest_path)
+        Path(dest_path).symlink_to(script_path)
+    else:
+        shutil.copy(script_path, dest_path)
+    print(f"Added plugin to {proj}: {dest_path}")
+
+@alfrd_cli.command()
+def rm(proj: str):
+    """Remove a specific project."""
+    project_dir = proj_dir(proj)
+    shutil.rmtree(project_dir)
+    
+    print(f"removed {proj}: {project_dir}")
+
+if __name__ == "__main__":
+    alfrd_cli()
@@ -0,0 +1,180 @@
+"""
+Persistent `alfrd serve` daemon, keeping a warm interpreter for a project.
+
+`alfrd serve <proj>` imports numpy/pandas/gspread, executes the plugins of the project and authorizes
+the sheet client once, then listens on a Unix socket (~/.alfrd/run/<proj>.sock). Every request is run in
+a fork of the daemon, so it starts with all of this already in memory and a run can not leave state
+(parameters, registered steps) behind for the next one. Plugins changed since the daemon started are
+executed again in the fork.
+
+    $ alfrd serve myproj &
+    $ alfrd run step1 myproj id=123 --via-daemon             # same arguments as `alfrd run`
+
+The client sends {"argv", "cwd", "env"} as one JSON line, the output of the run is streamed back
+followed by a trailer with the exit code.
+"""
+from pathlib import Path
+import atexit, json, os, signal, socket, socketserver, sys, traceback
+from alfrd import c
+from alfrd.util import ALFRD_DIR
+
+RUN_DIR     =   ALFRD_DIR / 'run'
+TRAILER     =   b'\0ALFRD-EXIT:'                    # followed by the exit code and a newline
+_TAIL       =   len(TRAILER) + 8                    # bytes held back by the client until the end of the stream
+
+def socket_path(proj):
+    """Unix socket of the daemon serving `proj`"""
+    return RUN_DIR / f"{proj}.sock"
+
+def _refresh_credentials(key):
+    """authorizes the sheet client once and renews its token when expired, so the forks do not have to"""
+    if not key or not Path(key).exists(): return
+    from alfrd.lib import authorized_client, client_credentials
+    try:
+        creds   =   client_credentials(authorized_client(key))
+        if creds is not None and not creds.valid:
+            from google.auth.transport.requests import Request
+            creds.refresh(Request())
+    except Exception as e:
+        print(f"{c['y']}could not authorize with {key}: {e}{c['x']}")
+
+def run_cli(argv):
+    """
+    runs the `alfrd` command line with the arguments `argv` in this process
+
+    Returns
+    ---
+
+    exit code
+    """
+    import typer.main
+    from alfrd.cli import alfrd_cli
+    command     =   typer.main.get_command(alfrd_cli)
+    try:
+        code    =   command.main(args=list(argv), prog_name='alfrd', standalone_mode=False)
+        return code if isinstance(code, int) else 0
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except Exception as e:
+        if hasattr(e, 'show'):                      # usage errors of the command line
+            e.show()
+            return getattr(e, 'exit_code', 1)
+        traceback.print_exception(type(e), e, e.__traceback__)
+        return 1
+
+class RunHandler(socketserver.StreamRequestHandler):
+    """runs one `alfrd` command line (in the forked child) with its output sent to the client"""
+    def handle(self):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        line        =   self.rfile.readline()
+        if not line: return                         # `ping`, connected and closed
+        request     =   json.loads(line)
+        os.chdir(request.get('cwd') or os.getcwd())
+        if request.get('env') is not None:
+            os.environ.clear()
+            os.environ.update(request['env'])
+        sys.argv    =   ['alfrd'] + request['argv']
+
+        sys.stdout.flush(); sys.stderr.flush()
+        conn        =   self.connection.fileno()
+        devnull     =   os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(conn, 1)
+        os.dup2(conn, 2)
+        for stream in (sys.stdout, sys.stderr):
+            if hasattr(stream, 'reconfigure'): stream.reconfigure(line_buffering=True)
+
+        code        =   1
+        try:
+            code    =   run_cli(request['argv'])
+        finally:
+            try:
+                atexit._run_exitfuncs()             # the fork leaves with os._exit
+            except Exception:
+                traceback.print_exc()
+            sys.stdout.flush(); sys.stderr.flush()
+            self.connection.sendall(TRAILER + f"{code}\n".encode())
+
+class Daemon(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    """
+    Input
+    ---
+
+    :proj:          project to serve
+    :key:           service account credentials to authorize once, skipped if the file does not exist
+    :path:          socket, defaults to `socket_path(proj)`
+    """
+    def __init__(self, proj, key=None, path=None):
+        self.proj           =   proj
+        self.key            =   key
+        self.path           =   Path(path or socket_path(proj))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            if ping(self.path):
+                raise RuntimeError(f"alfrd is already serving {proj} at {self.path}")
+            self.path.unlink()                      # left over by a daemon which did not exit cleanly
+        super().__init__(str(self.path), RunHandler)
+
+    def warm(self, project_dir):
+        """imports the heavy modules and all the plugins of the project, authorizes the sheet client"""
+        for name in ('numpy', 'pandas', 'gspread'):
+            try:
+                __import__(name)
+            except ImportError:
+                pass
+        from alfrd.plugins import load_projects
+        load_projects(project_dir)
+        _refresh_credentials(self.key)
+
+    def process_request(self, request, client_address):
+        _refresh_credentials(self.key)              # renewed in the daemon, inherited by the fork
+        super().process_request(request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+def ping(path):
+    """True if a daemon is listening on the socket"""
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(str(path))
+        return True
+    except OSError:
+        return False
+    finally:
+        s.close()
+
+def request(proj, argv, path=None):
+    """
+    runs `alfrd <argv>` in the daemon serving `proj`, streaming its output to stdout
+
+    Returns
+    ---
+
+    exit code, None if no daemon is serving the project
+    """
+    s       =   socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(str(path or socket_path(proj)))
+    except OSError:
+        s.close()
+        return None
+    with s:
+        s.sendall((json.dumps({'argv': list(argv), 'cwd': os.getcwd(), 'env': dict(os.environ)}) + '\n').encode())
+        out, held   =   getattr(sys.stdout, 'buffer', sys.stdout), b''
+        while True:
+            chunk   =   s.recv(65536)
+            if not chunk: break
+            held    +=  chunk
+            if len(held) > _TAIL:
+                out.write(held[:-_TAIL]); out.flush()
+                held    =   held[-_TAIL:]
+    held, sep, trailer  =   held.rpartition(TRAILER)
+    if not sep:                                     # the run was killed before sending its exit code
+        held, trailer   =   trailer, b'1'
+    out.write(held); out.flush()
+    return int(trailer.strip() or 1)
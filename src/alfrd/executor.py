@@ -0,0 +1,335 @@
+"""
+Executors to run pipeline work in parallel.
+
+`run_rows` runs a step function for many rows of a LogFrame across a thread or process pool,
+the results are written back to the LogFrame by the calling thread only (single writer).
+
+    from alfrd.executor import run_rows
+
+    def fits_to_ms(fitsfile, row):
+        ...
+        return td                                       # value for the column, or a dict {colname: value}
+
+    count, failed = run_rows(lf, fits_to_ms, colname='fits to ms', select=lambda row: row['TSYS'] == 'True', workers=16)
+
+`ProcessPool` runs external commands (e.g picard) with as many jobs at once as the cores and RAM of the
+node allow, the other jobs wait in a queue. Every job reports its wall time, CPU time and peak RSS, and
+is killed if it runs longer than its `timeout` or grows above its `max_rss`.
+
+    from alfrd.executor import ProcessPool
+
+    pool    =   ProcessPool(reserve=4*GiB)                  # shared by the steps/threads of the run
+    job     =   pool.run(["picard", "-n", "10", "--input", wd_ifolder], cores=10, mem=16*GiB, timeout=6*3600)
+    print(job.returncode, job.wall, job.cpu_time, job.peak_rss)
+"""
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import os, signal, subprocess, tempfile, threading, time, traceback
+from collections import deque
+from alfrd.util import LazyModule
+
+psutil      =   LazyModule('psutil')
+GiB         =   1024**3
+
+def select_rows(lf, select=None):
+    """
+    rows of the LogFrame to run on as a list of (primary_value, row dict)
+
+    :select:    None for all rows, a list of primary values, or a function row dict --> bool
+    """
+    with lf._lock:
+        records = lf.df_sheet.to_dict('records')
+    pcol        =   lf.primary_colname
+    rows        =   [(str(r[pcol]).strip(), r) for r in records]
+    if select is None:
+        return rows
+    if callable(select):
+        return [(k, r) for k, r in rows if select(r)]
+    keys        =   {str(k).strip() for k in select}
+    return [(k, r) for k, r in rows if k in keys]
+
+def run_rows(lf, step, colname='', select=None, workers=None, mode='thread', count=0, failed=0,
+             fail_value='failed', flush_every=None):
+    """
+    runs `step(primary_value, row)` for the selected rows in parallel and puts the results in the LogFrame
+
+    Input
+    ---
+
+    :lf:            LogFrame to read the rows from and write the results to
+    :step:          function (primary_value, row dict) --> value for `colname` or a dict {colname: value};
+                    None is not written. It must be picklable (module level) for mode='process'
+    :colname:       column for the result, defaults to lf.working_col
+    :select:        rows to run on, see `select_rows`
+    :workers:       pool size, defaults to the number of cpus
+    :mode:          'thread' (e.g steps running subprocesses) or 'process' (python heavy steps)
+    :count:         success count to continue from
+    :failed:        failed count to continue from
+    :fail_value:    value put in `colname` if the step raises, followed by the error
+    :flush_every:   calls lf.update_sheet after every n finished rows
+
+    Returns
+    ---
+
+    (count, failed)
+    """
+    colname         =   colname or lf.working_col
+    rows            =   select_rows(lf, select)
+    workers         =   workers or os.cpu_count() or 1
+    Pool            =   ProcessPoolExecutor if mode == 'process' else ThreadPoolExecutor
+    primary_value   =   lf.primary_value
+
+    try:
+        with Pool(max_workers=workers) as pool:
+            futures     =   {pool.submit(step, key, row): key for key, row in rows}
+            for n, future in enumerate(as_completed(futures), 1):
+                lf.primary_value    =   futures[future]
+                try:
+                    result          =   future.result()
+                    if isinstance(result, dict):
+                        for col, value in result.items(): lf.put_value(value, colname=col)
+                        count       +=  1
+                    elif result is not None:
+                        count       =   lf.put_value(result, colname=colname, count=count)
+                    else:
+                        count       +=  1
+                except Exception as e:
+                    print(f"failed: {lf.primary_value} : {e}")
+                    traceback.print_exc()
+                    failed          =   lf.put_value(f"{fail_value}: {e}", colname=colname, count=failed)
+                if flush_every and n % flush_every == 0:
+                    lf.update_sheet(count=count, failed=failed)
+    finally:
+        lf.primary_value    =   primary_value
+    return count, failed
+
+class Job:
+    """
+    external command run by a ProcessPool, `result()` waits for it
+
+    Attributes
+    ---
+
+    :returncode:    exit code, negative for the signal which killed it
+    :stdout:        output if run with capture=True (also :stderr:)
+    :wall:          seconds from start to exit (not counting the time in the queue)
+    :cpu_time:      user + system seconds of the command and its children
+    :peak_rss:      peak resident memory in bytes of the command and its children
+    :killed:        None, 'timeout' or 'max_rss' if the pool killed the job
+    """
+    def __init__(self, cmd, cores=1, mem=0, timeout=None, max_rss=None, capture=False, popen_kwargs=None):
+        self.cmd            =   cmd
+        self.cores          =   cores
+        self.mem            =   mem
+        self.timeout        =   timeout
+        self.max_rss        =   max_rss
+        self.capture        =   capture
+        self.popen_kwargs   =   popen_kwargs or {}
+        self.proc           =   None
+        self.returncode     =   None
+        self.stdout         =   None
+        self.stderr         =   None
+        self.submitted      =   time.time()
+        self.started        =   None
+        self.wall           =   None
+        self.cpu_time       =   0.0
+        self.rss            =   0
+        self.peak_rss       =   0
+        self.killed         =   None
+        self.error          =   None
+        self._done          =   threading.Event()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """
+        waits for the job and returns it, raises the error if the command could not be started
+        """
+        if not self._done.wait(timeout): raise TimeoutError(f"job {self.cmd} still running")
+        if self.error is not None: raise self.error
+        return self
+
+    def to_dict(self):
+        return {'cmd': self.cmd, 'returncode': self.returncode, 'killed': self.killed, 'wall': self.wall,
+                'queued': (self.started or self.submitted) - self.submitted, 'cpu_time': self.cpu_time,
+                'peak_rss': self.peak_rss, 'cores': self.cores, 'mem': self.mem}
+
+class ProcessPool:
+    """
+    runs external commands within the cores and memory of the node, queueing them when it is saturated
+
+    Input
+    ---
+
+    :cores:         cores to use, defaults to the cores available to this process
+    :mem:           RAM in bytes the jobs may use, defaults to the memory available (psutil) when a job starts
+    :reserve:       RAM in bytes always left free for the rest of the node
+    :max_jobs:      maximum number of jobs at once, defaults to `cores`
+    :poll:          seconds between the resource samples of the running jobs
+
+    A job starts when its `cores` are free and the available memory, minus what the running jobs declared
+    (`mem`) but do not use yet, covers its `mem`. A job asking for more than the node has starts alone.
+    """
+    def __init__(self, cores=None, mem=None, reserve=0, max_jobs=None, poll=0.5):
+        if cores is None:
+            cores       =   len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else psutil.cpu_count()
+        self.cores      =   cores or 1
+        self.mem        =   mem
+        self.reserve    =   reserve
+        self.max_jobs   =   max_jobs or self.cores
+        self.poll       =   poll
+        self.queue      =   deque()
+        self.running    =   []
+        self.jobs       =   []
+        self._cond      =   threading.Condition()
+        self._closed    =   False
+        self._scheduler =   threading.Thread(target=self._schedule, name='alfrd-process-pool', daemon=True)
+        self._scheduler.start()
+
+    def submit(self, cmd, cores=1, mem=0, timeout=None, max_rss=None, capture=False, **popen_kwargs):
+        """
+        queues the command (list or string with shell=True), the keyword arguments go to subprocess.Popen
+
+        :cores:     cores the job uses (e.g its -n/--threads option)
+        :mem:       RAM in bytes the job is expected to need
+        :timeout:   seconds after which the job is killed
+        :max_rss:   bytes of resident memory above which the job is killed
+        :capture:   keep stdout/stderr (as str) in the job instead of passing them through
+        """
+        job = Job(cmd, cores=min(cores, self.cores), mem=mem, timeout=timeout, max_rss=max_rss, capture=capture,
+                  popen_kwargs=popen_kwargs)
+        with self._cond:
+            if self._closed: raise RuntimeError('ProcessPool is shut down')
+            self.queue.append(job)
+            self.jobs.append(job)
+            self._cond.notify_all()
+        return job
+
+    def run(self, cmd, **kwargs):
+        """
+        same as `submit` and waits for the job to finish
+        """
+        return self.submit(cmd, **kwargs).result()
+
+    def map(self, cmds, **kwargs):
+        """
+        runs all the commands with the same options, returns the finished jobs in the same order
+        """
+        return [job.result() for job in [self.submit(cmd, **kwargs) for cmd in cmds]]
+
+    def _available(self):
+        """memory in bytes the next job may use"""
+        free        =   psutil.virtual_memory().available
+        if self.mem is not None:
+            free    =   min(free, self.mem - sum(job.mem for job in self.running))
+        pending     =   sum(max(job.mem - job.rss, 0) for job in self.running)      # declared but not used yet
+        return free - pending - self.reserve
+
+    def _fits(self, job):
+        if not self.running: return True
+        if len(self.running) >= self.max_jobs: return False
+        if sum(j.cores for j in self.running) + job.cores > self.cores: return False
+        return job.mem <= self._available()
+
+    def _start(self, job):
+        kwargs          =   dict(job.popen_kwargs)
+        if job.capture:
+            job._out    =   tempfile.TemporaryFile()
+            job._err    =   tempfile.TemporaryFile()
+            kwargs.update(stdout=job._out, stderr=job._err)
+        kwargs.setdefault('start_new_session', True)                               # to kill the whole process group
+        try:
+            job.proc    =   subprocess.Popen(job.cmd, **kwargs)
+        except Exception as e:
+            job.error   =   e
+            job._done.set()
+            return
+        job.started     =   time.time()
+        self.running.append(job)
+        threading.Thread(target=self._wait, args=(job,), daemon=True).start()
+
+    def _wait(self, job):
+        """reaps the job with its resource usage (wait4 counts the children it waited for)"""
+        try:
+            _, status, usage    =   os.wait4(job.proc.pid, 0)
+            job.returncode      =   -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+            job.cpu_time        =   max(job.cpu_time, usage.ru_utime + usage.ru_stime)
+            job.peak_rss        =   max(job.peak_rss, usage.ru_maxrss * 1024)            # kilobytes on linux
+        except ChildProcessError:
+            job.returncode      =   job.proc.wait()
+        job.proc.returncode     =   job.returncode
+        job.wall                =   time.time() - job.started
+        if job.capture:
+            for name in ('_out', '_err'):
+                f   =   getattr(job, name)
+                f.seek(0)
+                setattr(job, 'stdout' if name == '_out' else 'stderr', f.read().decode(errors='replace'))
+                f.close()
+        with self._cond:
+            self.running.remove(job)
+            self._cond.notify_all()
+        job._done.set()
+
+    def _sample(self, job):
+        """updates the RSS and CPU time of the running job and its children, kills it on overrun"""
+        try:
+            proc    =   psutil.Process(job.proc.pid)
+            procs   =   [proc] + proc.children(recursive=True)
+        except psutil.Error:
+            return
+        rss, cpu    =   0, 0.0
+        for p in procs:
+            try:
+                rss +=  p.memory_info().rss
+                t   =   p.cpu_times()
+                cpu +=  t.user + t.system
+            except psutil.Error:
+                pass
+        job.rss         =   rss
+        job.peak_rss    =   max(job.peak_rss, rss)
+        job.cpu_time    =   max(job.cpu_time, cpu)
+        if job.timeout is not None and time.time() - job.started > job.timeout:
+            self._kill(job, 'timeout')
+        elif job.max_rss is not None and rss > job.max_rss:
+            self._kill(job, 'max_rss')
+
+    def _kill(self, job, reason):
+        if job.killed or job.returncode is not None: return
+        job.killed  =   reason
+        print(f"killing {job.cmd}: {reason} exceeded")
+        try:
+            os.killpg(job.proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            job.proc.kill()
+
+    def _schedule(self):
+        while True:
+            with self._cond:
+                while self.queue and self._fits(self.queue[0]):
+                    self._start(self.queue.popleft())
+                if self._closed and not self.queue and not self.running: return
+                running =   list(self.running)
+                self._cond.wait(self.poll if running or self.queue else None)
+            for job in running:
+                if not job.done(): self._sample(job)
+
+    def shutdown(self, wait=True, cancel=False):
+        """
+        stops accepting jobs, `cancel` drops the queued ones, `wait` waits for the rest to finish
+        """
+        with self._cond:
+            self._closed    =   True
+            if cancel:
+                for job in self.queue:
+                    job.error   =   RuntimeError('cancelled')
+                    job._done.set()
+                self.queue.clear()
+            self._cond.notify_all()
+        if wait: self._scheduler.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown(wait=True)
+        return False
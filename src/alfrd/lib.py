@@ -1,19 +1,234 @@
-import gspread
-from google.oauth2.service_account import Credentials
-import pandas as pd
-import re, time
+import re, time, random, threading, os, json, atexit, weakref
+from collections import Counter
 from pathlib import Path
+from contextlib import contextmanager
 import warnings
-from alfrd import c
-from gspread_formatting import ConditionalFormatRule, GridRange, BooleanCondition, BooleanRule, CellFormat, Color, get_conditional_format_rules
-import numpy as np
+from alfrd import c, ALFRD_DIR
+from alfrd.util import LazyModule, locked
+
+# imported on first use, see alfrd.util.LazyModule
+gspread     =   LazyModule('gspread')
+pd          =   LazyModule('pandas')
+np          =   LazyModule('numpy')
+
+def cell_value(value):
+    """
+    JSON compliant value for a sheet cell i.e. NaN --> '' and numpy scalars --> python scalars
+    """
+    if pd.isna(value): return ''
+    return value.item() if isinstance(value, np.generic) else value
+
+def _close_at_exit(ref):
+    """pushes the cells left dirty by a LogFrame which was never closed"""
+    lf = ref()
+    if lf is None or not (lf._dirty or lf._worker): return
+    try:
+        if not lf.close(): print(f"{c['r']}{len(lf._dirty)} cells could not be sent to the sheet{c['x']}")
+    except Exception as e:
+        print(f"{c['r']}failed to update on google sheet at exit: {e}{c['x']}")
+
+def set_iat(df, i, j, value):
+    """
+    sets df.iat[i, j] in place, upcasting the column to object once if its dtype can not hold the value
+    """
+    try:
+        df.iat[i, j] = value
+    except (TypeError, ValueError):
+        df.isetitem(j, df.iloc[:, j].astype(object))
+        df.iat[i, j] = value
+
+class TokenBucket:
+    """
+    Token bucket to keep the sheet requests within the Google Sheets quota.
+
+    Input
+    ---
+
+    :rate:      number of requests allowed every `per` seconds (sheets allows 60/min per user, 300/min per project)
+    :per:       time window in seconds for the rate
+    :burst:     maximum number of requests that can be made at once after being idle
+    :clock:     monotonic clock function, replace for testing
+    :sleep:     sleep function, replace for testing
+
+    Share one instance between several GSC objects to respect the per project quota.
+    """
+    def __init__(self, rate=60, per=60.0, burst=10, clock=time.monotonic, sleep=time.sleep):
+        self.rate           =   rate
+        self.per            =   per
+        self.burst          =   burst
+        self.clock          =   clock
+        self.sleep          =   sleep
+        self.tokens         =   float(burst)
+        self.t_last         =   clock()
+        self._lock          =   threading.Lock()
+
+    def _refill(self):
+        now                 =   self.clock()
+        self.tokens         =   min(self.burst, self.tokens + (now - self.t_last) * self.rate / self.per)
+        self.t_last         =   now
+
+    def acquire(self, tokens=1):
+        """
+        blocks until `tokens` requests can be made, returns the time waited in seconds
+        """
+        waited  =   0.0
+        with self._lock:
+            self._refill()
+            while self.tokens < tokens:
+                wait    =   (tokens - self.tokens) * self.per / self.rate
+                self.sleep(wait)
+                waited  +=  wait
+                self._refill()
+            self.tokens -=  tokens
+        return waited
+
+def api_error_code(e):
+    """
+    HTTP status code of a gspread APIError (None if unknown)
+    """
+    code = getattr(e, 'code', None)
+    if not isinstance(code, int):
+        code = getattr(getattr(e, 'response', None), 'status_code', None)
+    return code
+
+def is_retryable(e):
+    """
+    rate limit (429) and server side (5xx) errors are worth retrying
+    """
+    code = api_error_code(e)
+    return isinstance(code, int) and (code == 429 or 500 <= code < 600)
+
+class Journal:
+    """
+    Append-only write-ahead journal of the cell edits sent to a sheet, shared by the processes using the sheet.
+
+    Every edit is written (and fsync'ed) before it is pushed as a JSON line
+    {"pid", "seq", "pcol", "key", "col", "value", "ts"}, where the row is identified by its
+    value `key` in the primary column `pcol` and the edit by its id (pid, seq).
+    Edits which are not acknowledged are replayed by `GSC.open()` on the next connection.
+    Acknowledging rewrites the file with the edits still pending, of all the processes.
+    Every access holds an exclusive lock on `<path>.lock` (see `alfrd.util.locked`).
+    """
+    def __init__(self, path):
+        self.path           =   Path(path)
+        self.lockfile       =   self.path.with_name(self.path.name + '.lock')
+        self.seq            =   0
+        self._lock          =   threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.locked():
+            self.seq        =   max((rec['seq'] for rec in self._read()), default=0)   # a reused pid continues after
+
+    @contextmanager
+    def locked(self):
+        with self._lock, locked(self.lockfile):
+            yield
+
+    def _read(self):
+        """records of the file, in the order they were written"""
+        records             =   []
+        try:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:              # torn last line after a crash
+                        continue
+                    if 'ack' not in rec: records.append(rec)
+        except FileNotFoundError:
+            pass
+        return records
+
+    def _write(self, lines, mode='a'):
+        path                =   self.path if mode == 'a' else self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(path, mode) as f:
+            f.write(''.join(json.dumps(line, default=str) + '\n' for line in lines))
+            f.flush()
+            os.fsync(f.fileno())
+        if path != self.path: os.replace(path, self.path)
+
+    def append(self, edits):
+        """
+        journals a list of (pcol, key, col, value) edits, returns their ids
+        """
+        with self.locked():
+            records, ts, pid    =   [], time.time(), os.getpid()
+            for pcol, key, col, value in edits:
+                self.seq    +=  1
+                records.append({'pid': pid, 'seq': self.seq, 'pcol': pcol, 'key': key, 'col': col, 'value': value, 'ts': ts})
+            self._write(records)
+            return [(pid, rec['seq']) for rec in records]
+
+    def ack(self, ids):
+        """
+        marks the edits as pushed to the sheet, older edits of the same cells are dropped too
+        """
+        if not ids: return
+        ids                 =   {tuple(i) for i in ids}
+        with self.locked():
+            records         =   self._read()
+            acked           =   {}                  # cell --> latest pushed edit
+            for rec in records:
+                if (rec['pid'], rec['seq']) in ids: acked[(rec['pcol'], rec['key'], rec['col'])] = rec
+            keep            =   []
+            for rec in records:
+                last        =   acked.get((rec['pcol'], rec['key'], rec['col']))
+                if last is None or not self._older(rec, last): keep.append(rec)
+            if len(keep) < len(records): self._write(keep, mode='w')
+
+    @staticmethod
+    def _older(rec, than):
+        """`rec` was made before (or is) `than`"""
+        if rec['pid'] == than['pid']: return rec['seq'] <= than['seq']
+        return rec['ts'] <= than['ts']
+
+    def pending(self):
+        """
+        edits not yet acknowledged (of every process), in the order they were made
+        """
+        with self.locked():
+            return self._read()
+
+_CLIENTS    =   {}          # credentials file --> authorized gspread client, shared by the GSC instances of the process
+# sheets, and the modification time of the spreadsheet from Drive for `GSC.refresh` (the Drive API must be enabled)
+SCOPES      =   ("https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive.metadata.readonly")
+
+def authorized_client(key, scopes=SCOPES):
+    """
+    gspread client for the service account `key`, authorized once per process
+    (and inherited by the runs forked from `alfrd serve`)
+    """
+    key = str(key)
+    if key not in _CLIENTS:
+        from google.oauth2.service_account import Credentials
+        _CLIENTS[key]   =   gspread.authorize(Credentials.from_service_account_file(key, scopes=list(scopes)))
+    return _CLIENTS[key]
+
+def client_credentials(client):
+    """
+    credentials of a gspread client (gspread >= 6 keeps them in the http client)
+    """
+    return getattr(getattr(client, 'http_client', client), 'auth', None)
+
 class GSC:
     """
     Creates instance of google Google Spreadsheet Credential to open and update a worksheet
+
+    All requests to the sheet go through a token bucket (`limiter`) and are retried with exponential
+    backoff on quota/server errors. Cell updates can be queued with `update_cell(..., defer=True)`
+    and are then coalesced into as few `batch_update` calls as possible by `flush()`.
+
+    Cell edits made through LogFrame are written to a local `Journal` before being sent, by default at
+    ~/.alfrd/journal/<sid>_<worksheet>.jsonl, and replayed by `open()` if they never reached the sheet.
+    Pass `journal=<path>` to choose the file or `journal=False` to disable it.
+
+    The credentials are authorized for the sheets and for reading the Drive metadata of the spreadsheet (`SCOPES`),
+    `refresh()` asks Drive for the modification time to download the sheet only when it changed.
     """
-    def __init__(self, sid='', url='', key=f"{Path().home()}/.alfred/credentials.json", wid=0, wname=''):
+    def __init__(self, sid='', url='', key=f"{Path().home()}/.alfred/credentials.json", wid=0, wname='',
+                 client=None, limiter=None, retries=5, backoff=1.0, max_backoff=64.0, max_batch=5000, journal=True):
         """
         if sid is empty, uses url to get the spreadsheet id
+        if client is given (e.g a fake gspread client or `alfrd.backend.LocalClient`) the credentials are not loaded.
         """
         self.sid            =   sid
         self.url            =   url
@@ -21,62 +236,356 @@ class GSC:
         self.wid            =   wid
         self.wname          =   wname
         self.authorized     =   False
-        self.scopes         =   ["https://www.googleapis.com/auth/spreadsheets"]
-        self.creds          =   Credentials.from_service_account_file(key, scopes=self.scopes)
+        self.scopes         =   list(SCOPES)
+        self.limiter        =   limiter or TokenBucket()
+        self.retries        =   retries
+        self.backoff        =   backoff
+        self.max_backoff    =   max_backoff
+        self.max_batch      =   max_batch
+        self.pending        =   {}                  # A1 cell --> values, waiting for the next flush
+        self.header         =   []                  # column names of the sheet (first row)
+        self.row_map        =   None                # dataframe row position --> sheet row, None if the whole sheet is loaded
+        self.col_map        =   None                # dataframe column name --> sheet column, None if all the columns are loaded
+        self.open_args      =   {}                  # columns/rows/filter of the last `open`
+        self.modified       =   None                # modification time of the spreadsheet at the last `open`/`refresh`
+        self._mtime_error   =   False               # the modification time could not be read, warned once
+        self.journal        =   Journal(journal) if isinstance(journal, (str, Path)) else None
+        self._journal       =   journal
+        self._lock          =   threading.RLock()
+        if client is not None:
+            self.client     =   client
+            self.creds      =   None
+            self.authorized =   True
+        else:
+            self.creds      =   None
         
     def auth(self):
-        self.client         =   gspread.authorize(self.creds)
+        self.client         =   authorized_client(self.key, self.scopes)
+        self.creds          =   client_credentials(self.client)
         self.authorized     =   True
 
-    def open(self):
+    def call(self, func, *args, **kwargs):
+        """
+        calls a sheet request `func` within the quota, retrying with exponential backoff on 429/5xx errors
+        """
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                return func(*args, **kwargs)
+            except gspread.exceptions.APIError as e:
+                if attempt >= self.retries or not is_retryable(e): raise
+                delay   =   min(self.max_backoff, self.backoff * 2**attempt) + random.uniform(0, self.backoff)
+                print(f"{c['y']}API Error {api_error_code(e)}, retrying in {delay:.1f}s{c['x']}")
+                self.limiter.sleep(delay)
+                attempt +=  1
+
+    def open(self, columns=None, rows=None, filter=None):
+        """
+        loads the worksheet in `df`, by default the whole sheet. Only a part of it is downloaded (with `batch_get`)
+        if any of the following are given:
+
+        :columns:       column names to load, include the primary column of the LogFrame
+        :rows:          data rows to load as 0-based positions (a range or list), 0 is the row below the header
+        :filter:        dict column name --> value or function (str --> bool), only the rows matching all are loaded,
+                        e.g {'TSYS': 'True', 'fits to ms': lambda v: not v}
+
+        Cells of a partly loaded sheet are written back to their sheet row/column (`row_map`, `col_map`),
+        columns added to `df` are added to the sheet after its last column.
+        """
         if not self.authorized: self.auth()
         if not self.sid: 
             regex = "([\w-]){44}"
             sid_match = re.search(regex,self.url)
             self.sid = str(sid_match.group())
 
-        self.spreadsheet    =   self.client.open_by_key(self.sid)
-        self.sheet          =   self.spreadsheet.get_worksheet(self.w) if not self.wname else self.spreadsheet.worksheet(self.wname)
-        self.df             =   pd.DataFrame(self.sheet.get_all_records(numericise_ignore=['all']))
+        self.spreadsheet    =   self.call(self.client.open_by_key, self.sid)
+        self.sheet          =   self.call(self.spreadsheet.get_worksheet, self.wid) if not self.wname else self.call(self.spreadsheet.worksheet, self.wname)
+        self.open_args      =   {'columns': columns, 'rows': rows, 'filter': filter}
+        self.modified       =   self.last_update()                  # before the download, later changes are refreshed
+        if columns is None and rows is None and not filter:
+            self.df         =   pd.DataFrame(self.call(self.sheet.get_all_records, numericise_ignore=['all']))
+            self.header     =   list(self.df.columns)
+            self.row_map    =   None
+            self.col_map    =   None
+        else:
+            self.df         =   self.open_ranges(columns=columns, rows=rows, filter=filter)
         print(f"{c['g']}Success!{c['x']}")
+        if self._journal is True and self.journal is None:
+            self.journal    =   Journal(ALFRD_DIR / 'journal' / f"{self.sid}_{self.wname or self.wid}.jsonl")
+        if self.journal: self.replay_journal()
         return self.df
 
+    def batch_get(self, ranges, size=100):
+        """
+        values of the A1 ranges, requested `size` ranges at a time
+        """
+        values = []
+        for k in range(0, len(ranges), size):
+            values.extend(self.call(self.sheet.batch_get, ranges[k:k + size]))
+        return values
+
+    def open_ranges(self, columns=None, rows=None, filter=None, max_gap=100):
+        """
+        downloads only the columns/rows needed (see `open`) and returns them as a dataframe of strings,
+        rows to keep less than `max_gap` rows apart are requested in the same range
+        """
+        self.header         =   [str(h) for h in (self.batch_get(['1:1'])[0] or [[]])[0]]
+        missing             =   [col for col in list(columns or []) + list(filter or {}) if col not in self.header]
+        if missing: raise KeyError(f"columns not in the sheet: {', '.join(missing)}")
+        columns             =   list(dict.fromkeys(columns or self.header))
+        col_pos             =   {col: self.header.index(col) + 1 for col in columns}
+        letter              =   lambda j: re.sub(r'\d', '', gspread.utils.rowcol_to_a1(1, j))
+
+        keep                =   sorted(set(rows)) if rows is not None else None
+        if filter:
+            names           =   list(filter)
+            # the filter columns are trimmed after their last value, the data rows end with the last value
+            # of the primary (first requested) or the first column, e.g for {'fits to ms': lambda v: not v}
+            sizing          =   [col for col in dict.fromkeys(columns[:1] + self.header[:1]) if col not in names]
+            cols            =   self.batch_get([f"{letter(self.header.index(col) + 1)}2:{letter(self.header.index(col) + 1)}" for col in names + sizing])
+            cols            =   [[(r[0] if r else '') for r in col] for col in cols]
+            nrows           =   max([len(col) for col in cols] or [0])
+            cols            =   [col + [''] * (nrows - len(col)) for col in cols[:len(names)]]
+            match           =   lambda test, v: test(v) if callable(test) else str(v) == str(test)
+            matching        =   [i for i in range(nrows) if all(match(filter[name], col[i]) for name, col in zip(names, cols))]
+            keep            =   matching if keep is None else sorted(set(keep) & set(matching))
+
+        df                  =   self.fetch(keep, col_pos, max_gap=max_gap)
+        self.row_map        =   [i + 2 for i in (keep if keep is not None else range(len(df)))]
+        self.col_map        =   dict(col_pos)
+        return df
+
+    def fetch(self, keep, col_pos, max_gap=100):
+        """
+        downloads the cells of the columns `col_pos` (name --> sheet column) in the data rows `keep`
+        (0-based, None for all) with as few `batch_get` ranges as possible, returns a dataframe of strings.
+        rows to keep less than `max_gap` rows apart are fetched in one range and the rows between dropped
+        """
+        letter              =   lambda j: re.sub(r'\d', '', gspread.utils.rowcol_to_a1(1, j))
+        runs                =   lambda idx, gap: [(g[0], g[-1]) for g in np.split(np.array(idx), np.where(np.diff(idx) > gap)[0] + 1) if len(g)]
+        col_runs            =   runs(sorted(col_pos.values()), 1)
+        if keep is None:
+            ranges          =   [f"{letter(c0)}2:{letter(c1)}" for c0, c1 in col_runs]
+        else:
+            row_runs        =   runs(keep, max_gap) if keep else []
+            ranges          =   [f"{letter(c0)}{r0 + 2}:{letter(c1)}{r1 + 2}" for r0, r1 in row_runs for c0, c1 in col_runs]
+        fetched             =   self.batch_get(ranges) if ranges else []
+
+        # assemble the blocks into one array, positions as in the sheet
+        if keep is None:
+            nrows           =   max([len(b) for b in fetched] or [0])
+            row_runs, at_row=   [(0, nrows - 1)], None
+        else:
+            nrows, at_row   =   len(keep), {r: n for n, r in enumerate(keep)}
+        order               =   sorted(col_pos.values())
+        values              =   np.full((nrows, len(order)), '', dtype=object)
+        at                  =   {col: k for k, col in enumerate(order)}
+        k                   =   0
+        for r0, r1 in row_runs:
+            for c0, c1 in col_runs:
+                block       =   fetched[k][:r1 - r0 + 1]; k += 1
+                if not block: continue
+                width       =   c1 - c0 + 1
+                block       =   np.array([list(row[:width]) + [''] * (width - len(row[:width])) for row in block], dtype=object)
+                src         =   np.arange(len(block)) if at_row is None else np.array([di for di in range(len(block)) if r0 + di in at_row], dtype=np.int64)
+                dst         =   src + r0 if at_row is None else np.array([at_row[r0 + di] for di in src], dtype=np.int64)
+                if len(src): values[dst[:, None], [at[c0 + dj] for dj in range(width)]] = block[src]
+        names               =   {col: name for name, col in col_pos.items()}
+        return pd.DataFrame(values, columns=[names[col] for col in order])
+
+    def last_update(self):
+        """
+        modification time of the spreadsheet, None if the client can not tell.
+        It is a Drive API request, which needs the drive.metadata.readonly scope (see `SCOPES`)
+        """
+        get = getattr(self.spreadsheet, 'get_lastUpdateTime', None)
+        if get is None: return None
+        try:
+            return self.call(get)
+        except Exception as e:
+            if not self._mtime_error:
+                print(f"{c['y']}could not get the modification time of the sheet, refresh downloads every time: {e}{c['x']}")
+            self._mtime_error = True
+            return None
+
+    def refresh(self, force=False):
+        """
+        downloads the part of the sheet loaded by `open` again if the spreadsheet was modified since `open` or the
+        last refresh (always with `force`, or if the modification time can not be read). Rows loaded by `rows`/`filter` are the same rows, the filter is not evaluated again.
+
+        Returns
+        ---
+
+        dataframe of strings with the current values, None if the sheet was not modified.
+        `df` is not changed, see `LogFrame.refresh` to merge the changes.
+        """
+        modified            =   self.last_update()
+        if not force and modified is not None and modified == self.modified: return None
+        if self.row_map is None and self.col_map is None:
+            values          =   self.call(self.sheet.get_all_values)
+            new             =   pd.DataFrame(values[1:], columns=values[0]) if values else pd.DataFrame()
+            self.header     =   list(new.columns)
+        elif self.open_args.get('rows') is None and not self.open_args.get('filter'):
+            new             =   self.fetch(None, self.col_map)
+            self.row_map    =   [i + 2 for i in range(len(new))]
+        else:
+            new             =   self.fetch([r - 2 for r in self.row_map], self.col_map)
+        self.modified       =   modified
+        return new
+
+    def a1(self, i, j, columns, header_rows=1):
+        """
+        A1 notation of the sheet cell for the dataframe cell (i, j), `columns` are the dataframe column names.
+        columns of the sheet not loaded by `open` are found in its header, the others are added to it (queued in `pending`)
+        """
+        if self.row_map is None:
+            row             =   i + 1 + header_rows
+        elif i < len(self.row_map):
+            row             =   self.row_map[i]
+        else:
+            raise IndexError(f"row {i} was added to a partly loaded sheet and has no row in the sheet")
+        if self.col_map is None:
+            col             =   j + 1
+            while header_rows == 1 and len(self.header) < col:
+                self.header.append(columns[len(self.header)])
+                self.pending[gspread.utils.rowcol_to_a1(1, len(self.header))] = [[cell_value(self.header[-1])]]
+        else:
+            col             =   self.col_map.get(columns[j])
+            if col is None and columns[j] in self.header:
+                col = self.col_map[columns[j]] = self.header.index(columns[j]) + 1
+            elif col is None:
+                self.header.append(columns[j])
+                col = self.col_map[columns[j]] = len(self.header)
+                self.pending[gspread.utils.rowcol_to_a1(1, col)] = [[cell_value(columns[j])]]
+        return gspread.utils.rowcol_to_a1(row, col)
+
+    def replay_journal(self):
+        """
+        applies the journaled edits which never reached the sheet to `df` and sends them.
+        With a partly loaded sheet the edits of cells not loaded are sent to their sheet cell, found by the
+        key in the primary column of the sheet. Only the edits sent are acknowledged: edits of cells not in
+        the sheet are dropped after loading the whole sheet, kept in the journal otherwise.
+        """
+        pending             =   self.journal.pending()
+        if not pending: return True
+        print(f"{c['y']}Replaying {len(pending)} journaled edits{c['x']}")
+        partial             =   self.row_map is not None or self.col_map is not None
+        rows, cells, ids    =   {}, [], []
+        outside             =   []
+        for rec in pending:
+            if rec['pcol'] not in rows:
+                rows[rec['pcol']] = {str(v).strip(): i for i, v in enumerate(self.df[rec['pcol']].values)} if rec['pcol'] in self.df.columns else {}
+            i = rows[rec['pcol']].get(rec['key'])
+            if i is None or rec['col'] not in self.df.columns:
+                if partial:
+                    outside.append(rec)
+                    continue
+                print(f"{c['y']}dropping journaled edit, cell not found: {rec['key']} / {rec['col']}{c['x']}")
+            else:
+                j = self.df.columns.get_loc(rec['col'])
+                set_iat(self.df, i, j, rec['value'])
+                cells.append((i, j, rec['value']))
+            ids.append((rec['pid'], rec['seq']))
+        if cells: self.update_values(cells, defer=True)
+        ids.extend(self._queue_outside(outside))
+        if not self.flush(): return False
+        self.journal.ack(ids)
+        return True
+
+    def _queue_outside(self, records):
+        """
+        queues the journaled edits of cells not loaded in `df` by the A1 address of their sheet cell,
+        returns the ids of the edits queued
+        """
+        letter              =   lambda j: re.sub(r'\d', '', gspread.utils.rowcol_to_a1(1, j))
+        pcols               =   [pcol for pcol in dict.fromkeys(rec['pcol'] for rec in records) if pcol in self.header]
+        fetched             =   self.batch_get([f"{letter(self.header.index(pcol) + 1)}2:{letter(self.header.index(pcol) + 1)}" for pcol in pcols]) if pcols else []
+        sheet_rows          =   {pcol: {str(r[0] if r else '').strip(): n + 2 for n, r in enumerate(col)} for pcol, col in zip(pcols, fetched)}
+        ids                 =   []
+        with self._lock:
+            for rec in records:
+                row         =   sheet_rows.get(rec['pcol'], {}).get(rec['key'])
+                if row is None or rec['col'] not in self.header:
+                    print(f"{c['y']}keeping journaled edit, cell not in the sheet: {rec['key']} / {rec['col']}{c['x']}")
+                    continue
+                cell        =   gspread.utils.rowcol_to_a1(row, self.header.index(rec['col']) + 1)
+                self.pending.pop(cell, None)
+                self.pending[cell] = [[cell_value(rec['value'])]]
+                ids.append((rec['pid'], rec['seq']))
+        return ids
+
     def update(self, dataframe):
-        self.sheet.update([dataframe.columns.values.tolist()] + dataframe.values.tolist())
+        if self.row_map is not None or self.col_map is not None:
+            raise ValueError("the sheet is partly loaded, only the changed cells can be updated (update_values)")
+        dataframe           =   dataframe.fillna('')                # avoid (NaN) errors: Out of range float values are not JSON compliant
+        self.call(self.sheet.update, [dataframe.columns.values.tolist()] + dataframe.values.tolist())
         print(f"{c['g']}Updated!{c['x']}")
 
-    def update_cell(self, dataframe: pd.DataFrame, I: list, J: list):
+    def update_cell(self, dataframe: "pd.DataFrame", I: list, J: list, defer=False):
+        """
+        queues the cells (I[k], J[k]) of the dataframe for the sheet and flushes the queue unless `defer`
+
+        Returns
+        ---
+
+        True if the cells were queued (defer) or sent successfully
+        """
         
         # account for header as a row
         sheet_I_h = len(dataframe.columns.shape[1]) if len(dataframe.columns.shape) > 1 else 1 # checks if there are more than one row else use 1 as the no. of rows in header
-        
-        # Convert row and column indices to Excel-style (1-based index)
-        sheet_I = [i + 1 + sheet_I_h for i in I]  # Offset by sheet header length
-        sheet_J = [j + 1 for j in J]  # 1-based index for columns
+        return self.update_values([(i, j, dataframe.iat[i,j]) for i,j in zip(I,J)], header_rows=sheet_I_h, defer=defer,
+                                  columns=dataframe.columns)
+
+    def update_values(self, cells: list, header_rows=1, defer=False, columns=None):
+        """
+        same as `update_cell` for already collected values
+
+        Input
+        ---
 
+        :cells:         list of (row, col, value) with 0-based dataframe positions
+        :header_rows:   number of header rows in the sheet above the data
+        :columns:       column names of the dataframe, defaults to those of `df`
+        """
+        columns = self.df.columns if columns is None else columns
         # Ensure that the indices are valid and non-empty
-        if not sheet_I or not sheet_J:
+        if not cells:
             print("Error: Row or column indices are empty.")
-            return
-
-        # create a body for batch update
-        update_body     =   []
-        for ci,cj,i,j in zip(sheet_I,sheet_J,I,J):
-            cell    =   gspread.utils.rowcol_to_a1(ci,cj)
-            value   =   dataframe.iat[i,j]
-            update_body.append({
-            'range': cell,
-            'values': [[value]]
-        })
+            return False
 
-        try:
-            # Use batch_update for efficiency
-            self.sheet.batch_update(update_body)
-            print(f"{c['g']}Updated!{c['x']} {len(I)} cells successfully.")
-        except gspread.exceptions.APIError as e:
-            print(f"API Error: {e}")
-        except Exception as e:
-            print(f"Error updating the sheet: {e}")
+        # queue the body for batch update, a later value for the same cell replaces the earlier one
+        with self._lock:
+            for i,j,value in cells:
+                # Convert row and column indices to Excel-style (1-based index), offset by sheet header length
+                cell    =   self.a1(i, j, columns, header_rows=header_rows)
+                self.pending.pop(cell, None)
+                self.pending[cell] = [[cell_value(value)]]
+        return True if defer else self.flush()
+
+    def flush(self):
+        """
+        sends the queued cells in as few `batch_update` calls as possible (max_batch cells per call),
+        cells which could not be sent stay in the queue for the next flush.
+        """
+        with self._lock:
+            sent = 0
+            while self.pending:
+                cells       =   list(self.pending)[:self.max_batch]
+                update_body =   [{'range': cell, 'values': self.pending[cell]} for cell in cells]
+                try:
+                    # Use batch_update for efficiency
+                    self.call(self.sheet.batch_update, update_body)
+                except gspread.exceptions.APIError as e:
+                    print(f"API Error: {e}")
+                    return False
+                except Exception as e:
+                    print(f"Error updating the sheet: {e}")
+                    return False
+                for cell in cells: del self.pending[cell]
+                sent += len(cells)
+            if sent: print(f"{c['g']}Updated!{c['x']} {sent} cells successfully.")
+            return True
 
 class LogFrame:
     """
@@ -84,7 +593,8 @@ class LogFrame:
     ---
 
     :gsc:               Google Spreadsheet Credentials instance
-                        To use a local dataframe, initialize with lf = LogFrame(gsc = my_df ,....) and lf.df_sheet = my_df
+                        To work offline on a local file, open the GSC with a local client e.g
+                        GSC(sid='obs', client=alfrd.backend.LocalClient('path/to/sheets')) see `alfrd.backend`
     :primary_value:     the unique identifier of the row corrosponding to the primary_colname
     :primary_colname:     primary column name for unique identifier
     :registered:        keeps count of success and failed script runs in a tuple (count_success, count_failed)
@@ -95,7 +605,7 @@ class LogFrame:
             $ alfrd --step_name
 
     """
-    def __init__(self, gsc , primary_value='',  primary_colname='FILE_NAME'):
+    def __init__(self, gsc , primary_value='',  primary_colname='FILE_NAME', flush_interval=None, flush_size=100):
         self.gsc                =   gsc
         self.df_sheet0          =   self.gsc.df.copy(deep=True)
         self.df_sheet           =   self.gsc.df
@@ -103,17 +613,109 @@ class LogFrame:
         self.primary_colname    =   primary_colname
         self.working_col        =   ''
         self.working_cols       =   []
-        self.t0                 =   time.time()
-        
 
         self.registered         =   0,0         # (count_success, count_failed)
-        self.update_cooldown_count   =   0
+        self._dirty             =   {}          # (row, col) positions changed since the last sheet update --> edit number
+        self._edits             =   0
+        self._lock              =   threading.RLock()   # guards df_sheet and the dirty cells against the flush worker
+        self._push_lock         =   threading.Lock()
+        self._worker            =   None
+        self.check_direct_edits =   False       # compare all of df_sheet with df_sheet0 before every push, see `_external_edits`
+        self.flush_interval     =   flush_interval
+        self.flush_size         =   flush_size
+        self.reindex()
+        self._frame_key         =   self._frame()   # df_sheet as last compared with df_sheet0
+        atexit.register(_close_at_exit, weakref.ref(self))     # after the client, so before its own exit handlers
+        from gspread_formatting import Color
         self.color ={'g': Color(red=0.56,green=0.77,blue=0.49),
                 'r': Color(red=0.8784314,green=0.4,blue=0.4),
                 'rh': Color(red=0.71,green=0.13,blue=0.0),
                 'rl': Color(red=0.98,green=0.63,blue=0.57),
                 'gl': Color(red=0.42,green=0.86,blue=0.31),
                 'gh': Color(red=0.42,green=0.60,blue=0.42)}
+        if flush_interval: self.start_flush_worker()
+
+    def reindex(self):
+        """
+        builds the lookup index on the primary column i.e. stripped primary value --> row positions and
+        drops the value counts of `isval_unique`. It is done automatically when `df_sheet` is replaced, rows are
+        added to it or `primary_colname` changes. Call it after editing cells of `df_sheet` in place
+        (e.g `lf.df_sheet.loc[0, 'TSYS'] = 'False'`), the next push then also finds and sends the edited cells.
+        """
+        self._build_index()
+        self._frame_key         =   None
+
+    def _build_index(self):
+        """index of the primary column, see `reindex`"""
+        self._index             =   {}
+        self._value_counts      =   {}
+        self._index_key         =   (id(self.df_sheet), self.primary_colname, len(self.df_sheet))
+        if self.primary_colname not in self.df_sheet.columns: return
+        for pos, v in enumerate(self.df_sheet[self.primary_colname].values):
+            if not pd.isna(v):
+                self._index.setdefault(str(v).strip(), []).append(pos)
+
+    def _rows(self, primary_value=None):
+        """
+        row positions for the primary_value (or self.primary_value), empty list if not found
+        """
+        if self._index_key != (id(self.df_sheet), self.primary_colname, len(self.df_sheet)):
+            self._build_index()
+        primary_value = self.primary_value if primary_value is None else primary_value
+        return self._index.get(str(primary_value).strip(), [])
+
+    def _col_pos(self, colname, create=False):
+        """
+        column position for the colname, adds an empty column if `create` and not found
+        """
+        if colname not in self.df_sheet.columns:
+            if not create: raise KeyError(colname)
+            synced  =   self._frame_key == self._frame()
+            self.df_sheet[colname] = pd.Series(np.nan, index=self.df_sheet.index, dtype=object)
+            self._index_key = (id(self.df_sheet), self.primary_colname, len(self.df_sheet))
+            if synced: self._frame_key = self._frame()              # added here, its cells are tracked
+        return self.df_sheet.columns.get_loc(colname)
+
+    def _frame(self):
+        """
+        identity and shape of df_sheet, a change means it was replaced or resized without `put_value`
+        """
+        return id(self.df_sheet), self.df_sheet.shape
+
+    def _counts(self, colname):
+        """
+        value counts of stripped cell values for colname, built on first use and kept current on writes
+        """
+        if colname not in self._value_counts:
+            counts  =   Counter()
+            for v in self.df_sheet[colname].values:
+                if isinstance(v, str): counts[v.strip()] += 1
+            self._value_counts[colname] = counts
+        return self._value_counts[colname]
+
+    def _notna(self, rows, colname):
+        """
+        count of non-empty (not NaN) cells in colname for the given row positions
+        """
+        if colname not in self.df_sheet.columns: return 0
+        j = self.df_sheet.columns.get_loc(colname)
+        return sum(1 for i in rows if not pd.isna(self.df_sheet.iat[i, j]))
+
+    def _set_cell(self, i, j, data, dirty=True):
+        """
+        sets a single cell while keeping the index and value counts current, marks the cell dirty for update_sheet
+        (not for values coming from the sheet i.e. `dirty=False`)
+        """
+        colname = self.df_sheet.columns[j]
+        if colname in self._value_counts:
+            old = self.df_sheet.iat[i, j]
+            if isinstance(old, str): self._value_counts[colname][old.strip()] -= 1
+            if isinstance(data, str): self._value_counts[colname][data.strip()] += 1
+        set_iat(self.df_sheet, i, j, data)
+        if dirty:
+            self._edits         +=  1
+            self._dirty[(i, j)] =   self._edits
+        if colname == self.primary_colname: self._index_key = None
 
     def col_data(self, colname='', data='', count=0, force=False, chk_colname=''):
         """
@@ -143,21 +745,25 @@ class LogFrame:
         """
         colname = self.working_col if not colname else colname
         if not self.primary_value : print(f"{c['y']}No primary value given{c['x']}")
-        primary_col_values     = self.df_sheet[self.primary_colname].str.strip()
-        if (not force) or (primary_col_values.isin([self.primary_value]).any() and not self.df_sheet.loc[primary_col_values==self.primary_value,colname].count()):
+        rows    = self._rows()
+        if (not force) or (rows and not self._notna(rows, colname)):
             
             if chk_colname :
-                if self.df_sheet.loc[primary_col_values==self.primary_value,chk_colname].count(): 
-                    val = str(self.df_sheet.loc[primary_col_values==self.primary_value,chk_colname].values[0]).strip()          # searching for the first occurance of the value.
+                if rows and self._notna(rows, chk_colname): 
+                    val = str(self.df_sheet.iat[rows[0], self._col_pos(chk_colname)]).strip()          # searching for the first occurance of the value.
                     count+=1
                     return count, val 
                 else:
                     return count, ''
             else:
                 count+=1 
-                self.df_sheet.loc[primary_col_values==self.primary_value,colname] = data
+                with self._lock:
+                    j = self._col_pos(colname, create=True)
+                    for i in rows:
+                        self._set_cell(i, j, data)
+                if self._worker and len(self._dirty) >= self.flush_size: self._wake.set()
         else:
-            print("not updating", self.primary_value, f"{self.df_sheet.loc[primary_col_values==self.primary_value,colname].values}")
+            print("not updating", self.primary_value, f"{self.df_sheet.iloc[rows][colname].values}")
         return count
     
     def isval_unique(self, colname=''):
@@ -166,7 +772,7 @@ class LogFrame:
         """
         colname = self.working_col if not colname else colname
         _, colv = self.col_data(colname='', data='', count=0, chk_colname=colname)
-        c = self.df_sheet[colname].str.strip().value_counts()[colv]
+        c = self._counts(colname)[colv]
         r = False if int(c)!=1 else True
         return r
     
@@ -205,37 +811,334 @@ class LogFrame:
         count = self.col_data(colname=colname, data=value, count=count)
         return count
     
+    def _positions(self, keys):
+        """
+        first row position of each key (primary value), -1 if not found
+        """
+        if self._index_key != (id(self.df_sheet), self.primary_colname, len(self.df_sheet)):
+            self._build_index()
+        return np.array([self._index.get(str(k).strip(), [-1])[0] for k in keys], dtype=np.int64)
+
+    def get_values(self, keys=None, colname=''):
+        """
+        bulk `get_value`: the cell values of colname for many primary values at once
+
+        Input
+        ---
+
+        :keys:          primary values, None for all the rows
+        :colname:       defaults to working_col
+
+        Returns
+        ---
+
+        dict primary value --> stripped string value, '' for empty cells and values not found
+        """
+        colname     =   self.working_col if not colname else colname
+        with self._lock:
+            if keys is None:
+                keys    =   [str(v).strip() for v in self.df_sheet[self.primary_colname].values] if self.primary_colname in self.df_sheet.columns else []
+            keys        =   list(keys)
+            if colname not in self.df_sheet.columns or not len(self.df_sheet): return {k: '' for k in keys}
+            pos         =   self._positions(keys)
+            values      =   self.df_sheet[colname].to_numpy(dtype=object)[np.maximum(pos, 0)]
+            empty       =   (pos < 0) | pd.isna(values)
+        return {k: '' if e else str(v).strip() for k, v, e in zip(keys, values, empty)}
+
+    def isvalue_many(self, value, keys=None, colname=''):
+        """
+        bulk `isvalue`: dict primary value --> True if its cell in colname is `value`
+        """
+        return {k: str(value) == v for k, v in self.get_values(keys, colname).items()}
+
+    def put_values(self, values, colname='', count=0):
+        """
+        bulk `put_value`: puts the values of many primary values in colname with a single column assignment,
+        the changed cells are marked dirty for the next `update_sheet`
+
+        Input
+        ---
+
+        :values:        dict or pandas Series primary value --> value, or a list of (primary value, value)
+        :colname:       defaults to working_col
+        :count:         iterative count
+
+        Returns
+        ---
+
+        count + number of primary values found (all of their rows are set, like `put_value`)
+        """
+        colname     =   self.working_col if not colname else colname
+        items       =   list(values.items()) if hasattr(values, 'items') else list(values)
+        if not items: return count
+        with self._lock:
+            if self._index_key != (id(self.df_sheet), self.primary_colname, len(self.df_sheet)):
+                self._build_index()
+            rows, data, found   =   [], [], 0
+            for key, value in items:
+                pos     =   self._index.get(str(key).strip())
+                if not pos: continue
+                found   +=  1
+                rows.extend(pos)
+                data.extend([value] * len(pos))
+            if not rows: return count
+            j           =   self._col_pos(colname, create=True)
+            column      =   self.df_sheet[colname].to_numpy(dtype=object, copy=True)
+            if colname in self._value_counts:
+                counts  =   self._value_counts[colname]
+                for old in column[rows]:
+                    if isinstance(old, str): counts[old.strip()] -= 1
+                for new in data:
+                    if isinstance(new, str): counts[new.strip()] += 1
+            column[rows]    =   data
+            self.df_sheet[colname] = column
+            for i in rows:
+                self._edits             +=  1
+                self._dirty[(i, j)]     =   self._edits
+            if colname == self.primary_colname: self._index_key = None
+            else: self._index_key = (id(self.df_sheet), self.primary_colname, len(self.df_sheet))
+        if self._worker and len(self._dirty) >= self.flush_size: self._wake.set()
+        return count + found
+
     def update_sheet(self, count, failed, by_cell=True, comment_col='Comment4', csvfile = 'df_sheet.csv'):
         """
         updates the google sheet if there is atleast one new count/failed count for the update
+        with `by_cell` only the cells changed since the last successful update are sent. If `df_sheet` was replaced or
+        resized directly (not through `put_value`), or `reindex()` was called after editing it in place, its cells
+        are compared with `df_sheet0` to find the edits, see `_external_edits`.
+
+        Cells which could not be sent stay dirty and journaled (see `Journal`), `csvfile` is no longer used.
+
+        With the flush worker running (see `start_flush_worker`) the cells are left to the worker and this returns immediately.
         """
-        # -----  Cool down update to keep it below 60 request/minute
-        tf                          =   time.time()
-        td                          =   tf-self.t0
-        self.df_sheet.fillna('',inplace=True)       # avoid (NaN) errors: Out of range float values are not JSON compliant
-        if td<=1 and (self.update_cooldown_count >=  1) and (count - self.registered[0] or failed - self.registered[1]):
-            time.sleep(1)
-            self.update_cooldown_count   =   0
-            
+        # requests are kept below the sheets quota by the GSC token bucket (gsc.limiter)
         try:
             if count - self.registered[0] or failed - self.registered[1]:
                 if not by_cell:
-                    self.gsc.update(self.df_sheet)
-                    self.update_cooldown_count       +=  1
-                else:
-                    I, J = np.where(self.df_sheet.astype(str).ne(self.df_sheet0.astype(str)))
-                    self.gsc.update_cell(self.df_sheet, I, J)
-                    self.update_cooldown_count       +=  1
-                self.registered = count, failed       
+                    with self._push_lock, self._lock:
+                        self.gsc.update(self.df_sheet)
+                        self.df_sheet0  =   self.df_sheet.copy(deep=True)
+                        self._frame_key =   self._frame()
+                        self._dirty.clear()
+                    self.registered = count, failed
+                elif self._worker:
+                    if len(self._dirty) >= self.flush_size: self._wake.set()
+                    self.registered = count, failed
+                elif self.push_dirty():
+                    self.registered = count, failed
             else:
                 print('skipped')
         except Exception as e:
             print(f'failed to update on google sheet: {e}')
             failed  =   self.col_data(colname=comment_col, data=f'failed:{e}', count=failed)
-            self.df_sheet.to_csv(csvfile)
-        self.t0                      =   time.time()
+
+    def push_dirty(self):
+        """
+        sends the dirty cells to the sheet, on success the cells are marked clean and copied to `df_sheet0`
+        cells edited again while being sent stay dirty.
+
+        Returns
+        ---
+
+        True if there was nothing to send or the update succeeded
+        """
+        with self._push_lock:
+            with self._lock:
+                if self.check_direct_edits or self._frame_key != self._frame(): self._external_edits()
+                if not self._dirty: return True
+                edits   =   dict(self._dirty)
+                cells   =   [(i, j, self.df_sheet.iat[i, j]) for i, j in sorted(edits)]
+                journal =   getattr(self.gsc, 'journal', None) if self.primary_colname in self.df_sheet.columns else None
+                if journal:
+                    pcol    =   self.df_sheet.columns.get_loc(self.primary_colname)
+                    ids     =   journal.append([(self.primary_colname, str(self.df_sheet.iat[i, pcol]).strip(), 
+                                                 self.df_sheet.columns[j], cell_value(value)) for i, j, value in cells])
+            if not self.gsc.update_values(cells, columns=self.df_sheet.columns): return False
+            if journal: journal.ack(ids)
+            with self._lock:
+                for i, j, value in cells:
+                    if self._dirty.get((i, j)) == edits[(i, j)]: del self._dirty[(i, j)]
+                    col     =   self.df_sheet.columns[j]
+                    if i < self.df_sheet0.shape[0] and col in self.df_sheet0.columns:
+                        set_iat(self.df_sheet0, i, self.df_sheet0.columns.get_loc(col), value)
+            return True
+
+    def _external_edits(self):
+        """
+        marks dirty the cells of df_sheet changed without `put_value`/`put_values` (df_sheet replaced, assigned or
+        read from a file) by comparing it with df_sheet0, the last known state of the sheet, column by column.
+        `push_dirty` runs it when df_sheet was replaced or resized, or `reindex()` was called, and before
+        every push with `check_direct_edits` (the cost grows with the size of the sheet).
+        The index and value counts are rebuilt on next use. Returns the number of cells found.
+        """
+        df, df0     =   self.df_sheet, self.df_sheet0
+        new_cols    =   [col for col in df.columns if col not in df0.columns]
+        if new_cols or len(df0) < len(df):                          # columns/rows added here are compared with empty cells
+            df0     =   pd.concat([df0.reset_index(drop=True).astype({col: object for col in df0.columns}),
+                                   pd.DataFrame(np.nan, index=range(len(df0)), columns=new_cols, dtype=object)], axis=1)
+            if len(df0) < len(df):
+                df0 =   pd.concat([df0, pd.DataFrame(np.nan, index=range(len(df0), len(df)), columns=df0.columns, dtype=object)])
+            self.df_sheet0  =   df0
+        n, found    =   len(df), 0
+        for j, col in enumerate(df.columns):
+            new     =   np.asarray(df.iloc[:, j].array)                 # views, no copy for numpy and str columns
+            old     =   np.asarray(df0[col].array)[:n]
+            if new.dtype == old.dtype and new.dtype.kind in 'biuf':
+                if np.array_equal(new, old, equal_nan=new.dtype.kind == 'f'): continue
+            try:
+                changed =   np.asarray(new != old, dtype=bool)
+            except TypeError:                                       # pd.NA in nullable columns
+                changed =   np.array([str(a) != str(b) for a, b in zip(new, old)], dtype=bool)
+            if not changed.any(): continue
+            changed &=  ~(pd.isna(new) & pd.isna(old))              # NaN != NaN
+            for i in np.nonzero(changed)[0]:
+                if (i, j) in self._dirty or str(cell_value(new[i])) == str(cell_value(old[i])): continue   # NaN / '' / 5 / '5'
+                self._edits             +=  1
+                self._dirty[(i, j)]     =   self._edits
+                found                   +=  1
+        self._value_counts.clear()                                  # counted before the edits
+        self._index_key     =   None
+        self._frame_key     =   self._frame()
+        return found
+
+    def refresh(self, force=False):
+        """
+        merges the changes made to the sheet by others since it was opened or last refreshed (see `GSC.refresh`)
+        into df_sheet and df_sheet0. Cells changed here and not yet sent (dirty) keep their local value.
+
+        Only the rows whose hash differs from df_sheet0 (the last known state of the sheet) are compared cell by cell.
+        If rows were added, removed or moved in the sheet the frames are rebuilt from it and the dirty cells applied
+        again by primary value.
+
+        Returns
+        ---
+
+        number of cells of df_sheet changed by the refresh
+        """
+        with self._push_lock:                                       # no push between download and merge
+            new = self.gsc.refresh(force=force)
+            if new is None: return 0
+            with self._lock:
+                pcol    =   self.primary_colname
+                keys    =   lambda df: df[pcol].fillna('').astype(str).str.strip().values
+                moved   =   len(new) != len(self.df_sheet0) or (pcol in new.columns and pcol in self.df_sheet0.columns
+                                                                   and (keys(new) != keys(self.df_sheet0)).any())
+                if moved:
+                    if self.gsc.open_args.get('rows') is not None or self.gsc.open_args.get('filter'):
+                        new =   self.gsc.open(**self.gsc.open_args)         # the loaded rows are no longer the same sheet rows
+                    return self._rebase(new)
+                return self._merge(new)
+
+    def _merge(self, new):
+        """
+        merges the sheet values `new` (same rows as df_sheet0) into df_sheet and df_sheet0
+        """
+        cols        =   [col for col in new.columns if col in self.df_sheet0.columns]
+        hashed      =   lambda df: pd.util.hash_pandas_object(df.fillna('').astype(str).astype(object), index=False).values
+        rows        =   np.nonzero(hashed(new[cols]) != hashed(self.df_sheet0[cols]))[0] if cols else []
+        changed     =   0
+        for col in cols:
+            j0      =   self.df_sheet0.columns.get_loc(col)
+            j       =   self._col_pos(col, create=True)
+            jn      =   new.columns.get_loc(col)
+            for i in rows:
+                value   =   new.iat[i, jn]
+                if str(cell_value(self.df_sheet0.iat[i, j0])) == value: continue
+                set_iat(self.df_sheet0, i, j0, value)
+                if (i, j) not in self._dirty:
+                    self._set_cell(i, j, value, dirty=False)
+                    changed     +=  1
+        for col in [col for col in new.columns if col not in self.df_sheet0.columns]:   # columns added in the sheet
+            self.df_sheet0[col] =   new[col].astype(object).values
+            j   =   self._col_pos(col, create=True)
+            for i, value in enumerate(new[col].values):
+                if value != '' and (i, j) not in self._dirty:
+                    self._set_cell(i, j, value, dirty=False)
+                    changed     +=  1
+        if changed: print(f"{c['g']}Refreshed!{c['x']} {changed} cells changed in the sheet")
+        return changed
+
+    def _rebase(self, new):
+        """
+        replaces the frames with the sheet values `new` and applies the dirty cells again by primary value
+        """
+        pcol        =   self.df_sheet.columns.get_loc(self.primary_colname) if self.primary_colname in self.df_sheet.columns else None
+        edits       =   [(str(self.df_sheet.iat[i, pcol]).strip(), self.df_sheet.columns[j], self.df_sheet.iat[i, j])
+                         for i, j in sorted(self._dirty, key=self._dirty.get)] if pcol is not None else []
+        df          =   new.astype(object)
+        for col in self.df_sheet.columns:
+            if col not in df.columns: df[col] = pd.Series(np.nan, index=df.index, dtype=object)
+        self.gsc.df         =   df
+        self.df_sheet       =   df
+        self.df_sheet0      =   new.copy(deep=True)
+        self._dirty.clear()
+        with self.gsc._lock:
+            self.gsc.pending.clear()                                # A1 cells of the old row positions
+        self._build_index()
+        self._frame_key     =   self._frame()
+        for key, colname, value in edits:
+            rows    =   self._rows(key)
+            if not rows: print(f"{c['y']}row {key} is no longer in the sheet, dropping its change of {colname}{c['x']}")
+            j       =   self._col_pos(colname, create=True)
+            for i in rows: self._set_cell(i, j, value)
+        print(f"{c['y']}Refreshed!{c['x']} rows changed in the sheet, reloaded {len(df)} rows")
+        return df.size
+
+    def start_flush_worker(self, flush_interval=None, flush_size=None):
+        """
+        starts a background thread which pushes the dirty cells every `flush_interval` seconds
+        or as soon as `flush_size` cells are dirty, so the pipeline does not wait on the sheet.
+        Call `close()` (or use the LogFrame as a context manager) to stop it and push the remaining cells,
+        else it is done at exit.
+        """
+        self.flush_interval     =   flush_interval or self.flush_interval or 5.0
+        self.flush_size         =   flush_size or self.flush_size
+        if self._worker: return
+        self._wake              =   threading.Event()
+        self._stop              =   threading.Event()
+        self._worker            =   threading.Thread(target=self._flush_loop, name='alfrd-flush', daemon=True)
+        self._worker.start()
+
+    def _flush_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._stop.is_set(): break
+            try:
+                self.push_dirty()
+            except Exception as e:
+                print(f'failed to update on google sheet: {e}')
+
+    def flush(self):
+        """
+        pushes the dirty cells now (blocking), returns True on success
+        """
+        return self.push_dirty()
+
+    def close(self):
+        """
+        stops the flush worker (if running) and pushes the remaining dirty cells
+        """
+        if self._worker:
+            self._stop.set()
+            self._wake.set()
+            self._worker.join()
+            self._worker        =   None
+        return self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        n = len(getattr(self, '_dirty', ()))
+        if n: warnings.warn(f"LogFrame garbage collected with {n} cells not sent to the sheet, "
+                            "use `with LogFrame(...)` or call `close()`", RuntimeWarning)
 
     def create_conditional_format(self, range, c='g', valtype='timeinmin', custom_clr=None):
+        from gspread_formatting import ConditionalFormatRule, GridRange, BooleanCondition, BooleanRule, CellFormat
         clr = self.color[c] if not custom_clr else custom_clr
         rule ={
                 'timeinmin' : ConditionalFormatRule(
@@ -270,6 +1173,7 @@ class LogFrame:
         return rule[valtype]
 
     def create_rule(self, range, type='TEXT_CONTAINS', value='True',  c='g', custom_clr=None):
+        from gspread_formatting import ConditionalFormatRule, GridRange, BooleanCondition, BooleanRule, CellFormat
         clr = self.color[c] if not custom_clr else custom_clr
         return ConditionalFormatRule(
             ranges=[GridRange.from_a1_range(f'{range}', self.gsc.sheet)],
@@ -280,15 +1184,18 @@ class LogFrame:
                 )))
     
     def create_color(self, r=0.56,g=0.77,b=0.49):
+        from gspread_formatting import Color
         return Color(red=r,green=g,blue=b)
     
     def add_conditional_format(self, *new_rules):
+        from gspread_formatting import get_conditional_format_rules
         rules = get_conditional_format_rules(self.gsc.sheet)
         for rule in new_rules:
             rules.append(rule)
         rules.save()
 
     def clear_conditional_format(self,):
+        from gspread_formatting import get_conditional_format_rules
         rules = get_conditional_format_rules(self.gsc.sheet)
         rules.clear()
         rules.save()
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""
+Entry point of the `alfrd` command.
+
+`alfrd ls <proj>` is answered here without importing typer and the pipeline machinery (`alfrd.cli`),
+the steps are listed from the project manifest (see `alfrd.plugins.load_projects`), and
+`alfrd run ... --via-daemon` is sent to the daemon of the project (see `alfrd.daemon`) as is.
+All the other command lines are passed on to the typer app `alfrd.cli.alfrd_cli`.
+"""
+from pathlib import Path
+import sys
+
+import alfrd
+from alfrd import c
+from alfrd.util import ALFRD_DIR
+
+# The project/plugin directory
+PROJ_DIR = Path(f"{ALFRD_DIR}/projects")
+RUNLOG = ".runlog.jsonl"
+RUN_VALUE_OPTIONS = {"--step-to", "--steps", "--workers", "--profile-top", "--sweep", "--sweep-file", "--processes"}   # options of `alfrd run` taking a value
+
+def list_steps(proj):
+    """List all registered steps."""
+    from alfrd.plugins import REGISTERED_STEPS
+    print(f"\n\t\t{c['c']}ALFRD ({alfrd.__version__}){c['x']}\n")
+    print(f"  Run following pipeline steps for {c['bc']}{proj.upper()}{c['x']}")
+    if not REGISTERED_STEPS:
+        print("No pipeline steps registered.")
+    for i, (name, info) in enumerate(REGISTERED_STEPS.items()):
+        print(f"- {i}\t {c['bc']}{name.ljust(20)}{c['x']}: {info['desc']}")
+
+def proj_dir(proj, create=False):
+
+    project_dir= Path(f"{PROJ_DIR}/{proj}")
+    sys.path.insert(0, str(project_dir))
+
+    if create:
+        project_dir.mkdir(parents=True, exist_ok=True)
+        print(f"Created project directory at {project_dir}")
+    if not project_dir.exists():
+        print(f"Project directory '{proj}' does not exist.")
+        raise ValueError(f"Project {proj} not found.")
+    return project_dir
+
+def ls(proj):
+    """List all available pipeline steps for a project."""
+    from alfrd.plugins import load_projects
+    project_dir = proj_dir(proj)
+
+    load_projects(project_dir, steps=[])                                               # listed from the manifest
+    list_steps(proj)
+
+def positionals(argv, value_options=()):
+    """arguments of the command line `argv` which are not options or the values of `value_options`"""
+    args, skip  =   [], False
+    for arg in argv:
+        if skip:
+            skip    =   False
+        elif arg.startswith('-'):
+            skip    =   arg in value_options                        # `--option value`, not `--option=value`
+        else:
+            args.append(arg)
+    return args
+
+def via_daemon(argv):
+    """
+    runs `alfrd run ... --via-daemon` in the daemon serving the project
+
+    Returns
+    ---
+
+    exit code, None if no daemon is serving the project
+    """
+    args        =   positionals(argv[1:], RUN_VALUE_OPTIONS)           # step name, project, parameters
+    if len(args) < 2: return None
+    from alfrd.daemon import request
+    code        =   request(args[1], [arg for arg in argv if arg != "--via-daemon"])
+    if code is None:
+        print(f"{c['y']}no daemon is serving {args[1]} (start it with `alfrd serve {args[1]}`), running here.{c['x']}")
+    return code
+
+def main(argv=None):
+    """runs the `alfrd` command line `argv` (default: sys.argv[1:]), returns the exit code"""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv in (['--version'], ['-V']):
+        print(alfrd.__version__)
+        return 0
+    if len(argv) == 2 and argv[0] == 'ls' and not argv[1].startswith('-'):
+        ls(argv[1])
+        return 0
+    if argv[:1] == ['run'] and "--via-daemon" in argv:
+        code = via_daemon(argv)
+        if code is not None: return code
+        argv = [arg for arg in argv if arg != "--via-daemon"]
+    from alfrd.cli import alfrd_cli
+    return alfrd_cli(argv)
+
+if __name__ == "__main__":
+    sys.exit(main())
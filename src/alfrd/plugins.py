@@ -1,19 +1,42 @@
 from pathlib import Path
 
-import inspect
+import threading, json, os, sys, time
 from typing import Callable, Dict, List
 from functools import wraps
-import typer
-from alfrd.util import update_existing_dict
+from contextlib import contextmanager, ExitStack
+from alfrd.util import update_existing_dict, LazyModule
+from alfrd.stats import profile_call, RunLog
 import traceback
 
+# imported on first use, `alfrd ls` lists the steps from the manifest without them
+typer       =   LazyModule('typer')
+inspect     =   LazyModule('inspect')
+hashlib     =   LazyModule('hashlib')
+
 REGISTERED_STEPS: Dict[str, Dict[str, str]] = {}
 VALIDATE_BEFORE: Dict[str, Dict[str, List[str]]] = {}
 VALIDATE_AFTER: Dict[str, Dict[str, List[str]]] = {}
 VALIDATORS: Dict[str, Dict[str, str]] = {}
 
-def register(desc: str):
-    """Decorator to register a pipeline step with required parameters."""
+MANIFEST = ".manifest.json"                     # cached steps/validators of the plugin files, in the project directory
+_LOADED: Dict[str, tuple] = {}                  # plugin files executed in this process --> (mtime_ns, size)
+_SWEEP: Dict[str, object] = {}                  # the sweep being run, inherited by its forked worker processes
+
+class ValidatorNotFound(ValueError):
+    """raised by `validate` for a validator not registered (yet)"""
+
+def register(desc: str, depends_on: List[str] = None, provides: List[str] = None, cache: bool = False, profile: bool = False):
+    """Decorator to register a pipeline step with required parameters.
+
+    Args:
+        desc (_str_): _description of the step_
+        depends_on (_list_, optional): _steps (names or functions) which must finish before this one. 
+                                        None runs the step after the previous registered step, [] makes it independent_
+        provides (_list_, optional): _parameter names this step returns (in a dict), steps requiring them depend on it_
+        cache (_bool_, optional): _reuse the result of a previous run with the same step source and parameters (see `alfrd.cache`)_
+        profile (_bool_, optional): _profile the step on every run, as with `alfrd run --profile` (see `alfrd.stats.profile_call`)_
+    """
+    depends_on  =   None if depends_on is None else [_d.__name__ if callable(_d) else _d for _d in depends_on]
     def decorator(func: Callable):
         
         default_params, required_params = {},[]
@@ -26,10 +49,11 @@ def register(desc: str):
             else:
                 required_params.append(k)
 
-        if name in REGISTERED_STEPS:
+        if name in REGISTERED_STEPS and REGISTERED_STEPS[name]["function"] is not None:       # not just listed from the manifest
             raise ValueError(f"Step with name '{name}' already registered!")
         REGISTERED_STEPS[name] = {"desc": desc, "function": func, "default_params": default_params,
-                                  "required_params": required_params}
+                                  "required_params": required_params, "depends_on": depends_on,
+                                  "provides": list(provides or []), "cache": cache, "profile": profile}
         return func
     return decorator
 
@@ -46,7 +70,7 @@ def validate(by: List[str]):
 
         for val_name in by:            
             if val_name not in VALIDATORS:
-                raise ValueError(f"Validator with name '{val_name}' does not exist!")
+                raise ValidatorNotFound(f"Validator with name '{val_name}' does not exist!")
 
             # Append the function to the validation list
             if not VALIDATORS[val_name]['after']:
@@ -79,26 +103,138 @@ def validator(desc: str, after: bool = False, run_once: bool = False):
         return func
     return decorator
 
-def load_projects(project_dir: str):
-    """Load projects from a specified directory."""
-    project_dir_path = Path(project_dir)
+def _file_sig(path: Path):
+    st = path.stat()
+    return st.st_mtime_ns, st.st_size
+
+def _manifest_entry(path: Path):
+    """steps and validators registered by the (executed) plugin file"""
+    defined_in  =   lambda func: func is not None and func.__code__.co_filename == str(path)
+    jsonable    =   lambda d: json.loads(json.dumps(d, default=repr))
+    steps       =   {name: {k: jsonable(info[k]) for k in ("desc", "default_params", "required_params", "depends_on", "provides", "cache", "profile")}
+                     for name, info in REGISTERED_STEPS.items() if defined_in(info["function"])}
+    validators  =   {name: {k: jsonable(info[k]) for k in ("desc", "after", "run_once", "default_params", "required_params")}
+                     for name, info in VALIDATORS.items() if defined_in(info["function"])}
+    validates   =   {name: [f.__name__ for f in VALIDATE_BEFORE.get(name, {}).get("functions", []) + VALIDATE_AFTER.get(name, {}).get("functions", [])]
+                     for name in steps}
+    return {"steps": steps, "validators": validators, "validates": validates}
+
+def _unload_plugin(path: Path):
+    """forgets the steps and validators registered by the plugin file, before executing it again"""
+    defined_in  =   lambda info: info["function"] is not None and info["function"].__code__.co_filename == str(path)
+    for name in [name for name, info in REGISTERED_STEPS.items() if defined_in(info)]:
+        del REGISTERED_STEPS[name]
+        VALIDATE_BEFORE.pop(name, None)
+        VALIDATE_AFTER.pop(name, None)
+    for name in [name for name, info in VALIDATORS.items() if defined_in(info)]:
+        del VALIDATORS[name]
+
+def _exec_plugin(path: Path):
+    """executes a plugin file once per process (again if it changed)"""
     import importlib.util
+    sig = _file_sig(path)
+    if _LOADED.get(str(path)) == sig: return
+    if str(path) in _LOADED: _unload_plugin(path)                                       # changed since it was executed (`alfrd serve`)
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    _LOADED[str(path)] = sig
+
+def _exec_plugins(paths: List[Path]):
+    """executes the plugin files, a file validated by validators of a later file is executed again after the others"""
+    pending         =   list(paths)
+    while pending:
+        retry       =   []
+        for path in pending:
+            try:
+                _exec_plugin(path)
+            except ValidatorNotFound:
+                _unload_plugin(path)
+                retry.append(path)
+        if len(retry) == len(pending):
+            _exec_plugin(retry[0])                                                      # not defined in any of them
+        pending     =   retry
+
+def load_projects(project_dir: str, steps: List[str] = None):
+    """Load projects from a specified directory.
+
+    The steps and validators of every plugin file are cached in the manifest (`<project_dir>/.manifest.json`)
+    with the file's mtime, size and hash. Only new/changed files are executed to list the steps, the others are
+    listed from the manifest (with "function" None) until they are imported. A file validated by validators of
+    other files is executed after these.
+
+    Args:
+        project_dir (_str_): _the project directory_
+        steps (_list_, optional): _steps which will be run, only the files defining them and their validators are imported.
+                                    None imports all the files, [] only lists the steps_
+    """
+    project_dir_path = Path(project_dir)
     # Check if the project directory exists, if not, create it
     if not project_dir_path.exists():
         print(f"project directory '{project_dir}' does not exist. Creating it...")
         project_dir_path.mkdir(parents=True)
     
+    manifest_path   =   project_dir_path / MANIFEST
+    try:
+        manifest    =   json.loads(manifest_path.read_text())
+    except (OSError, ValueError):
+        manifest    =   {}
+    
     # Loop through all Python files in the project directory
+    entries, changed    =   {}, False
     for project_path in project_dir_path.glob("*.py"):
-        module_name = project_path.stem
-        
-        spec = importlib.util.spec_from_file_location(module_name, project_path)
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
+        mtime_ns, size  =   _file_sig(project_path)
+        entry           =   manifest.get(project_path.name)
+        if not entry or (entry["mtime_ns"], entry["size"]) != (mtime_ns, size):
+            sha256      =   hashlib.sha256(project_path.read_bytes()).hexdigest()
+            if not entry or entry["sha256"] != sha256:
+                try:
+                    _exec_plugin(project_path)
+                except ValidatorNotFound:                                               # defined in a file not executed
+                    _unload_plugin(project_path)
+                    _exec_plugins(list(project_dir_path.glob("*.py")))
+                entry   =   {"sha256": sha256, **_manifest_entry(project_path)}
+            entry.update(mtime_ns=mtime_ns, size=size)
+            changed     =   True
+        entries[project_path.name] = entry
+        for name, info in entry["steps"].items():
+            if name not in REGISTERED_STEPS:
+                REGISTERED_STEPS[name] = {**info, "function": None, "file": str(project_path)}
+    if changed or set(entries) != set(manifest):
+        manifest_path.write_text(json.dumps(entries, indent=1))
+
+    # import the files defining the steps to run and their validators, in the same order as above
+    if steps is None:
+        needed          =   set(entries)
+    else:
+        validators      =   {v for entry in entries.values() for name, vals in entry["validates"].items() if name in steps for v in vals}
+        needed          =   {f for f, entry in entries.items() if set(entry["steps"]) & set(steps) or set(entry["validators"]) & validators}
+    _exec_plugins([project_dir_path / f for f in entries if f in needed])
 
     if not REGISTERED_STEPS:
         print("No steps found. Add projects to the projects directory.")
 
+def step_graph(steps: List[str]):
+    """dependencies of each step within the selected steps
+
+    explicit `depends_on` is used if given, else the steps providing its required parameters,
+    else the previous step in the list (i.e. the steps run in sequence as registered).
+
+    Returns:
+        _dict_: _step name --> set of step names it waits for_
+    """
+    graph               =   {}
+    for n, name in enumerate(steps):
+        step            =   REGISTERED_STEPS[name]
+        if step.get("depends_on") is not None:
+            deps        =   set(step["depends_on"])
+        else:
+            deps        =   {other for other in steps if other != name 
+                             and set(REGISTERED_STEPS[other].get("provides", [])) & set(step["required_params"])}
+            if not deps and n: deps = {steps[n-1]}
+        graph[name]     =   deps & set(steps)
+    return graph
+
 def iterate_over_lst(lst):
     """Decorator to apply a function to each element in lst."""
     def decorator(func):
@@ -113,6 +249,57 @@ def iterate_over_lst(lst):
         return wrapper
     return decorator
 
+@contextmanager
+def _output_to(path):
+    """_sends stdout/stderr of this process (and its subprocesses) to the file meanwhile_"""
+    sys.stdout.flush(); sys.stderr.flush()
+    saved                                   =   os.dup(1), os.dup(2)
+    with open(path, 'w') as f:
+        os.dup2(f.fileno(), 1)
+        os.dup2(f.fileno(), 2)
+        try:
+            yield
+        finally:
+            sys.stdout.flush(); sys.stderr.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            os.close(saved[0]); os.close(saved[1])
+
+def _sweep_run(task):
+    """_runs one parameter set of the sweep in `_SWEEP` (in a worker process), returns its outcome_"""
+    index, label, params                    =   task
+    base                                    =   _SWEEP['base']
+    run                                     =   base.fork()
+    run.params                              =   {**dict(params), **base.params}
+    run.checkpoint                          =   None
+    if base.runlog is not None:
+        run.runlog                          =   RunLog(base.runlog.path, project=base.runlog.project, run=f"{base.runlog.run}.{index}")
+    if base.profile_dir is not None:
+        run.profile_dir                     =   Path(base.profile_dir) / str(index)
+    for name, run_count in _SWEEP['run_counts'].items():
+        if name in VALIDATORS: VALIDATORS[name]['run_count'] = run_count
+    log                                     =   None if _SWEEP['log_dir'] is None else Path(_SWEEP['log_dir']) / f"{index}.log"
+    result                                  =   {'index': index, 'label': label, 'status': 'failed', 'steps': {},
+                                                 'error': None, 'wall': 0.0, 'log': str(log) if log else None}
+    t0                                      =   time.perf_counter()
+    with ExitStack() as stack:
+        if log: stack.enter_context(_output_to(log))
+        print(f"parameter set {index}: {label}")
+        try:
+            result['steps']                 =   run.run_steps(_SWEEP['steps'], workers=_SWEEP['workers'])
+            result['status']                =   'finished' if all(result['steps'].values()) else 'skipped'
+        except typer.Exit:
+            pass
+        except Exception as e:
+            result['error']                 =   f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+    result['wall']                          =   time.perf_counter() - t0
+    return result
+
+@contextmanager
+def _unmeasured():
+    yield {}
+
 class PipelineRun:
     def __init__(self):
         self.params                 =   {}
@@ -123,6 +310,27 @@ class PipelineRun:
         self.validate_once          =   False
         self.prev_step_success      =   None
         self.validation_success     =   None
+        self.cache                  =   None        # StepCache for steps registered with cache=True
+        self.checkpoint             =   None        # Checkpoint saved after every step and validator
+        self.runlog                 =   None        # RunLog recording the time/memory of every step and validator (see `alfrd.stats`)
+        self.profile                =   False       # profile all the steps, else only those registered with profile=True
+        self.profile_dir            =   None        # directory for the profiles, steps are not profiled without it
+        self.profile_top            =   20          # number of functions printed for each profile
+
+    def fork(self):
+        """_copy of this run with its own state, to run a step concurrently with others_"""
+        child                       =   PipelineRun()
+        child.params                =   dict(self.params)
+        child.project_name          =   self.project_name
+        child.cache                 =   self.cache
+        child.checkpoint            =   self.checkpoint
+        child.runlog                =   self.runlog
+        child.profile               =   self.profile
+        child.profile_dir           =   self.profile_dir
+        child.profile_top           =   self.profile_top
+        child.prev_step_success     =   True
+        child.validation_success    =   True
+        return child
 
     def init_params(self, params):
         self.params                 =   {**params, **self.params}
@@ -169,17 +377,219 @@ class PipelineRun:
         step_params                         =   self.all_step_params(required_params=required_params, default_params=default_params)
         
         func                                =   step["function"]
+        cache_key, cached                   =   None, False
+        if self.cache is not None and step.get("cache"):
+            cache_key                       =   self.cache.key(func, step_params)
+            cached, result                  =   self.cache.get(cache_key)
         
-        try:
-            result                          =   func(**step_params) if len(step_params) else func()
+        if cached:
+            print(f" cached   : {self.step_name}")
             self.prev_step_success          =   True
-        except Exception as e:
-            self.prev_step_success          =   False
-            result                          =   str(e)
-            typer.secho(f"Failed! {e}", fg=typer.colors.RED)
-            traceback.print_exc()
-            raise typer.Exit()
+            with self.measure("step", self.step_name) as record: record["cached"] = True
+        else:
+            try:
+                with self.measure("step", self.step_name):
+                    if self.profile_dir is not None and (self.profile or step.get("profile")):
+                        result              =   profile_call(func, step_params, Path(self.profile_dir) / self.step_name, top=self.profile_top)
+                    else:
+                        result              =   func(**step_params) if len(step_params) else func()
+                self.prev_step_success      =   True
+            except Exception as e:
+                self.prev_step_success      =   False
+                result                      =   str(e)
+                typer.secho(f"Failed! {e}", fg=typer.colors.RED)
+                traceback.print_exc()
+                raise typer.Exit()
+            if cache_key: self.cache.put(cache_key, result)
         self.params['ret']                  =   result
+        if step.get("provides") and isinstance(result, dict):
+            self.params.update({k: result[k] for k in step["provides"] if k in result})
+
+    def execute_step(self, step_name):
+        """runs a step with its pre and post validations, the first validator returning a value (not None)
+        decides: the step (or its post validations) is skipped if it is False
+
+        Returns:
+            _bool_: _True if the step was run, False if skipped_
+        """
+        from alfrd import c
+        proj                                =   self.project_name
+        self.step_name                      =   step_name
+        self.validation_success             =   None                # set by the validators, see `run_validations`
+
+        if self.prev_step_success and VALIDATE_BEFORE.get(step_name, {}).get('functions'):
+            astrk_v = ".."*len(f"Pre-process ({self.step_name})")
+            print(f"{c['by']}\t .. {astrk_v} ..")
+            print(f"\t\t Pre-process ({self.step_name})")
+            print(f"\t .. {astrk_v} ..{c['x']}")
+            
+            # Run validations pre run
+            self.validate_steps             =   VALIDATE_BEFORE
+            self.run_validations()
+
+        if self.prev_step_success and self.validation_success is not False:
+            # Run the pipeline step
+            astrk_p,astrk_s = "**"*(len(proj)),"**"*len(step_name)
+            
+            print(f"{c['c']}\t ** {astrk_p} {astrk_s} **")
+            print(f"\t\t {proj.upper()} : {step_name}")
+            print(f"\t ** {astrk_p} {astrk_s} **{c['x']}")
+            self.run_step()
+        
+        # Run validations post run
+        if self.validation_success is not False and self.prev_step_success and VALIDATE_AFTER.get(step_name, {}).get('functions'):
+            astrk_v = ".."*len(f"Post-process ({self.step_name})")
+            print(f"{c['by']}\t .. {astrk_v} ..")
+            print(f"\t\t Post-process ({self.step_name})")
+            print(f"\t .. {astrk_v} ..{c['x']}")
+
+            self.validate_steps             =   VALIDATE_AFTER
+            self.run_validations()
+            
+        if self.validation_success is not False:
+            print(f" finished : {step_name}")
+        else:
+            print(f" skipped  : {step_name}")
+        return self.validation_success is not False and bool(self.prev_step_success)
+
+    def run_steps(self, steps: List[str], workers: int = None, completed: List[str] = None):
+        """runs the steps following their dependencies (see `step_graph`), independent steps run concurrently.
+
+        Each step runs on a fork of this run, the parameters it changes (e.g `ret`) are merged back when it finishes.
+        If a step fails no new step is started and typer.Exit is raised once the running ones are done.
+
+        Args:
+            steps (_list_): _step names, in registration order_
+            workers (_int_, optional): _maximum number of steps running at once, default: as many as are ready_
+            completed (_list_, optional): _steps already completed e.g from `resume()`, these are not run again_
+
+        Returns:
+            _dict_: _step name --> True (finished) / False (skipped)_
+        """
+        graph                               =   step_graph(steps)
+        pending, status, running            =   list(steps), {}, {}
+        lock, failed                        =   threading.Lock(), []
+        for step_name in completed or []:
+            if step_name in pending:
+                print(f" completed: {step_name} (resumed from checkpoint)")
+                pending.remove(step_name)
+                status[step_name]           =   True
+
+        def _execute(step_name, child, base):
+            ran                             =   child.execute_step(step_name)
+            with lock:
+                self.params.update({k: v for k, v in child.params.items() if k not in base or base[k] is not v})
+                if ran: self.save_checkpoint(step_name)
+            return ran
+
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+        workers                             =   workers or max(len(steps), 1)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while pending or running:
+                skipped                     =   True
+                while skipped and not failed:                           # the dependents of skipped steps are skipped too
+                    skipped                 =   False
+                    for step_name in [s for s in pending if graph[s] <= set(status)]:
+                        if not all(status[d] for d in graph[step_name]):
+                            pending.remove(step_name)
+                            print(f" skipped  : {step_name}")
+                            status[step_name]   =   False
+                            skipped             =   True
+                            continue
+                        if len(running) >= workers: continue            # started when a worker is free, unless one fails
+                        pending.remove(step_name)
+                        child               =   self.fork()
+                        running[pool.submit(_execute, step_name, child, dict(child.params))] = step_name
+                if not running:
+                    if pending and not failed: 
+                        raise ValueError(f"Circular step dependencies between: {', '.join(pending)}")
+                    break
+                finished, _                 =   wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step_name               =   running.pop(future)
+                    try:
+                        status[step_name]   =   future.result()
+                    except BaseException as e:
+                        failed.append(step_name)
+                        if not isinstance(e, typer.Exit): traceback.print_exception(type(e), e, e.__traceback__)
+        if failed:
+            raise typer.Exit()
+        if self.checkpoint is not None: self.checkpoint.clear()
+        return status
+
+    def sweep(self, paramsets, steps: List[str], processes: int = None, workers: int = None, log_dir=None):
+        """runs the steps once for every parameter set, in a pool of forked worker processes.
+
+        Every run starts from a fork of this run with the parameter set added (the parameters already set here,
+        e.g `key=value` on the command line, take precedence) and the validator run counts as they are here.
+        The runs are not checkpointed, each one is recorded in the run log as a run of its own.
+
+        Args:
+            paramsets (_list_): _(label, params) of the runs e.g from `alfrd.util.find_paramfiles` and `read_params`_
+            steps (_list_): _step names, as for `run_steps`_
+            processes (_int_, optional): _number of worker processes, default: number of CPUs. 1 runs them one after the other here_
+            workers (_int_, optional): _maximum number of independent steps running at once in a run_
+            log_dir (_Path_, optional): _the output of every run goes to <log_dir>/<n>.log instead of the terminal_
+
+        Returns:
+            _list_: _per parameter set {"label", "status": finished/skipped/failed, "steps", "error", "wall", "log"}_
+        """
+        import multiprocessing
+        from alfrd import c
+        tasks                               =   [(i, str(label), params) for i, (label, params) in enumerate(paramsets)]
+        processes                           =   min(processes or os.cpu_count() or 1, max(len(tasks), 1))
+        if log_dir is not None: Path(log_dir).mkdir(parents=True, exist_ok=True)
+        _SWEEP.update(base=self, steps=list(steps), workers=workers, log_dir=log_dir,
+                      run_counts={k: v['run_count'] for k, v in VALIDATORS.items()})
+        print(f"sweeping {len(tasks)} parameter sets, {processes} at a time" + (f", output in {log_dir}" if log_dir else ''))
+
+        results, pool                       =   [], None
+        if processes > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            pool                            =   multiprocessing.get_context('fork').Pool(processes)
+            outcomes                        =   pool.imap_unordered(_sweep_run, tasks)
+        else:
+            outcomes                        =   map(_sweep_run, tasks)
+        try:
+            for result in outcomes:
+                results.append(result)
+                clr                         =   {'finished': 'g', 'skipped': 'y'}.get(result['status'], 'r')
+                print(f" {c[clr]}{result['status']:<9}{c['x']}: {result['label']} ({result['wall']:.1f}s)"
+                      + (f" {result['error']}" if result['error'] else ''))
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            _SWEEP.clear()
+
+        results.sort(key=lambda r: r['index'])
+        counts                              =   {k: sum(r['status'] == k for r in results) for k in ('finished', 'skipped', 'failed')}
+        print(f"\n{len(results)} parameter sets: {c['g']}{counts['finished']} finished{c['x']}, "
+              f"{c['y']}{counts['skipped']} skipped{c['x']}, {c['r']}{counts['failed']} failed{c['x']}")
+        for r in results:
+            if r['status'] == 'failed': print(f"  failed: {r['label']}" + (f" (see {r['log']})" if r['log'] else ''))
+        return results
+
+    def measure(self, kind, name):
+        """_context measuring a step or validator into the run log, if any_"""
+        return _unmeasured() if self.runlog is None else self.runlog.measure(kind, name)
+
+    def save_checkpoint(self, step_name=None):
+        """_saves the params (and step_name as completed) to the checkpoint, if any_"""
+        if self.checkpoint is not None:
+            self.checkpoint.record(self.params, step_name=step_name,
+                                   run_counts={k: v['run_count'] for k, v in VALIDATORS.items()})
+
+    def resume(self):
+        """_restores the params and validator run counts from the checkpoint_
+
+        Returns:
+            _list_: _the steps already completed_
+        """
+        if self.checkpoint is None or not self.checkpoint.load(): return []
+        self.init_params(self.checkpoint.params)
+        for name, run_count in self.checkpoint.run_counts.items():
+            if name in VALIDATORS: VALIDATORS[name]['run_count'] = run_count
+        return list(self.checkpoint.completed)
 
     def run_validations(self):
         result                                  =   None
@@ -197,11 +607,13 @@ class PipelineRun:
                         default_params          =   VALIDATORS[validator_name]['default_params']
                         validator_params        =   self.all_step_params(required_params=required_params, default_params=default_params)
                         self.prev_step_success  =   True                                                # this will change if error is raised.
-                        result                  =   validator_func(**validator_params) if len(validator_params) else validator_func()
+                        with self.measure("validator", validator_name):
+                            result              =   validator_func(**validator_params) if len(validator_params) else validator_func()
                         
                         if self.validation_success is None: self.validation_success = result
                         VALIDATORS[validator_name]['run_count'] += 1
                         self.params['ret_valid']        =   result
+                        self.save_checkpoint()
                     except ValueError as e:
                         self.prev_step_success  =   False
                         typer.secho(f"Validation Failed! {e}", fg=typer.colors.RED)
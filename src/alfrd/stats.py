@@ -0,0 +1,205 @@
+"""
+Instrumentation of pipeline runs.
+
+`PipelineRun` measures every step and validator it runs and appends a record to the run log of the
+project (`<project>/.runlog.jsonl`), one JSON object per line:
+
+    {"run": "20240101T120000-4242", "time": 1704106800.0, "project": "myproj", "kind": "step", "name": "fits_to_ms",
+     "wall": 12.3, "cpu": 11.8, "maxrss": 524288000, "rss_growth": 0, "ok": true, "error": null, "cached": false}
+
+:wall:          seconds
+:cpu:           CPU seconds of the thread running it plus the CPU of child processes which finished meanwhile
+                (attributed to whichever step was running if steps run concurrently)
+:maxrss:        peak resident memory in bytes of the alfrd process (or of its largest finished child) so far
+:rss_growth:    how much the step raised the peak resident memory of the alfrd process
+
+`alfrd stats <proj>` aggregates the records across runs (see `summarize`). Steps run with `alfrd run --profile`
+or registered with `profile=True` are also profiled (see `profile_call`).
+"""
+from pathlib import Path
+from contextlib import contextmanager
+import json, os, sys, threading, time
+
+try:
+    import resource
+except ImportError:                                 # windows
+    resource = None
+
+_thread_time    =   getattr(time, 'thread_time', time.process_time)
+
+def _usage():
+    """(children CPU seconds, peak RSS of this process in bytes, peak RSS of a child in bytes)"""
+    if resource is None: return 0.0, 0, 0
+    unit        =   1 if sys.platform == 'darwin' else 1024         # ru_maxrss is in kilobytes on linux
+    self_, ch   =   resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return ch.ru_utime + ch.ru_stime, self_.ru_maxrss * unit, ch.ru_maxrss * unit
+
+class RunLog:
+    """
+    Input
+    ---
+
+    :path:          JSONL file the records are appended to
+    :project:       project name stored with every record
+    :run:           id of this run, defaults to the start time and the process id
+    """
+    def __init__(self, path, project='', run=None):
+        self.path       =   Path(path)
+        self.project    =   project
+        self.run        =   run or f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        self._lock      =   threading.Lock()
+
+    def write(self, record):
+        line = json.dumps({'run': self.run, 'time': time.time(), 'project': self.project, **record}, default=repr)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+    @contextmanager
+    def measure(self, kind, name):
+        """
+        measures the block and writes its record, exceptions are recorded and raised again
+
+            with runlog.measure('step', 'fits_to_ms') as record:
+                ...
+                record['cached'] = True                 # extra fields for the record
+        """
+        record                          =   {'kind': kind, 'name': name, 'ok': True, 'error': None}
+        cpu0, (chcpu0, rss0, _)         =   _thread_time(), _usage()
+        t0                              =   time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record.update(ok=False, error=type(e).__name__ if not str(e) else f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            wall                        =   time.perf_counter() - t0
+            chcpu, rss, chrss           =   _usage()
+            record.update(wall=wall, cpu=_thread_time() - cpu0 + chcpu - chcpu0, maxrss=max(rss, chrss),
+                          rss_growth=rss - rss0)
+            try:
+                self.write(record)
+            except OSError as e:
+                print(f"could not write the run log {self.path}: {e}")
+
+def read(path, last=None):
+    """
+    records of the run log, only those of the `last` n runs if given
+    """
+    records = []
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    pass                            # partly written line of an interrupted run
+    except FileNotFoundError:
+        return []
+    if last:
+        runs    =   list(dict.fromkeys(r.get('run') for r in records))[-last:]
+        records =   [r for r in records if r.get('run') in set(runs)]
+    return records
+
+def percentile(values, q):
+    """q-th percentile (0-100) of the values, linear interpolation between the closest ranks"""
+    values  =   sorted(values)
+    if not values: return None
+    k       =   (len(values) - 1) * q / 100
+    f       =   int(k)
+    return values[f] + (values[min(f + 1, len(values) - 1)] - values[f]) * (k - f)
+
+def summarize(records, percentiles=(50, 90, 99)):
+    """
+    statistics per step/validator, sorted by the total wall time
+
+    Returns
+    ---
+
+    list of {"kind", "name", "n", "runs", "errors", "cached", "wall_total", "wall_p50", ..., "cpu_p50", ..., "maxrss"}
+    """
+    groups  =   {}
+    for r in records:
+        groups.setdefault((r.get('kind'), r.get('name')), []).append(r)
+    summary =   []
+    for (kind, name), rs in groups.items():
+        walls, cpus =   [r['wall'] for r in rs if 'wall' in r], [r['cpu'] for r in rs if 'cpu' in r]
+        s           =   {'kind': kind, 'name': name, 'n': len(rs), 'runs': len({r.get('run') for r in rs}),
+                         'errors': sum(1 for r in rs if not r.get('ok', True)),
+                         'cached': sum(1 for r in rs if r.get('cached')),
+                         'wall_total': sum(walls), 'maxrss': max([r.get('maxrss', 0) for r in rs] or [0])}
+        for q in percentiles:
+            s[f"wall_p{q}"] =   percentile(walls, q)
+            s[f"cpu_p{q}"]  =   percentile(cpus, q)
+        summary.append(s)
+    return sorted(summary, key=lambda s: -s['wall_total'])
+
+def _fmt_time(s):
+    if s is None: return '-'
+    if s < 1e-3: return f"{s*1e6:.0f}us"
+    return f"{s*1e3:.1f}ms" if s < 1 else f"{s:.2f}s" if s < 120 else f"{s/60:.1f}m"
+
+def format_summary(summary, percentiles=(50, 90, 99)):
+    """summary as a text table"""
+    total   =   sum(s['wall_total'] for s in summary) or 1
+    head    =   f"{'kind':<10}{'name':<30}{'n':>6}{'err':>5}{'cache':>6}{'total':>10}{'%':>6}" \
+                + ''.join(f"{'wall p'+str(q):>11}" for q in percentiles) + f"{'cpu p50':>11}{'maxrss':>10}"
+    lines   =   [head, '-'*len(head)]
+    for s in summary:
+        lines.append(f"{str(s['kind']):<10}{str(s['name'])[:29]:<30}{s['n']:>6}{s['errors']:>5}{s['cached']:>6}"
+                     f"{_fmt_time(s['wall_total']):>10}{100*s['wall_total']/total:>5.0f}%"
+                     + ''.join(f"{_fmt_time(s[f'wall_p{q}']):>11}" for q in percentiles)
+                     + f"{_fmt_time(s.get('cpu_p50')):>11}{s['maxrss']/1024**2:>8.0f}MB")
+    return '\n'.join(lines)
+
+def _collapse(frame, stop):
+    """stack of the frame as 'file:function;...' from the outermost call below `stop`"""
+    names = []
+    while frame is not None and frame.f_code is not stop:
+        names.append(f"{Path(frame.f_code.co_filename).name}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+def profile_call(func, kwargs, path, top=20, interval=0.005):
+    """
+    calls `func(**kwargs)` under cProfile and samples the stack of the calling thread every `interval` seconds
+
+    Writes `path`.prof (for pstats/snakeviz) and `path`.collapsed (stack counts, for flamegraph.pl/speedscope),
+    prints the `top` functions by cumulative time and returns the result of the call.
+    """
+    import cProfile, pstats, io
+    from collections import Counter
+    path            =   Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    ident, stop     =   threading.get_ident(), threading.Event()
+    samples         =   Counter()
+    this            =   sys._getframe().f_code
+
+    def sample():
+        while not stop.wait(interval):
+            frame = sys._current_frames().get(ident)
+            if frame is not None: samples[_collapse(frame, this)] += 1
+
+    sampler         =   threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    profiler        =   cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:                         # another profiler is active (python >= 3.12), only sampling
+        print(f"cProfile not available for {path.name} ({e}), sampling the stack only")
+        profiler    =   None
+    try:
+        return func(**kwargs) if kwargs else func()
+    finally:
+        if profiler is not None: profiler.disable()
+        stop.set()
+        sampler.join()
+        with open(path.with_suffix('.collapsed'), 'w') as f:
+            f.writelines(f"{stack} {n}\n" for stack, n in samples.most_common() if stack)
+        if profiler is not None:
+            profiler.dump_stats(str(path.with_suffix('.prof')))
+            out     =   io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(top)
+            print(f"profile of {path.name}: {path.with_suffix('.prof')}")
+            print(out.getvalue().strip('\n'))
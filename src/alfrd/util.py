@@ -1,57 +1,209 @@
-import numpy as np
 from pathlib import Path
-import os
-import subprocess, glob, shutil, time, json
+import os, importlib, re, fnmatch
+import subprocess, glob, shutil, stat, time, json
 from collections import defaultdict
+from collections.abc import ItemsView, ValuesView
+from contextlib import contextmanager
 
-def read_inputfile(folder,inputfile='.inp'):
+try:
+    import fcntl
+except ImportError:                                 # windows
+    fcntl = None
+
+# The alfrd directory for projects/plugins, caches etc.
+ALFRD_DIR = Path("~/.alfrd").expanduser()
+
+class LazyModule:
+    """
+    module proxy importing the module on first attribute access e.g `pd = LazyModule('pandas')`
+    keeps heavy imports (pandas, gspread, numpy) out of the startup of alfrd
+    """
+    def __init__(self, name):
+        self.__dict__['_name']      =   name
+        self.__dict__['_module']    =   None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self.__dict__['_module'] = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+class LazyGlob:
+    """
+    glob pattern of a parameter, expanded to the list of matching paths when the parameter is first read
+    (relative patterns against the working directory of the `read_inputfile` call)
+    """
+    def __init__(self, pattern, cwd=None):
+        self.pattern    =   pattern
+        self.cwd        =   cwd or os.getcwd()
+
+    def expand(self):
+        try:
+            if os.path.isabs(self.pattern) or os.getcwd() == self.cwd:
+                return glob.glob(self.pattern, recursive=True)
+            return [os.path.relpath(f, self.cwd) for f in glob.glob(os.path.join(self.cwd, self.pattern), recursive=True)]
+        except Exception:
+            return str(self.pattern)
+
+    def __repr__(self):
+        return f"LazyGlob({self.pattern!r})"
+
+class InputParams(dict):
+    """
+    parameters read by `read_inputfile`: a dict where missing keys are [] (like defaultdict(list))
+    and glob values are only expanded when they are read, including by items(), values(), get(),
+    dict(params) and json.dumps
+    """
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if isinstance(value, LazyGlob):
+            value = self[key] = value.expand()
+        return value
+
+    def __missing__(self, key):
+        value = self[key] = []
+        return value
+
+    def __iter__(self):                                             # dict(params), {**params} read through __getitem__
+        return super().__iter__()
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def items(self):
+        return ItemsView(self)
+
+    def values(self):
+        return ValuesView(self)
+
+    def copy(self):
+        return type(self)(super().items())                          # globs still unexpanded
+
+_SCANS          =   {}          # (folder, inputfile, depth) --> (files, {directory: mtime_ns} of the directories deciding them)
+_PARSED         =   {}          # input file --> ((mtime_ns, size), [(key, value or ('glob', pattern))])
+_CACHE_SIZE     =   10000
+
+def find_inputfiles(folder, inputfile='.inp', depth=3):
+    """
+    files `*<inputfile>` in the folder, else in its subdirectories and so on down to `depth` levels,
+    the files of the first level with any are returned (as `glob` would name them). The walk is reused
+    as long as the directories deciding its result are not modified: those of the levels above the files found
+    and the directories holding them (all the directories walked if none were found). A file added to another
+    directory of the level of the files found is only seen after one of those directories is modified.
+    """
+    folder          =   str(folder)
+    key             =   (folder if os.path.isabs(folder) else os.path.join(os.getcwd(), folder), inputfile, depth)
+    cached          =   _SCANS.get(key)
+    if cached:
+        try:
+            if all(os.stat(d).st_mtime_ns == mtime for d, mtime in cached[1].items()): return list(cached[0])
+        except OSError:
+            pass
+    match           =   re.compile(fnmatch.translate(f"*{inputfile}")).match
+    dirs, mtimes    =   [folder], {}
+    files, above    =   [], {}
+    for _ in range(depth):
+        subdirs     =   []
+        above.update(mtimes)
+        mtimes      =   {}
+        for d in dirs:
+            try:
+                mtimes[d]   =   os.stat(d).st_mtime_ns
+                with os.scandir(d) as it:
+                    for entry in it:
+                        if entry.name.startswith('.'): continue                     # hidden, as glob
+                        try:
+                            if entry.is_dir():
+                                subdirs.append(f"{d}/{entry.name}")
+                            elif match(entry.name) and entry.is_file():
+                                files.append(f"{d}/{entry.name}")
+                        except OSError:
+                            pass
+            except OSError:
+                continue
+        if files or not subdirs: break
+        dirs        =   subdirs
+    if files:
+        holding     =   {f.rsplit('/', 1)[0] for f in files}
+        mtimes      =   {d: mtime for d, mtime in mtimes.items() if d in holding}
+    if len(_SCANS) >= _CACHE_SIZE: _SCANS.clear()
+    _SCANS[key]     =   (files, {**above, **mtimes})
+    return list(files)
+
+def _parse_value(v):
+    """value of a parameter line: leading zeros kept as str, int, float, bool, glob pattern or str"""
+    if str(v).strip() and v.strip()[0] == '0':                                      # check for leading zeros
+        return str(v).strip()
+    try:
+        return int(v)
+    except ValueError:
+        pass
+    try:
+        return float(v)
+    except ValueError:
+        pass
+    v = str(v).strip()
+    if "*" in v:
+        return ('glob', v)
+    return v.lower() == 'true' if v.lower() in ('true', 'false') else v
+
+def parse_inputfile(filepath):
+    """
+    (key, value) of the `key = value` lines of the file, lines with a '#' are skipped.
+    parsed once per file version (mtime and size), glob patterns are returned as ('glob', pattern)
+    """
+    st      =   os.stat(filepath)
+    sig     =   (st.st_mtime_ns, st.st_size)
+    cached  =   _PARSED.get(filepath)
+    if cached and cached[0] == sig: return cached[1]
+    items   =   []
+    with open(filepath, 'r') as f:
+        for p in f.read().splitlines():
+            if '#' in p or '=' not in p: continue
+            k, v    =   p.split('=', 1)
+            items.append((k.strip(), _parse_value(v)))
+    if len(_PARSED) >= _CACHE_SIZE: _PARSED.clear()
+    _PARSED[filepath] = (sig, items)
+    return items
+
+def read_inputfile(folder,inputfile='.inp', depth=3):
     """Read the input file and return a dictionary with the parameters.
 
+    The input files are searched in the folder, else in its subdirectories, down to `depth` levels (see `find_inputfiles`).
+    Unchanged files are not parsed again and values with a '*' are expanded by glob when first read.
+
     Returns
     ---
 
     (params, files, input_folder)
 
     """
-    params = defaultdict(list)
-    input_folder= None
-    files=glob.glob(f'{folder}/*{inputfile}',recursive=True)
-    if not files: files=glob.glob(f'{folder}/*/*{inputfile}',recursive=False)
-    if not files: files=glob.glob(f'{folder}/*/*/*{inputfile}',recursive=False)
+    params      =   InputParams()
+    input_folder=   None
+    files       =   find_inputfiles(folder, inputfile, depth=depth)
     if files:
         input_folder = str(Path(files[-1]).parent) + '/'
         for filepath in files:
-            if inputfile in filepath:
-                with open(filepath,'r') as f:
-                    pr=f.read().splitlines()
-                    for p in pr:
-                        if '#' in p:
-                            continue
-                        elif '=' in p:
-                            k,v=p.split('=')
-                            # check for leading zeros
-                            if str(v).strip() and v.strip()[0] == '0':
-                                v   =   str(v).strip()
-                                
-                            else:
-                                try:
-                                    v=int(v)
-                                except:
-                                    try:
-                                        v=float(v)
-                                    except:
-                                        v=str(v).strip()
-                                        if "*" in v:
-                                            try:
-                                                v = glob.glob(f'{v}', recursive=True)
-                                            except:
-                                                v = str(v)
-                                        else:
-                                            v = v.lower() == 'true' if (any(boolv == v.lower() for boolv in ['true', 'false'])) else v
-                            params[k.strip()]=v
+            read_params(filepath, params)
                             
     return params, files, input_folder
 
+def read_params(filepath, params=None):
+    """parameters of one input file added to `params` (a new InputParams by default), which is returned"""
+    params      =   InputParams() if params is None else params
+    cwd         =   os.getcwd()
+    for k, v in parse_inputfile(str(filepath)):
+        params[k]   =   LazyGlob(v[1], cwd) if isinstance(v, tuple) else v
+    return params
+
+def find_paramfiles(target, inputfile='.inp', depth=3):
+    """
+    parameter files of a sweep, sorted: the input files found in `target` if it is a directory (see `find_inputfiles`),
+    else the files matching `target` as a glob pattern
+    """
+    if os.path.isdir(target):
+        return sorted(find_inputfiles(target, inputfile, depth=depth))
+    return sorted(f for f in glob.glob(str(target), recursive=True) if os.path.isfile(f))
+
 def update_existing_dict(to, from_dic):
     """_updates values only for existing keys_
 
@@ -74,6 +226,7 @@ def read_metafile(metafile):
     return meta
 
 def find_size(fitsfile):
+    import numpy as np
     size = np.round(Path(fitsfile).stat().st_size/(1024*1024),2)
     if size >= 1024.0 : 
         size = size/1024
@@ -86,22 +239,66 @@ def find_project(fitsfile):
     project     =   str(Path(fitsfile).parent.name)
     return str(project)
 
+def numbered_paths(path):
+    """
+    the existing `path`, `path`_1, `path`_2 ... (as named by `build_path`) from one listing of the parent
+
+    Returns
+    ---
+
+    {n: path} with n=0 for `path` itself
+    """
+    path        =   Path(path)
+    pattern     =   re.compile(rf"{re.escape(path.stem)}(?:_(\d+))?{re.escape(path.suffix)}")
+    found       =   {}
+    try:
+        with os.scandir(path.parent) as it:
+            for entry in it:
+                m = pattern.fullmatch(entry.name)
+                if m: found[int(m.group(1) or 0)] = str(path.parent / entry.name)
+    except FileNotFoundError:
+        pass
+    return found
+
+def _numbered(path, n):
+    return str(path) if n == 0 else "{0}_{2}{1}".format(Path(path).parent / Path(path).stem, Path(path).suffix, n)
+
 def build_path(filepath):
     """
     This builds new file path by adding _{n+1} if there exists one with similar name,
     """
-    opt = filepath
-    if Path(filepath).exists():
-        numb = 1
-        while Path(filepath).exists():
-            filepath = "{0}_{2}{1}".format(
-                *(Path(opt).parent / Path(opt).stem, Path(opt).suffix,numb))
-            try :
-                if Path(filepath).exists():
-                    numb += 1 
-            except:
-                pass
-    return filepath
+    taken       =   numbered_paths(filepath)
+    n           =   0
+    while n in taken: n += 1
+    return _numbered(filepath, n)
+
+def allocate_dir(path, taken=None):
+    """
+    creates the directory `path`, or the first free of `path`_1, `path`_2 ... and returns it.
+    The parent is listed once (or `taken` from `numbered_paths` is used) and the directory is made with
+    an exclusive mkdir, so workers allocating at the same time never get the same one.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    taken       =   set(numbered_paths(path) if taken is None else taken)
+    n           =   0
+    while True:
+        while n in taken: n += 1
+        try:
+            os.mkdir(_numbered(path, n))
+            return _numbered(path, n)
+        except FileExistsError:
+            taken.add(n)
+
+@contextmanager
+def locked(path):
+    """holds an exclusive lock on the file `path` (created if needed) meanwhile, across processes"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as f:
+        if fcntl is not None: fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None: fcntl.flock(f, fcntl.LOCK_UN)
 
 def symlink_bywd(wd, fitsfile, create=True):
     rawsymlink          =   f"{wd}/raw/{Path(fitsfile).name}" 
@@ -109,9 +306,59 @@ def symlink_bywd(wd, fitsfile, create=True):
     if create : os.symlink(fitsfile, rawsymlink)
     return rawsymlink
 
-def dir_for_project(fitsfile, tdir='/data/avi/reductions/100test/', ifolder='/data/avi/gh/picard/src/picard/input_template/', create=True, splitted=False):
+FICLONE         =   0x40049409                      # linux ioctl cloning a file copy on write (btrfs, xfs, ...)
+_REFLINK        =   {}                              # (source device, destination device) --> reflinks work
+
+def reflink(src, dst):
+    """copy on write clone of the file `src` at `dst`, raises OSError where the filesystem can not"""
+    if fcntl is None: raise OSError("reflinks are not supported on this platform")
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    shutil.copystat(src, dst)
+    return dst
+
+def template_copier(mode='copy', mutable=()):
+    """
+    copy_function for `shutil.copytree` provisioning a template
+
+    Input
+    ---
+
+    :mode:          'copy' every file, 'reflink' (copy on write where the filesystem supports it, else copy) or
+                    'link' (hard links, else as 'reflink'). Hard linked files are shared with the template,
+                    a step changing one in place changes the template
+    :mutable:       file name patterns (fnmatch) of the files a step changes, never hard linked
+    """
+    if mode not in ('copy', 'reflink', 'link'): raise ValueError(f"unknown template mode {mode}")
+
+    def copy(src, dst):
+        if mode == 'copy': return shutil.copy2(src, dst)
+        name        =   os.path.basename(src)
+        if mode == 'link' and not any(fnmatch.fnmatch(name, p) for p in mutable):
+            try:
+                os.link(src, dst)
+                return dst
+            except OSError:                                                 # other filesystem, link limit ...
+                pass
+        key         =   (os.stat(src).st_dev, os.stat(os.path.dirname(dst) or '.').st_dev)
+        if _REFLINK.get(key, True):
+            try:
+                reflink(src, dst)
+                _REFLINK[key] = True
+                return dst
+            except OSError:
+                _REFLINK[key] = False                                       # not tried again for these filesystems
+        return shutil.copy2(src, dst)
+    return copy
+
+def provision_template(ifolder, wd_ifolder, mode='copy', mutable=()):
+    """copies the template folder to `wd_ifolder` (see `template_copier` for `mode` and `mutable`)"""
+    return shutil.copytree(ifolder, wd_ifolder, copy_function=template_copier(mode, mutable))
+
+def dir_for_project(fitsfile, tdir='/data/avi/reductions/100test/', ifolder='/data/avi/gh/picard/src/picard/input_template/', create=True, splitted=False,
+                    mode='copy', mutable=()):
     """
-    looks for wd using project name
+    looks for wd using project name, a new wd gets a copy of the template `ifolder` (`mode` and `mutable` as in `template_copier`)
     """
     new                 =   True
     segment             =   find_project(fitsfile)
@@ -119,18 +366,23 @@ def dir_for_project(fitsfile, tdir='/data/avi/reductions/100test/', ifolder='/da
     wd_ifolder          =   None
     lookfile            =   fitsfile if not splitted else f"{str(Path(fitsfile).stem)}_split{Path(fitsfile).suffix}"
     if create:
-        if not Path(f"{wd}/raw/{Path(lookfile).name}").exists():
-            wd                  =   build_path(wd)
+        with locked(f"{tdir}{segment}/.wd.lock"):                              # one worker at a time looks up/allocates the wd
+            existing    =   numbered_paths(wd)
+            found       =   [p for _, p in sorted(existing.items()) if os.path.lexists(f"{p}/raw/{Path(lookfile).name}")]
+            wd          =   found[0] if found else allocate_dir(wd, taken=existing)
             
-        try:
-            rawsymlink = symlink_bywd(wd, fitsfile)
-               
+            try:
+                rawsymlink = symlink_bywd(wd, fitsfile)
+            except Exception as e:
+                print(f"exists? : {segment} : {e}")
+                new     =   False
+        if new:
             wd_ifolder          =   f'{wd}/input_template/'
-            if not Path(wd_ifolder).exists():shutil.copytree(ifolder,wd_ifolder)
-        except Exception as e:
-            print(f"exists? : {segment} : {e}")
-            new             =   False
-    
+            try:
+                if not Path(wd_ifolder).exists():provision_template(ifolder, wd_ifolder, mode=mode, mutable=mutable)
+            except Exception as e:
+                print(f"exists? : {segment} : {e}")
+        
         new             =   False
     else:
         possible_file = glob.glob(f'{wd}*/raw/{Path(lookfile).name}')
@@ -140,10 +392,23 @@ def dir_for_project(fitsfile, tdir='/data/avi/reductions/100test/', ifolder='/da
             new = False
     return wd_ifolder, new
 
+def provision_projects(fitsfiles, workers=8, **kwargs):
+    """
+    `dir_for_project` for many files at once in a thread pool (kwargs are passed on)
+
+    Returns
+    ---
+
+    [(wd_ifolder, new)] in the order of the files
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda f: dir_for_project(f, **kwargs), fitsfiles))
+
 def del_extra_wdfolder(wd_ifolder, fitsfile):
     """
     useful when for a project name there are more folders created by mistakes,
-    e.g wd_1/ wd_2/ instead of just wd/
+    e.g wd_1/ wd_2/ instead of just wd/ (`dir_for_project` no longer creates these for a file already provisioned)
 
     Note: assumes wd_1, wd_2 etc are created by mistake
     """
@@ -168,6 +433,7 @@ def timeinmin(td):
     """
     convert timdedelta in XXmYYs format
     """
+    import numpy as np
     tdm,tds     =   0,0
     if td>=60:
         tdm     =   td//60
@@ -178,18 +444,99 @@ def timeinmin(td):
 
     return ret_time
 
-def del_fl(wd, count=0, fl='*ms*', rm=False):
+def _clear_dir(path, dry_run=False):
+    """
+    deletes the files of one directory (symlinks are files), its subdirectories are left
+
+    Returns
+    ---
+
+    (files, bytes, subdirectories, errors)
+    """
+    files, size, dirs, errors   =   0, 0, [], 0
+    try:
+        with os.scandir(path) as it:
+            entries         =   list(it)                                    # listed before unlinking
+    except OSError:
+        return files, size, dirs, 1
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                dirs.append(entry.path)
+                continue
+            size    +=  entry.stat(follow_symlinks=False).st_size
+            if not dry_run: os.unlink(entry.path)
+            files   +=  1
+        except FileNotFoundError:
+            pass
+        except OSError:
+            errors  +=  1
+    return files, size, dirs, errors
+
+def delete_paths(paths, workers=8, dry_run=False):
+    """
+    deletes the files and directory trees in `paths` in this process: the directories are walked and their
+    files unlinked by a pool of `workers` threads, then the directories are removed deepest first.
+    Symlinks are deleted, not followed. On a local disk this is slower than `rm -rf` (about 1.5x at 1000
+    directories of 20 files, `bench_delete`), the threads pay off where each unlink waits on the storage
+    (network filesystems), use `rm -rf` where the report is not needed.
+
+    Returns
+    ---
+
+    {"files", "dirs", "bytes", "errors", "dry_run"}, what was (or with dry_run would be) deleted, bytes is the size of the files
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    report          =   {'files': 0, 'dirs': 0, 'bytes': 0, 'errors': 0, 'dry_run': dry_run}
+    dirs            =   []
+    for path in paths:
+        try:
+            st      =   os.lstat(path)
+            if stat.S_ISDIR(st.st_mode):
+                dirs.append(str(path))
+                continue
+            if not dry_run: os.unlink(path)
+            report['files'] += 1
+            report['bytes'] += st.st_size
+        except FileNotFoundError:
+            pass
+        except OSError:
+            report['errors'] += 1
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending     =   {pool.submit(_clear_dir, d, dry_run) for d in dirs}
+        while pending:
+            done, pending   =   wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, size, subdirs, errors = future.result()
+                report['files'] += files
+                report['bytes'] += size
+                report['errors'] += errors
+                dirs.extend(subdirs)
+                pending.update(pool.submit(_clear_dir, d, dry_run) for d in subdirs)
+    report['dirs']  =   len(dirs)
+    if dry_run: return report
+    for d in sorted(dirs, key=lambda d: d.count(os.sep), reverse=True):
+        try:
+            os.rmdir(d)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            report['errors'] += 1
+    return report
+
+def del_fl(wd, count=0, fl='*ms*', rm=False, workers=8):
     """
-    delete files from the input folder
+    delete files from the input folder (matching `fl`), only reported unless `rm` (see `delete_paths`)
     """
     wd          =   Path(wd)
     filefound = glob.glob(f"{str(wd)}/{fl}")
     if len(filefound):
-        cmd = ['rm','-rf']
-        cmd.extend(str( wd / " ".join(filefound)).split(' '))
-        print(" ".join(cmd))
+        report  =   delete_paths(filefound, workers=workers, dry_run=not rm)
+        print(f"{'deleted' if rm else 'to delete'}: {' '.join(filefound)} "
+              f"({report['files']} files, {report['dirs']} folders, {report['bytes']/1024**2:.1f} MB"
+              + (f", {report['errors']} errors)" if report['errors'] else ")"))
         count+=1
-        if rm: subprocess.run(cmd)
     return count
 
 def build_logpath(wd_ifolder):
@@ -0,0 +1,103 @@
+"""
+Cached step results and the checkpoints of `alfrd run --resume`
+"""
+import importlib.util, os, threading, time
+import pytest
+
+from alfrd import plugins
+from alfrd.cache import Checkpoint, StepCache
+
+
+def load(path, body):
+    """function `step` of a module file with the given body"""
+    path.write_text(f"def step(x=0):\n    {body}\n")
+    spec    =   importlib.util.spec_from_file_location(path.stem, path)
+    module  =   importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.step
+
+
+def test_key_changes_with_source_and_params(tmp_path):
+    cache   =   StepCache(tmp_path / 'cache')
+    step    =   load(tmp_path / 'steps.py', "return x")
+    key     =   cache.key(step, {'x': 1, 'wd': '/data'})
+    assert key == cache.key(step, {'wd': '/data', 'x': 1})
+    assert key != cache.key(step, {'x': 2, 'wd': '/data'})
+    assert key != cache.key(load(tmp_path / 'steps.py', "return x + 1"), {'x': 1, 'wd': '/data'})
+
+
+@pytest.fixture
+def cached_step():
+    """step registered with cache=True, returns the list of its calls"""
+    calls   =   []
+    def expensive(x=0):
+        calls.append(x)
+        return x * 2
+    plugins.register("cached", cache=True)(expensive)
+    yield calls
+    plugins.REGISTERED_STEPS.pop('expensive', None)
+
+
+def run(cache, **params):
+    pipeline            =   plugins.PipelineRun()
+    pipeline.cache      =   cache
+    pipeline.params     =   dict(params)
+    pipeline.run_steps(['expensive'])
+    return pipeline.params['ret']
+
+
+def test_cached_result_is_restored(tmp_path, cached_step):
+    cache   =   StepCache(tmp_path / 'cache')
+    assert run(cache, x=2) == 4 and run(cache, x=2) == 4
+    assert cached_step == [2]                                       # hit
+    assert run(cache, x=3) == 6 and cached_step == [2, 3]           # other parameters: miss
+    assert run(None, x=2) == 4 and cached_step == [2, 3, 2]         # --no-cache
+
+
+def test_eviction_by_size_and_age(tmp_path):
+    cache   =   StepCache(tmp_path / 'cache', max_size=3100, max_age=3600)   # 3 results of ~1 kB
+    now     =   time.time()
+    for n, key in enumerate(['a', 'b', 'c']):
+        cache.put(key, b'x' * 1000)
+        os.utime(cache._file(key), (now - 100 + n, now - 100 + n))  # a is the least recently used
+    assert sorted(f.stem for f in cache.path.iterdir()) == ['a', 'b', 'c']
+    cache.get('a')                                                  # now the most recently used
+    cache.put('d', b'x' * 1000)
+    assert sorted(f.stem for f in cache.path.iterdir()) == ['a', 'c', 'd']
+    os.utime(cache._file('c'), (now - 7200, now - 7200))
+    cache.evict()
+    assert sorted(f.stem for f in cache.path.iterdir()) == ['a', 'd']
+    assert cache.get('c') == (False, None) and cache.get('a') == (True, b'x' * 1000)
+
+
+def test_checkpoint_resumes_the_same_run(tmp_path):
+    key     =   Checkpoint.params_key({'wd': '/data', 'n': 1})
+    saved   =   Checkpoint(tmp_path / 'cp.pkl', ['a', 'b'], key=key)
+    saved.record({'wd': '/data', 'ret': 3}, step_name='a', run_counts={'check': 2})
+    loaded  =   Checkpoint(tmp_path / 'cp.pkl', ['a', 'b'], key=Checkpoint.params_key({'n': 1, 'wd': '/data'}))
+    assert loaded.load()
+    assert loaded.completed == ['a'] and loaded.params['ret'] == 3 and loaded.run_counts == {'check': 2}
+
+
+def test_checkpoint_of_other_parameters_is_not_resumed(tmp_path, capsys):
+    Checkpoint(tmp_path / 'cp.pkl', ['a', 'b'], key=Checkpoint.params_key({'n': 1})).record({}, step_name='a')
+    assert not Checkpoint(tmp_path / 'cp.pkl', ['a', 'b'], key=Checkpoint.params_key({'n': 2})).load()
+    assert "other parameters" in capsys.readouterr().out
+    assert not Checkpoint(tmp_path / 'cp.pkl', ['a', 'c'], key=Checkpoint.params_key({'n': 1})).load()
+
+
+def test_concurrent_records_do_not_collide(tmp_path):
+    path    =   tmp_path / 'cp.pkl'
+    errors  =   []
+    def record(n):
+        cp  =   Checkpoint(path, ['a'])                                 # separate instances, as separate runs
+        try:
+            for i in range(50): cp.record({'i': i, 'n': n}, step_name='a')
+        except Exception as e:
+            errors.append(e)
+    threads =   [threading.Thread(target=record, args=(n,)) for n in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert errors == []
+    assert Checkpoint(path, ['a']).load()
+    assert list(tmp_path.iterdir()) == [path]                       # no temporary file left
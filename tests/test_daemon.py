@@ -0,0 +1,83 @@
+"""
+`alfrd serve` daemon: forked runs, streamed output and exit codes over the Unix socket
+"""
+import os, sys, time, subprocess
+import multiprocessing
+import pytest
+
+from alfrd import daemon
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason="the daemon forks a child per request")
+
+
+def fake_cli(argv):
+    print("argv", " ".join(argv))
+    print("cwd", os.getcwd())
+    print("env", os.environ.get('ALFRD_TEST'))
+    sys.stdout.flush()
+    os.write(2, b"to stderr\n")                                    # fd 2 of the child is the connection too
+    return int(argv[-1]) if argv and argv[-1].isdigit() else 0
+
+
+def serve(path):
+    daemon.run_cli  =   fake_cli                                    # inherited by the forked children
+    sys.stdout, sys.stderr  =   sys.__stdout__, sys.__stderr__      # not the capture of pytest, as in `alfrd serve`
+    daemon.Daemon('test', path=path).serve_forever()
+
+
+@pytest.fixture
+def served(tmp_path):
+    # a process of its own, not a thread: the forks of a daemon thread would inherit the sockets of the client
+    path    =   tmp_path / '.alfrd' / 'run' / 'test.sock'          # socket_path('test') with HOME=tmp_path
+    server  =   multiprocessing.get_context('fork').Process(target=serve, args=(path,), daemon=True)
+    server.start()
+    for _ in range(500):
+        if daemon.ping(path): break
+        time.sleep(0.01)
+    yield path
+    server.terminate()
+    server.join()
+
+
+def test_request_streams_output_and_exit_code(served, tmp_path, capfd, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('ALFRD_TEST', 'from-client')
+    code    =   daemon.request('test', ['run', 'step', 'proj', '3'], path=served)
+    out     =   capfd.readouterr().out
+    assert code == 3
+    assert "argv run step proj 3" in out
+    assert f"cwd {tmp_path}" in out                                 # runs in the directory of the client
+    assert "env from-client" in out                                 # with its environment
+    assert "to stderr" in out
+    assert daemon.TRAILER.decode() not in out
+
+
+def test_requests_are_independent(served, capfd):
+    assert [daemon.request('test', ['x', str(code)], path=served) for code in (0, 1, 2)] == [0, 1, 2]
+
+
+def test_no_daemon(tmp_path):
+    assert daemon.request('test', ['ls'], path=tmp_path / 'none.sock') is None
+    assert not daemon.ping(tmp_path / 'none.sock')
+
+
+def test_socket_is_exclusive_and_stale_ones_replaced(served, tmp_path):
+    assert daemon.ping(served)
+    with pytest.raises(RuntimeError):
+        daemon.Daemon('test', path=served)
+    stale   =   tmp_path / 'stale.sock'
+    stale.write_text('')                                            # left over by a killed daemon
+    server  =   daemon.Daemon('test', path=stale)
+    server.server_close()
+    assert not stale.exists()
+
+
+def test_via_daemon_skips_the_cli(served, tmp_path):
+    script  =   ("import sys; from alfrd.main import main; code = main(sys.argv[1:]); "
+                 "print('typer', 'typer' in sys.modules, 'plugins', 'alfrd.plugins' in sys.modules); sys.exit(code)")
+    argv    =   ['run', 'step', '--workers', '2', 'test', 'x=1', '--via-daemon', '4']
+    p       =   subprocess.run([sys.executable, '-c', script, *argv], env={**os.environ, 'HOME': str(tmp_path)},
+                               capture_output=True, text=True)
+    assert p.returncode == 4
+    assert "argv run step --workers 2 test x=1 4" in p.stdout          # --via-daemon is not passed on
+    assert "typer False plugins False" in p.stdout
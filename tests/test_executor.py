@@ -0,0 +1,59 @@
+"""
+ProcessPool scheduling, limits and resource accounting (runs small shell commands)
+"""
+import sys, time
+import pytest
+
+from alfrd.executor import ProcessPool
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason="process groups and wait4 are posix only")
+
+
+def test_run_captures_output_and_returncode():
+    with ProcessPool(cores=2, poll=0.05) as pool:
+        ok      =   pool.run(['sh', '-c', 'echo out; echo err >&2'], capture=True)
+        bad     =   pool.run(['sh', '-c', 'exit 3'])
+    assert (ok.returncode, ok.stdout, ok.stderr) == (0, 'out\n', 'err\n')
+    assert bad.returncode == 3 and bad.killed is None
+
+
+def test_jobs_queue_when_cores_are_used():
+    with ProcessPool(cores=2, poll=0.05) as pool:
+        jobs    =   pool.map([['sleep', '0.3']] * 4, cores=1)
+    starts      =   sorted(job.started for job in jobs)
+    assert all(job.returncode == 0 for job in jobs)
+    assert starts[2] - starts[0] >= 0.25                            # the last two waited for free cores
+
+
+def test_timeout_kills_the_process_group():
+    with ProcessPool(cores=1, poll=0.05) as pool:
+        job     =   pool.run(['sh', '-c', 'sleep 30 & sleep 30'], timeout=0.3)
+    assert job.killed == 'timeout' and job.returncode < 0
+    assert job.wall < 10
+
+
+def test_unstartable_command_raises():
+    with ProcessPool(cores=1, poll=0.05) as pool:
+        job     =   pool.submit(['/nonexistent/command'])
+        with pytest.raises(OSError):
+            job.result(timeout=10)
+
+
+def test_shutdown_cancels_the_queue():
+    pool        =   ProcessPool(cores=1, poll=0.05)
+    first       =   pool.submit(['sleep', '0.3'])
+    queued      =   pool.submit(['sleep', '0.3'])
+    deadline    =   time.time() + 10
+    while first.started is None and time.time() < deadline: time.sleep(0.01)
+    pool.shutdown(wait=True, cancel=True)
+    assert first.result().returncode == 0
+    with pytest.raises(RuntimeError):
+        queued.result(timeout=1)
+    with pytest.raises(RuntimeError):
+        pool.submit(['true'])
+
+
+def test_cpu_time_is_accounted():
+    with ProcessPool(cores=1, poll=0.05) as pool:
+        job     =   pool.run([sys.executable, '-c', 'import time\nt = time.process_time()\nwhile time.process_time() - t < 0.3: pass'])
+    assert job.cpu_time >= 0.2 and job.peak_rss > 0
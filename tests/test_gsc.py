@@ -0,0 +1,156 @@
+"""
+GSC request throttling and retries, against stub sheets and the local backend (no network)
+"""
+import pytest
+import gspread
+
+from alfrd.lib import GSC, TokenBucket, is_retryable, api_error_code
+from alfrd.backend import LocalClient
+
+
+class FakeClock:
+    """monotonic clock advanced by the sleeps only"""
+    def __init__(self):
+        self.now    =   0.0
+        self.sleeps =   []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now    +=  seconds
+
+
+class Response:
+    """stand-in for the requests.Response wrapped by gspread.exceptions.APIError"""
+    def __init__(self, status_code):
+        self.status_code    =   status_code
+        self.text           =   f"error {status_code}"
+
+    def json(self):
+        return {'error': {'code': self.status_code, 'message': self.text, 'status': 'ERROR'}}
+
+
+def api_error(status_code):
+    return gspread.exceptions.APIError(Response(status_code))
+
+
+class FlakySheet:
+    """worksheet whose batch_update fails with `errors` (status codes) before succeeding"""
+    def __init__(self, errors=()):
+        self.errors     =   list(errors)
+        self.calls      =   0
+        self.updates    =   []
+
+    def batch_update(self, data, **kwargs):
+        self.calls      +=  1
+        if self.errors: raise api_error(self.errors.pop(0))
+        self.updates.append(data)
+
+
+def make_gsc(clock, sheet=None, **kwargs):
+    limiter         =   TokenBucket(rate=1000, per=1.0, burst=1000, clock=clock, sleep=clock.sleep)
+    gsc             =   GSC(sid='stub', client=object(), limiter=limiter, journal=False, **kwargs)
+    gsc.sheet       =   sheet
+    return gsc
+
+
+def test_token_bucket_waits_for_tokens():
+    clock   =   FakeClock()
+    bucket  =   TokenBucket(rate=60, per=60.0, burst=2, clock=clock, sleep=clock.sleep)
+    assert bucket.acquire() == 0 and bucket.acquire() == 0          # the burst
+    assert bucket.acquire() == pytest.approx(1.0)                   # then one per second
+    clock.now += 10
+    assert bucket.acquire() == 0 and bucket.acquire() == 0          # refilled up to the burst only
+    assert bucket.acquire() == pytest.approx(1.0)
+
+
+def test_retryable_errors():
+    assert is_retryable(api_error(429))
+    assert is_retryable(api_error(503))
+    assert not is_retryable(api_error(400))
+    assert not is_retryable(ValueError())
+    assert api_error_code(api_error(429)) == 429
+
+
+def test_call_retries_429_with_exponential_backoff():
+    clock   =   FakeClock()
+    sheet   =   FlakySheet(errors=[429, 429, 500])
+    gsc     =   make_gsc(clock, sheet, backoff=1.0, max_backoff=64.0, retries=5)
+    gsc.call(sheet.batch_update, [{'range': 'A1', 'values': [['x']]}])
+    assert sheet.calls == 4 and len(sheet.updates) == 1
+    assert len(clock.sleeps) == 3
+    for attempt, delay in enumerate(clock.sleeps):                  # 2**attempt plus up to `backoff` of jitter
+        assert 2**attempt <= delay <= 2**attempt + 1.0
+
+
+def test_call_backoff_is_capped():
+    clock   =   FakeClock()
+    sheet   =   FlakySheet(errors=[429] * 6)
+    gsc     =   make_gsc(clock, sheet, backoff=1.0, max_backoff=4.0, retries=6)
+    gsc.call(sheet.batch_update, [])
+    assert max(clock.sleeps) <= 4.0 + 1.0
+
+
+def test_call_gives_up_after_retries():
+    clock   =   FakeClock()
+    sheet   =   FlakySheet(errors=[429] * 10)
+    gsc     =   make_gsc(clock, sheet, retries=3)
+    with pytest.raises(gspread.exceptions.APIError):
+        gsc.call(sheet.batch_update, [])
+    assert sheet.calls == 4
+
+
+def test_call_does_not_retry_client_errors():
+    clock   =   FakeClock()
+    sheet   =   FlakySheet(errors=[400])
+    gsc     =   make_gsc(clock, sheet)
+    with pytest.raises(gspread.exceptions.APIError):
+        gsc.call(sheet.batch_update, [])
+    assert sheet.calls == 1 and clock.sleeps == []
+
+
+def test_flush_keeps_cells_queued_on_failure():
+    clock   =   FakeClock()
+    sheet   =   FlakySheet(errors=[429] * 2)
+    gsc     =   make_gsc(clock, sheet, retries=1)
+    gsc.pending['B2'] = [['x']]
+    assert gsc.flush() is False                                     # 429 on the request and its retry
+    assert gsc.pending == {'B2': [['x']]}
+    assert gsc.flush() is True
+    assert gsc.pending == {} and sheet.updates == [[{'range': 'B2', 'values': [['x']]}]]
+
+
+def test_flush_coalesces_into_batches():
+    clock   =   FakeClock()
+    sheet   =   FlakySheet()
+    gsc     =   make_gsc(clock, sheet, max_batch=2)
+    for row in range(2, 7): gsc.pending[f"A{row}"] = [[row]]
+    assert gsc.flush()
+    assert [len(batch) for batch in sheet.updates] == [2, 2, 1]
+
+
+def test_local_backend_quota_is_retried(tmp_path):
+    (tmp_path / 'obs').mkdir()
+    (tmp_path / 'obs' / 'sheet.csv').write_text("FILE_NAME,TSYS\na.fits,True\n")
+    clock   =   FakeClock()
+    limiter =   TokenBucket(rate=1000, per=1.0, burst=1000, clock=clock, sleep=clock.sleep)
+    gsc     =   GSC(sid='obs', wname='sheet', client=LocalClient(tmp_path, quota=2), limiter=limiter, journal=False, retries=2)
+    gsc.open()                                                      # open_by_key is local, worksheet + records: 1 request
+    assert gsc.update_values([(0, 1, 'False')])                     # 2nd request
+    with pytest.raises(gspread.exceptions.APIError) as e:           # the quota (per real minute) is used up
+        gsc.call(gsc.sheet.get_all_values)
+    assert api_error_code(e.value) == 429
+    assert len(clock.sleeps) == 2
+
+
+def test_filter_matches_empty_cells_down_to_the_last_row(tmp_path):
+    (tmp_path / 'obs').mkdir()
+    rows    =   [['FILE_NAME', 'TSYS', 'fits to ms']] + [[f"f{i}.fits", 'True', '2m' if i < 2 else ''] for i in range(5)]
+    (tmp_path / 'obs' / 'sheet.csv').write_text(''.join(','.join(row) + '\n' for row in rows))
+    limiter =   TokenBucket(rate=10**6, burst=10**6)
+    gsc     =   GSC(sid='obs', wname='sheet', client=LocalClient(tmp_path), limiter=limiter, journal=False)
+    gsc.open(columns=['FILE_NAME', 'fits to ms'], filter={'fits to ms': lambda v: not v})
+    assert list(gsc.df['FILE_NAME']) == ['f2.fits', 'f3.fits', 'f4.fits']  # 'fits to ms' is empty from row 4 on
+    assert gsc.row_map == [4, 5, 6]
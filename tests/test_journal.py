@@ -0,0 +1,102 @@
+"""
+Journal of the cell edits, shared by the processes writing to a sheet
+"""
+import csv, multiprocessing, os
+import pytest
+
+from alfrd.lib import GSC, Journal, TokenBucket
+from alfrd.backend import LocalClient
+
+
+def edit(key, value, col='TSYS'):
+    return ('FILE_NAME', key, col, value)
+
+
+def cells(journal):
+    return [(rec['key'], rec['col'], rec['value']) for rec in journal.pending()]
+
+
+def test_ack_keeps_the_other_edits(tmp_path):
+    journal =   Journal(tmp_path / 'j.jsonl')
+    a       =   journal.append([edit('f0', 'x'), edit('f1', 'y')])
+    b       =   journal.append([edit('f2', 'z')])
+    assert a == [(os.getpid(), 1), (os.getpid(), 2)] and b == [(os.getpid(), 3)]
+    journal.ack(a[:1])
+    assert cells(journal) == [('f1', 'TSYS', 'y'), ('f2', 'TSYS', 'z')]
+    journal.ack(a[1:] + b)
+    assert journal.pending() == [] and (tmp_path / 'j.jsonl').read_text() == ''
+
+
+def test_ack_drops_older_edits_of_the_cell(tmp_path):
+    journal =   Journal(tmp_path / 'j.jsonl')
+    old     =   journal.append([edit('f0', 'old'), edit('f0', 'other', col='fits to ms')])
+    new     =   journal.append([edit('f0', 'new')])
+    journal.ack(new)
+    assert cells(journal) == [('f0', 'fits to ms', 'other')]
+    journal.ack(old)                                                # late ack, nothing else to drop
+    assert journal.pending() == []
+
+
+def test_torn_line_and_reopen(tmp_path):
+    path    =   tmp_path / 'j.jsonl'
+    Journal(path).append([edit('f0', 'x')])
+    with open(path, 'a') as f: f.write('{"pid": 1, "se')            # crashed while writing
+    journal =   Journal(path)
+    assert cells(journal) == [('f0', 'TSYS', 'x')]
+    assert journal.append([edit('f1', 'y')]) == [(os.getpid(), 2)]  # after the seqs in the file
+
+
+def _append_and_ack(path, key, n, queue):
+    journal =   Journal(path)
+    for i in range(n):
+        ids =   journal.append([edit(key, i), edit(key, i, col='fits to ms')])
+        journal.ack(ids[:1])
+    queue.put(os.getpid())
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="forks the writers")
+def test_processes_share_the_journal(tmp_path):
+    path    =   tmp_path / 'j.jsonl'
+    ctx     =   multiprocessing.get_context('fork')
+    queue   =   ctx.Queue()
+    procs   =   [ctx.Process(target=_append_and_ack, args=(path, f"f{p}", 50, queue)) for p in range(4)]
+    for p in procs: p.start()
+    for p in procs: p.join()
+    assert all(p.exitcode == 0 for p in procs)
+    pending =   Journal(path).pending()
+    assert len(pending) == 4 * 50                                   # the other processes' edits survive every ack
+    assert {rec['col'] for rec in pending} == {'fits to ms'}
+    assert len({(rec['pid'], rec['seq']) for rec in pending}) == len(pending)
+
+
+def test_open_replays_the_journal(tmp_path):
+    (tmp_path / 'obs').mkdir()
+    with open(tmp_path / 'obs' / 'sheet.csv', 'w', newline='') as f:
+        csv.writer(f).writerows([['FILE_NAME', 'TSYS'], ['f0', 'True'], ['f1', 'True']])
+    path    =   tmp_path / 'j.jsonl'
+    Journal(path).append([edit('f1', 'False')])                     # never reached the sheet
+    gsc     =   GSC(sid='obs', wname='sheet', client=LocalClient(tmp_path), journal=path,
+                    limiter=TokenBucket(rate=10**6, burst=10**6))
+    gsc.open()
+    assert list(gsc.df['TSYS']) == ['True', 'False']
+    with open(tmp_path / 'obs' / 'sheet.csv', newline='') as f:
+        assert list(csv.reader(f))[2] == ['f1', 'False']
+    assert gsc.journal.pending() == []
+
+
+def test_partial_open_replays_cells_not_loaded(tmp_path):
+    (tmp_path / 'obs').mkdir()
+    with open(tmp_path / 'obs' / 'sheet.csv', 'w', newline='') as f:
+        csv.writer(f).writerows([['FILE_NAME', 'TSYS', 'fits to ms'], ['f0', 'True', ''], ['f1', 'False', ''], ['f2', 'True', '']])
+    path    =   tmp_path / 'j.jsonl'
+    Journal(path).append([edit('f0', 'x'),                             # loaded
+                          edit('f1', 'y'),                             # row not loaded
+                          edit('f2', '3m', col='fits to ms'),          # column not loaded
+                          edit('f9', 'z')])                            # not in the sheet
+    gsc     =   GSC(sid='obs', wname='sheet', client=LocalClient(tmp_path), journal=path,
+                    limiter=TokenBucket(rate=10**6, burst=10**6))
+    gsc.open(columns=['FILE_NAME', 'TSYS'], filter={'TSYS': 'True'})
+    with open(tmp_path / 'obs' / 'sheet.csv', newline='') as f:
+        assert list(csv.reader(f))[1:] == [['f0', 'x', ''], ['f1', 'y', ''], ['f2', 'True', '3m']]
+    assert list(gsc.df['TSYS']) == ['x', 'True']
+    assert cells(gsc.journal) == [('f9', 'TSYS', 'z')]                 # kept, not dropped
@@ -0,0 +1,240 @@
+"""
+LogFrame edits reaching the sheet, on the local CSV backend
+"""
+import csv, gc, subprocess, sys, time
+import pandas as pd
+import pytest
+
+from alfrd.lib import GSC, LogFrame, TokenBucket
+from alfrd.backend import LocalClient
+
+
+@pytest.fixture
+def sheet(tmp_path):
+    """local sheet of 5 rows, returns a function opening it (in a new GSC) and the path of its CSV file"""
+    (tmp_path / 'obs').mkdir()
+    path    =   tmp_path / 'obs' / 'sheet.csv'
+    with open(path, 'w', newline='') as f:
+        csv.writer(f).writerows([['FILE_NAME', 'TSYS', 'fits to ms']] + [[f"f{i}.fits", 'True', ''] for i in range(5)])
+
+    def open_sheet(**kwargs):
+        gsc = GSC(sid='obs', wname='sheet', client=LocalClient(tmp_path), limiter=TokenBucket(rate=10**6, burst=10**6),
+                  journal=tmp_path / 'journal.jsonl')
+        gsc.open(**kwargs)
+        return gsc
+    return open_sheet, path
+
+
+def read(path):
+    with open(path, newline='') as f:
+        return list(csv.reader(f))
+
+
+def test_put_value_is_pushed(sheet):
+    open_sheet, path = sheet
+    lf      =   LogFrame(open_sheet())
+    lf.primary_value = 'f1.fits'
+    count   =   lf.put_value('3m2s', colname='fits to ms')
+    lf.update_sheet(count=count, failed=0)
+    assert read(path)[2] == ['f1.fits', 'True', '3m2s']
+    assert not lf._dirty
+
+
+def test_put_values_from_a_dict_series_or_list(sheet):
+    open_sheet, path = sheet
+    lf      =   LogFrame(open_sheet())
+    assert lf.put_values({'f0.fits': '1m', 'missing.fits': 'x'}, colname='fits to ms') == 1   # unknown keys skipped
+    assert lf.put_values(pd.Series({'f1.fits': '2m'}), colname='fits to ms', count=1) == 2
+    assert lf.put_values([('f2.fits', 'a'), ('f3.fits', 'b')], colname='new col') == 2      # column added
+    assert sorted(lf._dirty) == [(0, 2), (1, 2), (2, 3), (3, 3)]
+    assert lf.get_values(['f0.fits', 'f1.fits', 'f4.fits', 'missing.fits'], colname='fits to ms') == \
+        {'f0.fits': '1m', 'f1.fits': '2m', 'f4.fits': '', 'missing.fits': ''}
+    assert lf.isvalue_many('b', colname='new col') == {f"f{i}.fits": i == 3 for i in range(5)}
+    lf.update_sheet(count=2, failed=0)
+    rows    =   read(path)
+    assert rows[0] == ['FILE_NAME', 'TSYS', 'fits to ms', 'new col'] and not lf._dirty
+    assert [(row + [''])[2:4] for row in rows[1:]] == [['1m', ''], ['2m', ''], ['', 'a'], ['', 'b'], ['', '']]
+
+
+def test_put_values_sets_every_row_of_a_duplicated_key(sheet):
+    open_sheet, path = sheet
+    lf      =   LogFrame(open_sheet())
+    lf.primary_value = 'f1.fits'
+    lf.put_value('f0.fits', colname='FILE_NAME')                     # f0 twice
+    lf.primary_value = 'f0.fits'
+    assert not lf.isval_unique('FILE_NAME')
+    assert lf.put_values({'f0.fits': 'both'}, colname='TSYS') == 1
+    assert list(lf.df_sheet['TSYS'])[:3] == ['both', 'both', 'True']
+    assert lf.get_values(['f0.fits'], colname='TSYS') == {'f0.fits': 'both'}
+    lf.update_sheet(count=1, failed=0)
+    assert [row[:2] for row in read(path)[1:3]] == [['f0.fits', 'both'], ['f0.fits', 'both']]
+
+
+def test_column_not_loaded_is_written_in_place(sheet):
+    open_sheet, path = sheet
+    lf      =   LogFrame(open_sheet(columns=['FILE_NAME', 'TSYS']))
+    lf.primary_value = 'f1.fits'
+    lf.update_sheet(count=lf.put_value('3m2s', colname='fits to ms'), failed=0)
+    assert read(path)[0] == ['FILE_NAME', 'TSYS', 'fits to ms']     # not added again
+    assert read(path)[2] == ['f1.fits', 'True', '3m2s']
+    lf.update_sheet(count=lf.put_value('x', colname='other'), failed=1)
+    assert read(path)[0] == ['FILE_NAME', 'TSYS', 'fits to ms', 'other'] and read(path)[2][3] == 'x'
+
+
+def test_direct_edits_of_df_sheet_are_pushed(sheet):
+    open_sheet, path = sheet
+    lf      =   LogFrame(open_sheet())
+    lf.df_sheet.loc[0, 'TSYS']  =   'False'                         # edited in place
+    lf.df_sheet['new col']      =   ['a', '', '', '', 'e']           # column added directly
+    lf.update_sheet(count=1, failed=0)
+    rows    =   read(path)
+    assert rows[0] == ['FILE_NAME', 'TSYS', 'fits to ms', 'new col']
+    assert rows[1] == ['f0.fits', 'False', '', 'a'] and rows[5][3] == 'e'
+    assert lf._external_edits() == 0                                # nothing left to send
+
+
+def test_in_place_edits_are_compared_on_request(sheet, monkeypatch):
+    open_sheet, path = sheet
+    lf      =   LogFrame(open_sheet())
+    compared=   []
+    external=   lf._external_edits
+    monkeypatch.setattr(lf, '_external_edits', lambda: compared.append(1) or external())
+    lf.df_sheet.loc[0, 'TSYS']  =   'False'                         # same frame and shape, not seen
+    lf.primary_value = 'f1.fits'
+    lf.update_sheet(count=lf.put_value('1m', colname='fits to ms'), failed=0)
+    assert read(path)[1][1] == 'True' and read(path)[2][2] == '1m' and compared == []
+    lf.reindex()
+    lf.update_sheet(count=2, failed=0)
+    assert read(path)[1][1] == 'False' and compared == [1]
+    lf.update_sheet(count=3, failed=0)
+    assert compared == [1]
+    lf.check_direct_edits = True                                    # compared before every push
+    lf.df_sheet.loc[2, 'TSYS']  =   'False'
+    lf.update_sheet(count=4, failed=0)
+    assert read(path)[3][1] == 'False' and compared == [1, 1]
+
+
+def test_reindex_after_in_place_edits(sheet):
+    open_sheet, path = sheet
+    lf      =   LogFrame(open_sheet())
+    lf.primary_value = 'f0.fits'
+    assert lf.isval_unique('FILE_NAME')
+    lf.df_sheet.loc[1, 'FILE_NAME'] =   'f0.fits'                   # duplicated
+    lf.df_sheet.loc[2, 'FILE_NAME'] =   'renamed.fits'
+    lf.reindex()
+    assert not lf.isval_unique('FILE_NAME')
+    lf.primary_value = 'renamed.fits'
+    assert lf.get_value('TSYS') == 'True'
+    lf.check_direct_edits = True                                    # a push finding edits rebuilds the index too
+    lf.df_sheet.loc[3, 'FILE_NAME'] =   'pushed.fits'
+    lf.update_sheet(count=1, failed=0)
+    lf.primary_value = 'pushed.fits'
+    assert lf.get_value('TSYS') == 'True' and read(path)[4][0] == 'pushed.fits'
+
+
+def test_replaced_df_sheet_is_pushed(sheet, tmp_path):
+    open_sheet, path = sheet
+    lf      =   LogFrame(open_sheet())
+    lf.df_sheet.to_csv(tmp_path / 'df_sheet.csv', index=False)
+    df      =   pd.read_csv(tmp_path / 'df_sheet.csv', dtype=str)
+    df.loc[3, 'fits to ms'] = 'failed'
+    lf.df_sheet = df                                                # the notebook flow
+    lf.update_sheet(count=1, failed=0)
+    assert read(path)[4] == ['f3.fits', 'True', 'failed']
+    lf.primary_value = 'f3.fits'
+    assert lf.get_value('fits to ms') == 'failed'                   # index rebuilt on the new frame
+
+
+def test_flush_worker_pushes_in_background(sheet):
+    open_sheet, path = sheet
+    with LogFrame(open_sheet(), flush_size=2) as lf:
+        lf.start_flush_worker(flush_interval=60)
+        for i, key in enumerate(['f0.fits', 'f4.fits']):
+            lf.primary_value = key
+            lf.update_sheet(count=lf.put_value(f"{i}m", colname='fits to ms'), failed=0)   # returns at once
+        for _ in range(200):                                        # woken by flush_size, not the interval
+            if read(path)[5][2] == '1m': break
+            time.sleep(0.01)
+        assert read(path)[1][2] == '0m' and read(path)[5][2] == '1m'
+        lf.primary_value = 'f2.fits'
+        lf.put_value('2m', colname='fits to ms')
+    assert read(path)[3][2] == '2m'                                 # pushed by close()
+    assert lf._worker is None
+
+
+def test_unclosed_logframe_is_flushed_at_exit(sheet, tmp_path):
+    open_sheet, path = sheet
+    script  =   f"""
+from alfrd.lib import GSC, LogFrame, TokenBucket
+from alfrd.backend import LocalClient
+gsc = GSC(sid='obs', wname='sheet', client=LocalClient({str(tmp_path)!r}, autosave=False), journal=False,
+          limiter=TokenBucket(rate=10**6, burst=10**6))
+gsc.open()
+lf = LogFrame(gsc)
+lf.start_flush_worker(flush_interval=60)
+lf.primary_value = 'f2.fits'
+lf.put_value('exit', colname='fits to ms')
+"""
+    subprocess.run([sys.executable, '-c', script], check=True, capture_output=True)
+    assert read(path)[3] == ['f2.fits', 'True', 'exit']
+
+
+def test_logframe_collected_with_dirty_cells_warns(sheet):
+    open_sheet, path = sheet
+    lf      =   LogFrame(open_sheet())
+    lf.primary_value = 'f0.fits'
+    lf.put_value('lost', colname='fits to ms')
+    with pytest.warns(RuntimeWarning, match='1 cells not sent'):
+        del lf
+        gc.collect()
+
+
+def count_calls(monkeypatch, obj, name):
+    """list growing by one on every call of obj.name"""
+    calls   =   []
+    func    =   getattr(obj, name)
+    monkeypatch.setattr(obj, name, lambda *a, **k: calls.append(1) or func(*a, **k))
+    return calls
+
+
+def test_refresh_merges_and_keeps_dirty_cells(sheet, monkeypatch):
+    open_sheet, path = sheet
+    lf      =   LogFrame(open_sheet())
+    downloads = count_calls(monkeypatch, lf.gsc.sheet, 'get_all_values')
+    assert lf.refresh() == 0 and downloads == []                    # not modified since open
+    lf.primary_value = 'f1.fits'
+    lf.put_value('local', colname='fits to ms')
+    other   =   open_sheet()
+    other.update_values([(1, 1, 'False'), (1, 2, 'remote'), (3, 2, '3m')])
+    assert lf.refresh() == 2 and downloads == [1]
+    assert list(lf.df_sheet['TSYS']) == ['True', 'False', 'True', 'True', 'True']
+    assert list(lf.df_sheet['fits to ms'])[1:4] == ['local', '', '3m']     # the dirty cell kept its value
+    assert lf.refresh() == 0 and downloads == [1]
+    lf.update_sheet(count=1, failed=0)
+    assert read(path)[2] == ['f1.fits', 'False', 'local'] and read(path)[4] == ['f3.fits', 'True', '3m']
+
+
+def test_refresh_adds_columns_of_a_partly_loaded_sheet(sheet):
+    open_sheet, path = sheet
+    lf      =   LogFrame(open_sheet(columns=['FILE_NAME', 'fits to ms']))
+    other   =   open_sheet()
+    other.update_values([(0, 1, 'False'), (0, 2, '1m')])
+    assert lf.refresh() == 1
+    assert list(lf.df_sheet.columns) == ['FILE_NAME', 'fits to ms'] and lf.df_sheet.iat[0, 1] == '1m'
+
+
+def test_refresh_rebases_moved_rows(sheet):
+    open_sheet, path = sheet
+    lf      =   LogFrame(open_sheet())
+    lf.primary_value = 'f1.fits'
+    lf.put_value('local', colname='fits to ms')
+    lf.primary_value = 'f4.fits'
+    lf.put_value('gone', colname='fits to ms')
+    rows    =   read(path)
+    with open(path, 'w', newline='') as f:                          # a row inserted on top, f4 deleted
+        csv.writer(f).writerows([rows[0], ['new.fits', 'False', '']] + rows[1:5])
+    lf.refresh()
+    assert list(lf.df_sheet['FILE_NAME']) == ['new.fits', 'f0.fits', 'f1.fits', 'f2.fits', 'f3.fits']
+    assert list(lf.df_sheet['fits to ms']) == ['', '', 'local', '', '']
+    lf.update_sheet(count=1, failed=0)
+    assert read(path)[3] == ['f1.fits', 'True', 'local'] and len(read(path)) == 6
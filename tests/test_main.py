@@ -0,0 +1,56 @@
+"""
+`alfrd` entry point: the fast paths answered without typer and the other commands passed on to alfrd.cli
+"""
+import os, subprocess, sys
+
+from alfrd import bench, __version__ as alfrd_version
+from alfrd.main import RUN_VALUE_OPTIONS, positionals
+
+
+def alfrd(home, *argv, check='typer'):
+    """runs `alfrd <argv>` in a new process, returns its output and whether `check` was imported"""
+    script  =   ("import sys; from alfrd.main import main; code = main(sys.argv[1:]); "
+                 f"print('imported', {check!r} in sys.modules); sys.exit(code)")
+    p       =   subprocess.run([sys.executable, '-c', script, *argv], env={**os.environ, 'HOME': str(home)},
+                               capture_output=True, text=True)
+    return p.returncode, p.stdout
+
+
+def test_ls_does_not_import_typer(tmp_path):
+    bench.make_project(tmp_path, n_steps=2)
+    code, out   =   alfrd(tmp_path, 'ls', 'bench')                  # writes the manifest
+    assert code == 0 and 'step_0_1' in out
+    code, out   =   alfrd(tmp_path, 'ls', 'bench')
+    assert code == 0 and 'step_0_0' in out and 'step_0_1' in out
+    assert f"ALFRD ({alfrd_version})" in out
+    assert 'imported False' in out
+    code, out   =   alfrd(tmp_path, 'ls', 'bench', check='importlib.metadata')
+    assert 'imported False' in out
+
+
+def test_other_commands_go_to_the_typer_app(tmp_path):
+    bench.make_project(tmp_path)
+    code, out   =   alfrd(tmp_path, 'init', 'other')
+    assert code == 0 and (tmp_path / '.alfrd' / 'projects' / 'other').is_dir()
+    code, out   =   alfrd(tmp_path, 'ls', '--help')
+    assert code == 0 and 'List all available pipeline steps' in out
+
+
+def test_submodules_do_not_import_the_cli():
+    script  =   ("import sys; from alfrd import lib, executor, backend, util; import alfrd; "
+                 "assert 'typer' not in sys.modules and 'alfrd.cli' not in sys.modules; "
+                 "assert not hasattr(alfrd, 'nothing'); assert callable(alfrd.alfrd_cli) and 'typer' in sys.modules")
+    subprocess.run([sys.executable, '-c', script], check=True)
+
+
+def test_version(tmp_path):
+    code, out   =   alfrd(tmp_path, '--version')
+    assert code == 0 and out.splitlines()[0][0].isdigit()
+
+
+def test_run_value_options_match_the_cli():
+    import typer.main
+    from alfrd.cli import alfrd_cli
+    run     =   typer.main.get_command(alfrd_cli).commands['run']
+    assert RUN_VALUE_OPTIONS == {opt for p in run.params if p.param_type_name == 'option' and not p.is_flag for opt in p.opts}
+    assert positionals(['step', '--steps', 'a', '--steps=b', '--resume', 'proj', 'x=1'], RUN_VALUE_OPTIONS) == ['step', 'proj', 'x=1']
@@ -0,0 +1,183 @@
+"""
+Loading the plugin files of a project through the manifest, and running the registered steps
+"""
+import os, subprocess, sys, threading
+import pytest
+import typer
+
+from alfrd.util import find_paramfiles, read_params
+
+from alfrd import plugins
+
+STEPS = '''
+from alfrd.plugins import register, validate
+
+@validate(['check_input'])
+@register(desc="{desc}")
+def convert(x=0):
+    return x
+'''
+
+VALIDATORS = '''
+from alfrd.plugins import validator
+
+@validator(desc="input is there")
+def check_input(x=0):
+    return True
+'''
+
+
+@pytest.fixture
+def new_process():
+    """forgets the registered steps and executed files, as a new `alfrd` process"""
+    def reset():
+        for registry in (plugins.REGISTERED_STEPS, plugins.VALIDATE_BEFORE, plugins.VALIDATE_AFTER, plugins.VALIDATORS, plugins._LOADED):
+            registry.clear()
+    reset()
+    yield reset
+    reset()
+
+
+def write(path, text):
+    path.write_text(text)
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))          # a new mtime even on coarse clocks
+
+
+def test_changed_file_validated_by_an_unchanged_one(tmp_path, new_process):
+    write(tmp_path / 'steps.py', STEPS.format(desc="first"))
+    write(tmp_path / 'validators.py', VALIDATORS)
+    plugins.load_projects(tmp_path, steps=[])                           # writes the manifest
+    new_process()
+    write(tmp_path / 'steps.py', STEPS.format(desc="second"))            # validators.py is not executed to list
+    plugins.load_projects(tmp_path, steps=[])
+    assert plugins.REGISTERED_STEPS['convert']['desc'] == "second"
+    new_process()
+    plugins.load_projects(tmp_path, steps=['convert'])                  # both files, whatever their order
+    assert plugins.VALIDATE_BEFORE['convert']['functions'][0].__name__ == 'check_input'
+
+
+def test_unknown_validator_is_reported(tmp_path, new_process):
+    write(tmp_path / 'steps.py', STEPS.format(desc="first"))
+    with pytest.raises(plugins.ValidatorNotFound):
+        plugins.load_projects(tmp_path, steps=[])
+
+
+def test_steps_follow_depends_on_and_provides(new_process):
+    order   =   []
+    def prepare():
+        order.append('prepare')
+        return {'x': 5}
+    def convert(x):
+        order.append(f"convert {x}")
+    def fetch():
+        order.append('fetch')
+    def report():
+        order.append('report')
+    plugins.register("x", provides=['x'])(prepare)
+    plugins.register("needs x")(convert)
+    plugins.register("independent", depends_on=[])(fetch)
+    plugins.register("after both", depends_on=[convert, 'fetch'])(report)
+    steps   =   ['prepare', 'convert', 'fetch', 'report']
+    assert plugins.step_graph(steps) == {'prepare': set(), 'convert': {'prepare'}, 'fetch': set(), 'report': {'convert', 'fetch'}}
+    assert plugins.step_graph(['convert', 'report']) == {'convert': set(), 'report': {'convert'}}   # within the selected steps
+    run     =   plugins.PipelineRun()
+    assert run.run_steps(steps, workers=1) == dict.fromkeys(steps, True)
+    assert order.index('prepare') < order.index('convert 5') < order.index('report') and order.index('fetch') < order.index('report')
+    assert run.params['x'] == 5
+
+
+def test_independent_steps_run_concurrently(new_process):
+    both    =   threading.Barrier(2, timeout=10)                    # broken if the steps run one after the other
+    def left(): both.wait()
+    def right(): both.wait()
+    plugins.register("left", depends_on=[])(left)
+    plugins.register("right", depends_on=[])(right)
+    assert plugins.PipelineRun().run_steps(['left', 'right']) == {'left': True, 'right': True}
+
+
+def test_failed_step_stops_new_steps(new_process):
+    ran     =   []
+    def broken(): raise RuntimeError("broken")
+    def later(): ran.append('later')
+    def after_broken(): ran.append('after_broken')
+    plugins.register("fails", depends_on=[])(broken)
+    plugins.register("independent", depends_on=[])(later)
+    plugins.register("dependent")(after_broken)
+    with pytest.raises(typer.Exit):
+        plugins.PipelineRun().run_steps(['broken', 'later', 'after_broken'], workers=1)
+    assert ran == []
+
+
+def test_dependents_of_a_failed_validation_are_skipped(new_process):
+    ran     =   []
+    def not_ready(): return False
+    def convert(): ran.append('convert')
+    def image(): ran.append('image')
+    def publish(): ran.append('publish')
+    def other(): ran.append('other')
+    plugins.validator("never valid")(not_ready)
+    plugins.validate(['not_ready'])(plugins.register("validated")(convert))
+    plugins.register("after convert")(image)
+    plugins.register("after image")(publish)
+    plugins.register("independent", depends_on=[])(other)
+    status  =   plugins.PipelineRun().run_steps(['convert', 'image', 'publish', 'other'])
+    assert status == {'convert': False, 'image': False, 'publish': False, 'other': True} and ran == ['other']
+
+
+def test_circular_dependencies_are_reported(new_process):
+    def first(): pass
+    def second(): pass
+    plugins.register("first", depends_on=['second'])(first)
+    plugins.register("second", depends_on=['first'])(second)
+    with pytest.raises(ValueError, match="Circular"):
+        plugins.PipelineRun().run_steps(['first', 'second'])
+
+
+def paramfiles(folder, names):
+    for name in names:
+        (folder / name).mkdir(parents=True)
+        (folder / name / 'obs.inp').write_text(f"name = {name}\nmode = file\n")
+    return [(f, read_params(f)) for f in find_paramfiles(folder, 'obs.inp')]
+
+
+def test_sweep_in_process_with_cli_params_first(tmp_path, new_process, capsys):
+    seen    =   []
+    def record(name, mode='default'):
+        seen.append((name, mode))
+        if name == 'bad': raise RuntimeError("bad parameters")
+    plugins.register("records its parameters")(record)
+    run     =   plugins.PipelineRun()
+    run.params  =   {'mode': 'cli'}                                 # key=value of the command line
+    results =   run.sweep(paramfiles(tmp_path, ['a', 'bad', 'c']), ['record'], processes=1)
+    assert seen == [('a', 'cli'), ('bad', 'cli'), ('c', 'cli')]      # one after the other, here
+    assert [(r['label'], r['status']) for r in results] == [(str(tmp_path / n / 'obs.inp'), s)
+                                                            for n, s in [('a', 'finished'), ('bad', 'failed'), ('c', 'finished')]]
+    out     =   capsys.readouterr().out
+    assert "3 parameter sets" in out and "1 failed" in out and f"failed: {tmp_path / 'bad' / 'obs.inp'}" in out
+    assert run.params == {'mode': 'cli'}                            # the runs do not change the base run
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="the sweep forks its workers")
+def test_sweep_exit_code_and_logs(tmp_path):
+    project =   tmp_path / '.alfrd' / 'projects' / 'sw'
+    project.mkdir(parents=True)
+    (project / 'steps.py').write_text(
+        "from alfrd.plugins import register\n\n"
+        "@register(desc='fails for bad')\n"
+        "def check(name, mode='default'):\n"
+        "    print('checking', name, mode)\n"
+        "    if name == 'bad': raise RuntimeError('bad parameters')\n")
+    paramfiles(tmp_path / 'obs', ['a', 'bad', 'c'])
+    def alfrd(*argv):
+        return subprocess.run([sys.executable, '-c', "import sys; from alfrd.main import main; sys.exit(main(sys.argv[1:]))",
+                               *argv], env={**os.environ, 'HOME': str(tmp_path)}, capture_output=True, text=True)
+    p       =   alfrd('run', 'check', 'sw', '--sweep', str(tmp_path / 'obs'), '--sweep-file', 'obs.inp',
+                      '--processes', '2', 'mode=cli')
+    assert p.returncode == 1, p.stdout + p.stderr
+    assert "2 finished" in p.stdout and "1 failed" in p.stdout
+    logs    =   sorted((project / '.sweep').glob('*/*.log'))
+    assert [log.name for log in logs] == ['0.log', '1.log', '2.log']
+    assert 'checking a cli' in logs[0].read_text() and 'bad parameters' in logs[1].read_text()
+    p       =   alfrd('run', 'check', 'sw', '--sweep', str(tmp_path / 'obs' / '[ac]' / 'obs.inp'), '--processes', '2')
+    assert p.returncode == 0 and "2 finished" in p.stdout, p.stdout + p.stderr
@@ -0,0 +1,174 @@
+"""
+Parameters of the input files read by `read_inputfile`
+"""
+import copy, json, multiprocessing, os, pickle, shutil
+from pathlib import Path
+import pytest
+
+from alfrd.cache import Checkpoint
+from alfrd import util
+from alfrd.util import LazyGlob, read_inputfile, allocate_dir, dir_for_project, provision_projects, provision_template, template_copier, delete_paths, del_fl
+
+
+def test_params_are_a_plain_dict(tmp_path, monkeypatch):
+    (tmp_path / 'a.fits').write_text('')
+    (tmp_path / 'obs.inp').write_text("wd = /data\nn = 3\nfitsfiles = *.fits\n")
+    monkeypatch.chdir(tmp_path)
+    params, files, folder = read_inputfile(tmp_path, 'obs.inp')
+    assert isinstance(params, dict) and files == [str(tmp_path / 'obs.inp')]
+    assert isinstance(dict.__getitem__(params, 'fitsfiles'), LazyGlob)     # not expanded yet
+    assert json.loads(json.dumps(params)) == {'wd': '/data', 'n': 3, 'fitsfiles': ['a.fits']}
+    assert params['missing'] == [] and 'missing' in params
+
+
+def test_copies_expand_the_globs(tmp_path, monkeypatch):
+    (tmp_path / 'a.fits').write_text('')
+    (tmp_path / 'obs.inp').write_text("fitsfiles = *.fits\n")
+    monkeypatch.chdir(tmp_path)
+    for read in (dict, lambda p: {**p}, lambda p: dict(p.items()), lambda p: pickle.loads(pickle.dumps(p)),
+                 lambda p: copy.deepcopy(p), lambda p: {'fitsfiles': p.get('fitsfiles')}):
+        params, _, _ = read_inputfile(tmp_path, 'obs.inp')
+        assert dict(read(params)) == {'fitsfiles': ['a.fits']}
+    params, _, _ = read_inputfile(tmp_path, 'obs.inp')
+    assert Checkpoint.params_key(params) == Checkpoint.params_key({'fitsfiles': ['a.fits']})
+
+
+def test_warm_read_does_not_rescan(tmp_path, monkeypatch):
+    for d in range(20):
+        (tmp_path / f"obs_{d}" / 'input').mkdir(parents=True)
+    (tmp_path / 'obs_3' / 'input' / 'obs.inp').write_text("n = 1\n")
+    assert read_inputfile(tmp_path, 'obs.inp')[0] == {'n': 1}
+    scans, stats    =   [], []
+    scandir, stat   =   os.scandir, os.stat
+    monkeypatch.setattr(util.os, 'scandir', lambda d: scans.append(d) or scandir(d))
+    monkeypatch.setattr(util.os, 'stat', lambda p, **k: stats.append(p) or stat(p, **k))
+    params, files, _ = read_inputfile(tmp_path, 'obs.inp')
+    assert params == {'n': 1} and files == [f"{tmp_path}/obs_3/input/obs.inp"]
+    assert scans == [] and len(stats) == 1 + 20 + 1 + 1             # levels above, the directory of the file, the file
+    (tmp_path / 'obs_3' / 'input' / 'other.inp').write_text("m = 2\n")
+    assert read_inputfile(tmp_path, '.inp')[0] == {'n': 1, 'm': 2}
+    (tmp_path / 'obs_5' / 'new_obs.inp').write_text("n = 5\n")    # in a level above
+    assert read_inputfile(tmp_path, 'obs.inp')[:2] == ({'n': 5}, [f"{tmp_path}/obs_5/new_obs.inp"])
+
+
+def _allocate(base):
+    return [allocate_dir(base) for _ in range(16)]
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason="forks the workers")
+def test_concurrent_allocations_never_share_a_directory(tmp_path):
+    base    =   tmp_path / 'proj' / 'wd'
+    with multiprocessing.get_context('fork').Pool(4) as pool:
+        dirs    =   [d for chunk in pool.map(_allocate, [base] * 4) for d in chunk]
+    assert len(set(dirs)) == 64 and all(os.path.isdir(d) for d in dirs)
+    assert set(dirs) == {str(base)} | {f"{base}_{n}" for n in range(1, 64)}
+
+
+def test_dir_for_project_reuses_the_wd_holding_the_file(tmp_path):
+    template    =   tmp_path / 'template'
+    template.mkdir()
+    (template / 'input.txt').write_text('x')
+    files       =   [tmp_path / 'data' / 'proj' / f"obs{i}.fits" for i in range(6)]
+    files[0].parent.mkdir(parents=True)
+    for f in files: f.touch()
+    tdir        =   f"{tmp_path}/red/"
+    provided    =   provision_projects([str(f) for f in files], workers=6, tdir=tdir, ifolder=str(template))
+    wds         =   [Path(wd_ifolder).parent for wd_ifolder, _ in provided]
+    assert len(set(wds)) == 6                                       # one wd per file, allocated concurrently
+    assert all((wd / 'raw' / f.name).is_symlink() and (wd / 'input_template' / 'input.txt').exists() for wd, f in zip(wds, files))
+    taken       =   sorted(os.listdir(tmp_path / 'red' / 'proj'))
+    holding     =   [wd for wd in wds if wd.name != 'wd'][0]         # a wd_N
+    f           =   files[wds.index(holding)]
+    assert dir_for_project(str(f), tdir=tdir, ifolder=str(template)) == (None, False)   # already provisioned
+    assert sorted(os.listdir(tmp_path / 'red' / 'proj')) == taken   # no new wd
+    assert Path(dir_for_project(str(f), tdir=tdir, create=False)[0]).parent == holding
+
+
+@pytest.fixture
+def template(tmp_path):
+    (tmp_path / 'template' / 'sub').mkdir(parents=True)
+    (tmp_path / 'template' / 'input.txt').write_text('input')
+    (tmp_path / 'template' / 'sub' / 'table.ms').write_text('changed by the steps')
+    return tmp_path / 'template'
+
+
+def inodes(folder):
+    return {str(p.relative_to(folder)): p.stat().st_ino for p in sorted(folder.rglob('*')) if p.is_file()}
+
+
+def test_link_shares_files_but_never_mutable_ones(tmp_path, template):
+    wd      =   Path(provision_template(template, tmp_path / 'wd', mode='link', mutable=['*.ms']))
+    assert inodes(wd)['input.txt'] == inodes(template)['input.txt']
+    assert inodes(wd)['sub/table.ms'] != inodes(template)['sub/table.ms']
+    assert (wd / 'sub' / 'table.ms').read_text() == 'changed by the steps'
+
+
+def test_copy_and_reflink_make_files_of_their_own(tmp_path, template, monkeypatch):
+    copied  =   Path(provision_template(template, tmp_path / 'copied', mode='copy'))
+    assert set(inodes(copied).values()).isdisjoint(inodes(template).values())
+    clones  =   []
+    monkeypatch.setattr(util, '_REFLINK', {})
+    monkeypatch.setattr(util, 'reflink', lambda src, dst: clones.append(src) or shutil.copy2(src, dst))
+    cloned  =   Path(provision_template(template, tmp_path / 'cloned', mode='reflink'))
+    assert len(clones) == 2 and set(inodes(cloned).values()).isdisjoint(inodes(template).values())
+
+
+def test_reflink_and_link_fall_back_to_copies(tmp_path, template, monkeypatch):
+    tried   =   []
+    def unsupported(src, dst):
+        tried.append(src)
+        raise OSError("not supported")
+    monkeypatch.setattr(util, '_REFLINK', {})
+    monkeypatch.setattr(util, 'reflink', unsupported)
+    monkeypatch.setattr(util.os, 'link', lambda src, dst: (_ for _ in ()).throw(OSError("other filesystem")))
+    wd      =   Path(provision_template(template, tmp_path / 'wd', mode='link'))
+    assert len(tried) == 1                                          # not tried again for the same filesystems
+    assert set(inodes(wd).values()).isdisjoint(inodes(template).values()) and (wd / 'input.txt').read_text() == 'input'
+    with pytest.raises(ValueError):
+        template_copier('symlink')
+
+
+@pytest.fixture
+def tree(tmp_path):
+    ms      =   tmp_path / 'wd' / 'obs 1.ms'                           # names with spaces
+    (ms / 'ANTENNA TABLE').mkdir(parents=True)
+    (ms / 'table.f0').write_bytes(b'0' * 100)
+    (ms / 'ANTENNA TABLE' / 'table f1').write_bytes(b'0' * 50)
+    (tmp_path / 'outside').mkdir()
+    (tmp_path / 'outside' / 'keep').write_text('keep')
+    (ms / 'linked dir').symlink_to(tmp_path / 'outside')
+    (ms / 'ANTENNA TABLE' / 'linked file').symlink_to(tmp_path / 'outside' / 'keep')
+    (tmp_path / 'wd' / 'obs.inp').write_text('kept')
+    return tmp_path
+
+
+def test_dry_run_counts_without_deleting(tree):
+    report  =   delete_paths([tree / 'wd' / 'obs 1.ms'], dry_run=True)
+    assert report['dry_run'] and (report['files'], report['dirs'], report['errors']) == (4, 2, 0)
+    assert report['bytes'] >= 150 and (tree / 'wd' / 'obs 1.ms' / 'table.f0').exists()
+
+
+def test_symlinks_are_deleted_not_followed(tree):
+    report  =   delete_paths([tree / 'wd' / 'obs 1.ms'], workers=2)
+    assert (report['files'], report['dirs'], report['errors']) == (4, 2, 0)
+    assert not (tree / 'wd' / 'obs 1.ms').exists()
+    assert (tree / 'outside' / 'keep').read_text() == 'keep' and (tree / 'wd' / 'obs.inp').exists()
+
+
+def test_errors_are_counted(tree, monkeypatch):
+    unlink  =   os.unlink
+    def unlink_but_f0(path, *args, **kwargs):
+        if os.path.basename(path) == 'table.f0': raise PermissionError(path)
+        return unlink(path, *args, **kwargs)
+    monkeypatch.setattr(util.os, 'unlink', unlink_but_f0)
+    report  =   delete_paths([tree / 'wd' / 'obs 1.ms', tree / 'missing'])
+    assert (report['files'], report['errors']) == (3, 2)                # table.f0 and its directory left
+    assert (tree / 'wd' / 'obs 1.ms' / 'table.f0').exists() and not (tree / 'wd' / 'obs 1.ms' / 'ANTENNA TABLE').exists()
+
+
+def test_del_fl_only_reports_unless_rm(tree, capsys):
+    assert del_fl(tree / 'wd', fl='*.ms') == 1
+    assert 'to delete' in capsys.readouterr().out and (tree / 'wd' / 'obs 1.ms').exists()
+    assert del_fl(tree / 'wd', count=1, fl='*.ms', rm=True) == 2
+    assert '4 files, 2 folders' in capsys.readouterr().out and not (tree / 'wd' / 'obs 1.ms').exists()
+    assert del_fl(tree / 'wd', fl='*.ms') == 0